@@ -0,0 +1,409 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""End-to-end benchmarks of the acquisition and post-processing stages
+
+Every stage runs in a fresh process on a recorded raw file, so timings and peak memory
+of one stage do not leak into the next. The report lists Mpackets/s (64 bit words), Mhits/s and
+the peak resident memory of the benchmark process.
+
+run: python benchmarks/bench_acquisition.py [--scale 10] [--json results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import pathlib
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+REPO_PATH = pathlib.Path(__file__).resolve().parent.parent
+FILES_PATH = REPO_PATH / "tests" / "files"
+
+# benchmark the checkout, not whatever pymepix happens to be installed
+sys.path.insert(0, str(REPO_PATH))
+
+# number of 64 bit words handed to the packet processor in one go, about what UdpSampler flushes
+CHUNK_WORDS = 8192
+
+STAGES = {}
+
+
+def stage(name):
+    """register a benchmark stage
+
+    The decorated function receives the path of the raw file and a scratch directory and returns
+    (seconds, packets, hits) for the timed part only.
+    """
+
+    def register(func):
+        STAGES[name] = func
+        return func
+
+    return register
+
+
+def peak_rss_mb():
+    """peak resident memory of this process in MB"""
+    if resource is None:
+        return float("nan")
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def read_words(fname):
+    return np.fromfile(fname, dtype=np.uint64)
+
+
+def raw_chunks(words, chunk_words=CHUNK_WORDS):
+    """split raw words into the buffers PacketProcessor.process expects
+
+    Every buffer gets the longtime of the last complete heartbeat appended, just like UdpSampler
+    does with the value tracked by the TimepixDevice.
+    """
+    top = (words >> np.uint64(56)).astype(np.uint8)
+    is_lsb = (top == 0x44) | (top == 0x64)
+    is_msb = (top == 0x45) | (top == 0x65)
+    heartbeats = np.flatnonzero(is_lsb | is_msb)
+
+    longtime = 0
+    longtime_lsb = 0
+    hb = 0
+    chunks = []
+    for start in range(0, words.size, chunk_words):
+        stop = min(start + chunk_words, words.size)
+        while hb < heartbeats.size and heartbeats[hb] < stop:
+            word = int(words[heartbeats[hb]])
+            if is_lsb[heartbeats[hb]]:
+                longtime_lsb = (word & 0x0000FFFFFFFF0000) >> 16
+            else:
+                longtime = ((word & 0x00000000FFFF0000) << 16) | longtime_lsb
+            hb += 1
+        buffer = np.empty(stop - start + 1, dtype=np.uint64)
+        buffer[:-1] = words[start:stop]
+        buffer[-1] = longtime
+        chunks.append(buffer.tobytes())
+    return chunks
+
+
+def packet_processor(handle_events):
+    from pymepix.processing.logic.packet_processor import PacketProcessor
+
+    processor = PacketProcessor(handle_events=handle_events)
+    processor.pre_process()
+    return processor
+
+
+def decoded_events(fname):
+    """event data per chunk, the untimed input for the centroiding and HDF5 stages"""
+    processor = packet_processor(True)
+    results = [processor.process(chunk) for chunk in raw_chunks(read_words(fname))]
+    return [r for r in results if r is not None and r[0] is not None]
+
+
+@stage("udp_ingest")
+def bench_udp_ingest(fname, tmp_dir):
+    """UdpSampler receiving the replayed file and pushing it to the packet processor socket"""
+    from multiprocessing.sharedctypes import Value
+
+    import zmq
+
+    import pymepix.config.load_config as cfg
+    from pymepix.processing.baseacquisition import AcquisitionPipeline
+    from pymepix.processing.udpsampler import UdpSampler
+    from pymepix.util.spidrDummyUDP import replay
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        address = sock.getsockname()
+
+    pipeline = AcquisitionPipeline("Benchmark", multiprocessing.Queue())
+    pipeline.addStage(0, UdpSampler, address, Value("L", 0))
+
+    ctx = zmq.Context.instance()
+    packet_sock = ctx.socket(zmq.PULL)
+    packet_sock.connect(f"ipc:///tmp/packetProcessor{cfg.default_cfg['zmq_port']}")
+    # returns once the UdpSampler is bound and ready
+    pipeline.start()
+
+    sent = {}
+    sender = threading.Thread(target=lambda: sent.update(replay(fname, address)))
+    start = time.time()
+    sender.start()
+
+    # UdpSampler flushes its buffer after flush_timeout (0.3 s), checked at least every socket
+    # timeout (0.1 s), so stop once nothing new arrived for longer than both
+    packets = 0
+    last = start
+    while sender.is_alive() or time.time() - last < 1.0:
+        if packet_sock.poll(100):
+            words = (len(packet_sock.recv(copy=False)) - 8) // 8
+            if words > 0:
+                packets += words
+                last = time.time()
+    sender.join()
+
+    # also shuts down the raw file writer of the sampler
+    pipeline.stop()
+    packet_sock.close()
+
+    if packets < sent["bytes"] // 8:
+        print(f"udp_ingest: received {packets} of {sent['bytes'] // 8} words", file=sys.stderr)
+    return last - start, packets, 0
+
+
+@stage("decode")
+def bench_decode(fname, tmp_dir):
+    """PacketProcessor without event building: pixel and trigger decoding only"""
+    chunks = raw_chunks(read_words(fname))
+    processor = packet_processor(False)
+
+    hits = 0
+    start = time.time()
+    for chunk in chunks:
+        _, pixels, _, _ = processor.process(chunk)
+        if pixels is not None:
+            hits += pixels[0].size
+    seconds = time.time() - start
+    return seconds, sum(len(c) // 8 - 1 for c in chunks), hits
+
+
+@stage("events")
+def bench_events(fname, tmp_dir):
+    """PacketProcessor including the TOF calculation relative to the triggers"""
+    chunks = raw_chunks(read_words(fname))
+    processor = packet_processor(True)
+
+    hits = 0
+    start = time.time()
+    for chunk in chunks:
+        events, _, _, _ = processor.process(chunk)
+        if events is not None:
+            hits += events[0].size
+    seconds = time.time() - start
+    return seconds, sum(len(c) // 8 - 1 for c in chunks), hits
+
+
+def bench_centroiding(fname, dbscan_clustering):
+    from pymepix.processing.logic.centroid_calculator import CentroidCalculator
+
+    events = decoded_events(fname)
+    calculator = CentroidCalculator(number_of_processes=1, clustering_args={},
+                                    dbscan_clustering=dbscan_clustering)
+    calculator.pre_process()
+
+    start = time.time()
+    for event_data, _, _, _ in events:
+        calculator.process(event_data)
+    seconds = time.time() - start
+    calculator.post_process()
+    return seconds, 0, sum(e[0][0].size for e in events)
+
+
+@stage("centroid_dbscan")
+def bench_centroid_dbscan(fname, tmp_dir):
+    """CentroidCalculator with the DBSCAN backend"""
+    return bench_centroiding(fname, True)
+
+
+@stage("centroid_stream")
+def bench_centroid_stream(fname, tmp_dir):
+    """CentroidCalculator with the clusterstream backend"""
+    return bench_centroiding(fname, False)
+
+
+@stage("hdf5")
+def bench_hdf5(fname, tmp_dir):
+    """writing events, centroids, timestamps and triggers to HDF5"""
+    from pymepix.processing.logic.centroid_calculator import CentroidCalculator
+    from pymepix.processing.rawfilesampler import RawFileSampler
+
+    events = decoded_events(fname)
+    calculator = CentroidCalculator(number_of_processes=1, clustering_args={}, dbscan_clustering=False)
+    centroids = [calculator.process(e[0]) for e in events]
+
+    output = pathlib.Path(tmp_dir) / "bench_hdf5.hdf5"
+    sampler = RawFileSampler(fname, output)
+    sampler._startTime = 0
+
+    start = time.time()
+    for (event_data, _, timestamps, triggers), clusters in zip(events, centroids):
+        sampler.saveToHDF5(output, event_data, clusters, timestamps, triggers)
+    seconds = time.time() - start
+    return seconds, 0, sum(e[0][0].size for e in events)
+
+
+@stage("post_processing")
+def bench_post_processing(fname, tmp_dir):
+    """the complete run_post_processing used by the CLI and the GUI"""
+    from pymepix.post_processing import run_post_processing
+
+    output = pathlib.Path(tmp_dir) / "bench_post_processing.hdf5"
+    start = time.time()
+    run_post_processing(fname, output, 1, None, None)
+    seconds = time.time() - start
+
+    hits = 0
+    if output.exists():
+        import h5py
+
+        with h5py.File(output, "r") as f:
+            if "raw" in f:
+                hits = f["raw/x"].shape[0]
+    return seconds, pathlib.Path(fname).stat().st_size // 8, hits
+
+
+def _run_stage(name, fname, tmp_dir, result_queue):
+    try:
+        seconds, packets, hits = STAGES[name](fname, tmp_dir)
+        result_queue.put((seconds, packets, hits, peak_rss_mb(), None))
+    except Exception as e:
+        result_queue.put((0.0, 0, 0, peak_rss_mb(), repr(e)))
+
+
+def run_stage(name, fname, tmp_dir):
+    """run one stage in a fresh process and collect its figures"""
+    # forked, not spawned: the acquisition pipeline relies on its children sharing the
+    # configuration (e.g. the randomly chosen zmq_port) of the process creating them
+    ctx = multiprocessing.get_context("fork")
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_run_stage, args=(name, str(fname), tmp_dir, result_queue))
+    process.start()
+    seconds, packets, hits, rss, error = result_queue.get()
+    process.join()
+
+    return {
+        "seconds": seconds,
+        "packets": packets,
+        "hits": hits,
+        "Mpackets/s": packets / seconds / 1e6 if seconds > 0 else 0.0,
+        "Mhits/s": hits / seconds / 1e6 if seconds > 0 else 0.0,
+        "peak RSS MB": rss,
+        "error": error,
+    }
+
+
+def scaled_dataset(fname, scale, tmp_dir):
+    """the raw file repeated scale times, to get past the fixed costs of the small test files"""
+    if scale == 1:
+        return pathlib.Path(fname)
+    words = read_words(fname)
+    out = pathlib.Path(tmp_dir) / f"{pathlib.Path(fname).stem}_x{scale}.raw"
+    np.tile(words, scale).tofile(out)
+    return out
+
+
+def compare(results, baseline, tolerance):
+    """list of stages whose throughput dropped by more than tolerance compared to baseline"""
+    regressions = []
+    for dataset, stages in results.items():
+        for name, result in stages.items():
+            reference = baseline.get(dataset, {}).get(name)
+            if reference is None or result["error"] is not None:
+                continue
+            for key in ("Mpackets/s", "Mhits/s"):
+                if reference[key] > 0 and result[key] < reference[key] * (1 - tolerance):
+                    regressions.append(
+                        f"{dataset} {name}: {key} {result[key]:.3f} < {reference[key]:.3f}"
+                    )
+    return regressions
+
+
+def print_report(results):
+    print(f"{'dataset':<32} {'stage':<16} {'s':>8} {'Mpackets/s':>11} {'Mhits/s':>9} {'RSS MB':>8}")
+    for dataset, stages in results.items():
+        for name, r in stages.items():
+            if r["error"] is not None:
+                print(f"{dataset:<32} {name:<16} failed: {r['error']}")
+                continue
+            print(
+                f"{dataset:<32} {name:<16} {r['seconds']:8.3f} {r['Mpackets/s']:11.3f} "
+                f"{r['Mhits/s']:9.3f} {r['peak RSS MB']:8.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acquisition and post-processing benchmarks")
+    parser.add_argument(
+        "files", nargs="*", help="raw files to use (default: tests/files/*.raw)",
+    )
+    parser.add_argument(
+        "-s", "--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+        help="stages to run (default: all)",
+    )
+    parser.add_argument(
+        "--scale", type=int, default=1, help="repeat every file this many times",
+    )
+    parser.add_argument(
+        "--synthetic", type=int, metavar="TRIGGERS",
+        help="add a synthetic dataset with this many triggers from pymepix.util.hitgenerator",
+    )
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline json to compare throughput against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="allowed relative throughput drop compared to the baseline (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    files = args.files or sorted(str(f) for f in FILES_PATH.glob("*.raw"))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.synthetic:
+            from pymepix.util.hitgenerator import HitGenerator
+
+            fname = pathlib.Path(tmp_dir) / f"synthetic_{args.synthetic}.raw"
+            HitGenerator(seed=0).write_raw(fname, args.synthetic, start_time=0)
+            files.append(str(fname))
+
+        for fname in files:
+            dataset = scaled_dataset(fname, args.scale, tmp_dir)
+            key = dataset.name
+            results[key] = {name: run_stage(name, dataset, tmp_dir) for name in args.stages}
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("regression:", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Import time of pymepix and its entry points
+
+Every module is imported in a fresh interpreter several times, the report lists the best wall
+time and the heavy third-party modules loaded on the way. ``python -X importtime`` tells which
+import is responsible for a regression.
+
+run: python benchmarks/bench_import.py [--repeat 5] [--json results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+
+REPO_PATH = pathlib.Path(__file__).resolve().parent.parent
+
+MODULES = [
+    "pymepix",
+    "pymepix.processing",
+    "pymepix.main",
+    "pymepix.pymepix_connection",
+    "pymepix.processing.acquisition",
+    "pymepix.post_processing",
+]
+
+HEAVY_MODULES = ["sklearn", "scipy", "joblib", "h5py", "serial", "tornado", "zmq", "tqdm"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"ms": elapsed * 1e3, "heavy": heavy}}))
+"""
+
+
+def time_import(module, repeat):
+    """best import time in ms of a module in a fresh interpreter and the heavy modules it loads"""
+    best = None
+    for _ in range(repeat):
+        # benchmark the checkout, not whatever pymepix happens to be installed
+        result = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=REPO_PATH,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            return {"ms": None, "heavy": [], "error": result.stderr.strip().splitlines()[-1]}
+        run = json.loads(result.stdout.splitlines()[-1])
+        if best is None or run["ms"] < best["ms"]:
+            best = run
+    best["error"] = None
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """list of modules whose import got slower by more than tolerance or loads new heavy modules"""
+    regressions = []
+    for module, result in results.items():
+        reference = baseline.get(module)
+        if reference is None or result["error"] is not None or reference["ms"] is None:
+            continue
+        if result["ms"] > reference["ms"] * (1 + tolerance):
+            regressions.append(f"{module}: {result['ms']:.1f} ms > {reference['ms']:.1f} ms")
+        new = sorted(set(result["heavy"]) - set(reference["heavy"]))
+        if new:
+            regressions.append(f"{module}: now imports {', '.join(new)}")
+    return regressions
+
+
+def print_report(results):
+    print(f"{'module':<40} {'ms':>8}  heavy modules")
+    for module, r in results.items():
+        if r["error"] is not None:
+            print(f"{module:<40} failed: {r['error']}")
+            continue
+        print(f"{module:<40} {r['ms']:8.1f}  {', '.join(r['heavy'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time benchmark")
+    parser.add_argument(
+        "modules", nargs="*", default=MODULES, help="modules to import (default: entry points)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="imports per module, the fastest counts",
+    )
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline json to compare import times against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5,
+        help="allowed relative slowdown compared to the baseline (default: 0.5)",
+    )
+    args = parser.parse_args()
+
+    results = {module: time_import(module, args.repeat) for module in args.modules}
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("regression:", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
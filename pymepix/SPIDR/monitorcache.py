@@ -0,0 +1,129 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+
+
+"""Read-through cache for slowly changing SPIDR monitoring values"""
+
+import functools
+import threading
+import time
+
+from pymepix.core.log import Logger
+
+
+def monitored(ttl):
+    """Caches a property getter for ttl seconds
+
+    The object has to provide ``_monitorRead(name, reader, ttl)``, see :class:`MonitorCache`.
+    Properties decorated like this are also updated by the background refresher.
+    """
+
+    def decorator(getter):
+        @functools.wraps(getter)
+        def wrapper(self):
+            return self._monitorRead(getter.__name__, lambda: getter(self), ttl)
+
+        wrapper.monitor_ttl = ttl
+        wrapper.monitor_getter = getter
+        return wrapper
+
+    return decorator
+
+
+def monitored_properties(obj):
+    """Names and getters of the monitored properties of an object"""
+    result = {}
+    for klass in reversed(type(obj).__mro__):
+        for name, attribute in vars(klass).items():
+            if isinstance(attribute, property) and hasattr(attribute.fget, "monitor_getter"):
+                result[name] = attribute.fget
+    return result
+
+
+class MonitorCache(Logger):
+    """Values read from the hardware with the time they were read
+
+    Reads within the ttl of a value are answered from memory. A background refresher can read all
+    monitored values in one sweep, so that readers never wait for the hardware.
+    """
+
+    def __init__(self):
+        Logger.__init__(self, MonitorCache.__name__)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._sources = []
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def read(self, key, reader, ttl):
+        """Cached value of key, calls reader if there is none younger than ttl seconds"""
+        with self._lock:
+            entry = self._values.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        value = reader()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._values[key] = (time.monotonic(), value)
+
+    def invalidate(self, *keys):
+        """Forgets the given keys, or everything if none are given. Call after writes to the hardware"""
+        with self._lock:
+            if not keys:
+                self._values.clear()
+            for key in keys:
+                self._values.pop(key, None)
+
+    def addSource(self, obj, key_prefix=()):
+        """Registers an object whose monitored properties are updated by :meth:`refresh`"""
+        self._sources.append((obj, key_prefix))
+
+    def refresh(self):
+        """Reads all monitored properties of all sources once"""
+        for obj, key_prefix in self._sources:
+            for name, fget in monitored_properties(obj).items():
+                try:
+                    self.put(key_prefix + (name,), fget.monitor_getter(obj))
+                except Exception as e:
+                    self.warning("Refreshing {} failed: {}".format(name, e))
+
+    def startRefresher(self, interval=2.0):
+        """Refreshes all monitored values every interval seconds in a background thread"""
+        if self._refresher is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.refresh()
+                self._stop.wait(interval)
+
+        self._refresher = threading.Thread(target=run, name="SPIDR monitor", daemon=True)
+        self._refresher.start()
+
+    def stopRefresher(self):
+        if self._refresher is not None:
+            self._stop.set()
+            self._refresher.join()
+            self._refresher = None
@@ -29,6 +29,7 @@ import numpy as np
 from pymepix.core.log import Logger
 
 from .error import PymePixException
+from .monitorcache import MonitorCache, monitored
 from .spidrcmds import SpidrCmds
 from .spidrdefs import SpidrRegs, SpidrShutterMode
 from .spidrdevice import SpidrDevice
@@ -90,6 +91,9 @@ class SPIDRController(Logger):
         self._vec_ntohl = np.vectorize(self.convertNtohl)
 
         self._pixel_config = np.ndarray(shape=(256, 256), dtype=np.uint8)
+        # monitoring values are read through a cache, so polling them doesn't compete with commands
+        self._monitor_cache = MonitorCache()
+        self._monitor_cache.addSource(self)
         # self.resetModule(SpidrReadoutSpeed.Default)
         self._devices = []
         self._initDevices()
@@ -107,6 +111,7 @@ class SPIDRController(Logger):
         for x in range(count):
             self._devices.append(SpidrDevice(self, x))
             self._devices[x].serverPort = self._udp_ip_port[1] + x
+            self._monitor_cache.addSource(self._devices[x], (x,))
 
     def prepare(self):
         self.disableExternalRefClock()
@@ -129,6 +134,9 @@ class SPIDRController(Logger):
 
         """
         self.requestGetInt(SpidrCmds.CMD_RESET_MODULE, 0, readout_speed.value)
+        for dev in self._devices:
+            dev.invalidatePixelConfig()
+        self.invalidateMonitoring()
 
     # -----------------Registers-----------------------
     @property
@@ -414,6 +422,7 @@ class SPIDRController(Logger):
         return self.requestGetInt(SpidrCmds.CMD_GET_FIRMWVERSION, 0)
 
     @property
+    @monitored(ttl=5.0)
     def localTemperature(self):
         """Local ????!?!? Temperature read from sensor
 
@@ -432,6 +441,7 @@ class SPIDRController(Logger):
         return self.requestGetInt(SpidrCmds.CMD_GET_LOCALTEMP, 0) / 1000
 
     @property
+    @monitored(ttl=5.0)
     def remoteTemperature(self):
         """Remote ????!?!? Temperature read from sensor
 
@@ -450,6 +460,7 @@ class SPIDRController(Logger):
         return self.requestGetInt(SpidrCmds.CMD_GET_REMOTETEMP, 0) / 1000
 
     @property
+    @monitored(ttl=5.0)
     def fpgaTemperature(self):
         """Temperature of FPGA board read from sensor
 
@@ -468,6 +479,7 @@ class SPIDRController(Logger):
         return self.requestGetInt(SpidrCmds.CMD_GET_FPGATEMP, 0) / 1000
 
     @property
+    @monitored(ttl=5.0)
     def humidity(self):
         """Humidity read from sensor
 
@@ -486,6 +498,7 @@ class SPIDRController(Logger):
         return self.requestGetInt(SpidrCmds.CMD_GET_HUMIDITY, 0)
 
     @property
+    @monitored(ttl=5.0)
     def pressure(self):
         """Pressure read from sensor
 
@@ -504,34 +517,42 @@ class SPIDRController(Logger):
         return self.requestGetInt(SpidrCmds.CMD_GET_PRESSURE, 0)
 
     @property
+    @monitored(ttl=5.0)
     def chipboardFanSpeed(self):
         return self.requestGetInt(SpidrCmds.CMD_GET_FANSPEED, 0, 0)
 
     @property
+    @monitored(ttl=5.0)
     def boardFanSpeed(self):
         return self.requestGetInt(SpidrCmds.CMD_GET_FANSPEED, 0, 1)
 
     @property
+    @monitored(ttl=5.0)
     def avdd(self):
         return tuple(self.requestGetInts(SpidrCmds.CMD_GET_AVDD, 0, 3) / 1000)
 
     @property
+    @monitored(ttl=5.0)
     def vdd(self):
         return tuple(self.requestGetInts(SpidrCmds.CMD_GET_VDD, 0, 3) / 1000)
 
     @property
+    @monitored(ttl=5.0)
     def dvdd(self):
         return tuple(self.requestGetInts(SpidrCmds.CMD_GET_DVDD, 0, 3) / 1000)
 
     @property
+    @monitored(ttl=1.0)
     def avddNow(self):
         return tuple(self.requestGetInts(SpidrCmds.CMD_GET_AVDD_NOW, 0, 3) / 1000)
 
     @property
+    @monitored(ttl=1.0)
     def vddNow(self):
         return tuple(self.requestGetInts(SpidrCmds.CMD_GET_VDD_NOW, 0, 3) / 1000)
 
     @property
+    @monitored(ttl=1.0)
     def dvddNow(self):
         return tuple(self.requestGetInts(SpidrCmds.CMD_GET_DVDD_NOW, 0, 3) / 1000)
 
@@ -605,6 +626,9 @@ class SPIDRController(Logger):
     def resetDevices(self):
         """ Resets all devices"""
         self.requestSetInt(SpidrCmds.CMD_RESET_DEVICES, 0, 0)
+        for dev in self._devices:
+            dev.invalidatePixelConfig()
+        self._monitor_cache.invalidate()
 
     def reinitDevices(self):
         """Resets and initializes all devices
@@ -616,6 +640,9 @@ class SPIDRController(Logger):
 
         """
         self.requestSetInt(SpidrCmds.CMD_REINIT_DEVICES, 0, 0)
+        for dev in self._devices:
+            dev.invalidatePixelConfig()
+        self._monitor_cache.invalidate()
 
     def setPowerPulseEnable(self, enable):
         self.requestSetInt(SpidrCmds.CMD_PWRPULSE_ENA, 0, int(enable))
@@ -639,8 +666,10 @@ class SPIDRController(Logger):
 
         """
         self.requestSetInt(SpidrCmds.CMD_BIAS_SUPPLY_ENA, 0, int(enable))
+        self._monitor_cache.invalidate(("biasVoltage",))
 
     @property
+    @monitored(ttl=1.0)
     def biasVoltage(self):
         """Bias voltage
 
@@ -677,6 +706,41 @@ class SPIDRController(Logger):
             "Setting bias Voltage to {} V (Dac value {})".format(volts, dac_value)
         )
         self.requestSetInt(SpidrCmds.CMD_SET_BIAS_ADJUST, 0, dac_value)
+        self._monitor_cache.invalidate(("biasVoltage",))
+
+    def _monitorRead(self, name, reader, ttl):
+        return self.readMonitored((name,), reader, ttl)
+
+    def readMonitored(self, key, reader, ttl):
+        """Reads a monitoring value through the cache, also used by the devices
+
+        Parameters
+        ----------
+        key : tuple
+            (name,) for values of the board, (device number, name) for values of a device
+        reader : function
+            Reads the value from SPIDR if the cached one is older than ttl
+        ttl : float
+            Maximum age of the cached value in seconds
+        """
+        return self._monitor_cache.read(key, reader, ttl)
+
+    def startMonitoring(self, interval=2.0):
+        """Reads all monitoring values (temperatures, voltages, link status, ...) every interval seconds
+
+        Reading these properties then only looks up the latest values instead of asking SPIDR.
+        """
+        self._monitor_cache.startRefresher(interval)
+
+    def stopMonitoring(self):
+        self._monitor_cache.stopRefresher()
+
+    def invalidateMonitoring(self, *keys):
+        """Forces the next read of the given monitoring values, or all if none are given, to ask SPIDR
+
+        Keys are (name,) for values of the board and (device number, name) for values of a device.
+        """
+        self._monitor_cache.invalidate(*keys)
 
     def enableDecoders(self, enable):
         """Determines whether the internal FPGA decodes ToA values
@@ -933,7 +997,7 @@ class SPIDRController(Logger):
     def setSpidrReg(self, addr, value):
         self.requestSetInts(SpidrCmds.CMD_SET_SPIDRREG, 0, [addr, value])
 
-    def request(self, cmd, dev_nr, message_length, expected_bytes=0):
+    def request(self, cmd, dev_nr, message_length, expected_bytes=0, payload=b""):
         """Sends a command and (may) receive a reply
 
         Parameters
@@ -946,12 +1010,14 @@ class SPIDRController(Logger):
             Length of the message in bytes
         expected_bytes: int
             Length of expected reply from request (if any) (Default: 0)
+        payload: bytes
+            Arguments of the command in network byte order, sent after the header
 
 
         Returns
         -----------
         :obj:`numpy.array` of :obj:`int` or :obj:`None`:
-            Returns a numpy array of ints if reply expected, otherwise None
+            Returns a copy of the reply as numpy array of ints if reply expected, otherwise None
 
 
         Raises
@@ -970,6 +1036,8 @@ class SPIDRController(Logger):
             self._req_buffer[1] = socket.htonl(message_length)
             self._req_buffer[2] = 0
             self._req_buffer[3] = socket.htonl(dev_nr)
+            # staged under the lock, the monitoring thread sends requests as well
+            self._req_buffer[4:].view(dtype=np.uint8)[: len(payload)] = np.frombuffer(payload, dtype=np.uint8)
             self.debug("Request Buffer: {}".format(self._req_buffer[0:message_length]))
             self._sock.send(self._req_buffer.tobytes()[0:message_length])
 
@@ -988,7 +1056,8 @@ class SPIDRController(Logger):
                     )
                 )
 
-            _replyMsg = np.frombuffer(self._reply_buffer, dtype=np.uint32)
+            # the buffer is reused by the next request once the lock is released
+            _replyMsg = np.frombuffer(self._reply_buffer, dtype=np.uint32).copy()
             self.debug("reply message: {}".format(_replyMsg))
             error = socket.ntohl(int(_replyMsg[2]))
             if error != 0:
@@ -1024,37 +1093,36 @@ class SPIDRController(Logger):
     def convertHtonl(self, x):
         return socket.htonl(int(x))
 
+    def _htonl_bytes(self, values):
+        return np.asarray(self._vec_htonl(values), dtype=np.uint32).tobytes()
+
     def requestGetInt(self, cmd, dev_nr, arg=0):
         msg_length = 20
-        self._req_buffer[4] = socket.htonl(arg)
 
-        reply = self.request(cmd, dev_nr, msg_length, msg_length)
+        reply = self.request(cmd, dev_nr, msg_length, msg_length, self._htonl_bytes([arg]))
 
         return socket.ntohl(int(reply[4]))
 
     def requestGetInts(self, cmd, dev_nr, num_ints, args=0):
         msg_length = 20
-        self._req_buffer[4] = socket.htonl(args)
         expected_len = (4 + num_ints) * 4
 
-        reply = self.request(cmd, dev_nr, msg_length, expected_len)
+        reply = self.request(cmd, dev_nr, msg_length, expected_len, self._htonl_bytes([args]))
 
         return self._vec_ntohl(reply[4 : 4 + num_ints])
 
     def requestGetBytes(self, cmd, dev_nr, expected_bytes, args=0):
         msg_length = (4 + 1) * 4
-        self._req_buffer[4] = 0
         expected_len = 16 + expected_bytes
         # Cast reply as an uint8
-        reply = self.request(cmd, dev_nr, msg_length, expected_len)
+        reply = self.request(cmd, dev_nr, msg_length, expected_len, self._htonl_bytes([0]))
         return np.copy(reply[4:].view(dtype=np.uint8)[:expected_bytes])
 
     def requestGetIntBytes(self, cmd, dev_nr, expected_bytes, args=0):
         msg_length = (4 + 1) * 4
-        self._req_buffer[4] = socket.htonl(args)
         expected_len = 20 + expected_bytes
         # Cast reply as an uint8
-        reply = self.request(cmd, dev_nr, msg_length, expected_len)
+        reply = self.request(cmd, dev_nr, msg_length, expected_len, self._htonl_bytes([args]))
         int_val = socket.ntohl(int(reply[4]))
 
         byte_val = np.copy(reply[5:].view(dtype=np.uint8)[:expected_bytes])
@@ -1063,26 +1131,21 @@ class SPIDRController(Logger):
 
     def requestSetInt(self, cmd, dev_nr, value):
         msg_length = (4 + 1) * 4
-        self._req_buffer[4] = socket.htonl(value)
 
-        self.request(cmd, dev_nr, msg_length, 20)
+        self.request(cmd, dev_nr, msg_length, 20, self._htonl_bytes([value]))
 
     def requestSetInts(self, cmd, dev_nr, value):
         num_ints = len(value)
         msg_length = (4 + num_ints) * 4
 
-        self._req_buffer[4 : 4 + num_ints] = self._vec_htonl(value)[:]
-
-        self.request(cmd, dev_nr, msg_length, 20)
+        self.request(cmd, dev_nr, msg_length, 20, self._htonl_bytes(value))
 
     def requestSetIntBytes(self, cmd, dev_nr, value_int, value_bytes):
         num_bytes = len(value_bytes)
         msg_length = (4 + 1) * 4 + num_bytes
-        self._req_buffer[4] = socket.htonl(value_int)
-
-        self._req_buffer[5:].view(dtype=np.uint8)[:num_bytes] = value_bytes[:]
+        payload = self._htonl_bytes([value_int]) + np.asarray(value_bytes, dtype=np.uint8).tobytes()
 
-        self.request(cmd, dev_nr, msg_length, 20)
+        self.request(cmd, dev_nr, msg_length, 20, payload)
 
     def prepare(self):
         self.disableExternalRefClock()
@@ -24,6 +24,7 @@ import numpy as np
 
 from pymepix.core.log import Logger
 
+from .monitorcache import monitored
 from .spidrcmds import SpidrCmds
 from .spidrdefs import SpidrRegs
 
@@ -53,6 +54,7 @@ class SpidrDevice(Logger):
         self.info("Device {} with id {} created".format(self._dev_num, self.deviceId))
 
         self.clearPixelConfig()
+        self.invalidatePixelConfig()
 
     def clearPixelConfig(self):
         self._pixel_mask = np.ones(shape=(256, 256), dtype=np.uint8)
@@ -89,11 +91,27 @@ class SpidrDevice(Logger):
             SpidrCmds.CMD_SET_HEADERFILTER, self._dev_num, to_write
         )
 
+    def invalidatePixelConfig(self):
+        """Forgets which pixel configuration was uploaded last
+
+        The next upload will send the full configuration. Called whenever the
+        configuration on the chip is changed by anything else than an upload.
+        """
+        self._uploaded_pixels = None
+
     def reset(self):
         self._ctrl.requestSetInt(SpidrCmds.CMD_RESET_DEVICE, self._dev_num, 0)
+        self.invalidatePixelConfig()
+        self._ctrl.invalidateMonitoring((self._dev_num, "linkStatus"))
 
     def reinitDevice(self):
         self._ctrl.requestSetInt(SpidrCmds.CMD_REINIT_DEVICE, self._dev_num, 0)
+        self.invalidatePixelConfig()
+        self._ctrl.invalidateMonitoring((self._dev_num, "linkStatus"))
+
+    def _monitorRead(self, name, reader, ttl):
+        # shares the cache and refresher of the controller
+        return self._ctrl.readMonitored((self._dev_num, name), reader, ttl)
 
     def setSenseDac(self, dac_code):
         self._ctrl.requestSetInt(SpidrCmds.CMD_SET_SENSEDAC, self._dev_num, dac_code)
@@ -156,6 +174,7 @@ class SpidrDevice(Logger):
         self._ctrl.requestSetInt(SpidrCmds.CMD_SET_READOUTSPEED, self._dev_num, mbits)
 
     @property
+    @monitored(ttl=1.0)
     def linkStatus(self):
         reg_addr = SpidrRegs.SPIDR_FE_GTX_CTRL_STAT_I + (self._dev_num << 2)
         status = self._ctrl.getSpidrReg(reg_addr)
@@ -238,6 +257,7 @@ class SpidrDevice(Logger):
 
     def resetPixels(self):
         self._ctrl.requestSetInt(SpidrCmds.CMD_RESET_PIXELS, self._dev_num, 0)
+        self.invalidatePixelConfig()
 
     def resetPixelConfig(self, index=-1, all_pixels=False):
 
@@ -268,13 +288,30 @@ class SpidrDevice(Logger):
     def setPixelTestBit(self, test):
         self._pixel_test[...] = test[...] & 0x1
 
-    def uploadPixelConfig(self, formatted=True, columns_per_packet=1):
+    def uploadPixelConfig(self, formatted=True, columns_per_packet=3, force=False):
+        """Uploads the locally stored pixel configuration to the device
+
+        A copy of the last uploaded configuration is kept. If there is one, only the
+        packets containing changed columns are sent and the pixels on the chip are
+        not reset.
+
+        Parameters
+        ----------
+        formatted: bool, optional
+            Send the configuration in the packed 6 bit format (Default: True)
+        columns_per_packet: int, optional
+            Number of pixel columns sent with each request, clamped to [1, 4]
+            as this is the most SPIDR accepts in one packet (Default: 3)
+        force: bool, optional
+            Reset the pixels and upload the full configuration (Default: False)
+
+        """
 
         columns_per_packet = max(1, columns_per_packet)
         columns_per_packet = min(4, columns_per_packet)
 
         if formatted:
-            self._uploadFormatted(columns_per_packet)
+            self._uploadFormatted(columns_per_packet, force)
             return
 
         raise NotImplementedError
@@ -285,61 +322,54 @@ class SpidrDevice(Logger):
 
         6 bits are needed for each pixel, (1 4 1)
         so we pack the information for 4 pixels in 3 bytes.
+        The packing is done on the whole array at once, the number of pixels
+        has to be a multiple of 4.
         """
-        size = matrix_packet.size * 3 // 4
-        formatted = np.zeros((size,), dtype=np.uint8)
+        pixels = (np.asarray(matrix_packet).reshape(-1, 4) & 0x3F).astype(np.uint8)
 
-        for x in range(0, matrix_packet.size, 4):
-            pixel1, pixel2, pixel3, pixel4 = matrix_packet[x : x + 4]
+        formatted = np.empty((pixels.shape[0], 3), dtype=np.uint8)
+        formatted[:, 0] = (pixels[:, 0] << 2) | (pixels[:, 1] >> 4)
+        formatted[:, 1] = ((pixels[:, 1] << 4) & 0xF0) | (pixels[:, 2] >> 2)
+        formatted[:, 2] = ((pixels[:, 2] << 6) & 0xC0) | pixels[:, 3]
 
-            byte1 = (pixel1 << 2) | (pixel2 >> 4)
-            byte2 = ((pixel2 << 4) & 0xF0) | (pixel3 >> 2)
-            byte3 = ((pixel3 << 6) & 0xC0) | pixel4
+        return formatted.reshape(-1)
 
-            position = x * 3 // 4
-            formatted[position : (position + 3)] = [byte1, byte2, byte3]
-
-        return formatted
-
-    def _uploadFormatted(self, columns_per_packet):
+    def _uploadFormatted(self, columns_per_packet, force=False):
         """
         Packs and sends pixel config.
 
         Packs the pixel config information for each pixel as testbit (1b) - threshold (4b) - masking bit (1b).
         A pixel is masked if the according bit is 1.
         """
-        self.resetPixels()
-
         # Flatten and unpack the bits of the matrix selecting only the necessary bits
         final_pixels = (
             self._pixel_mask
             | (self._pixel_threshold & 0xF) << 1
             | (self._pixel_test & 1) << 5
-        )
+        ).astype(np.uint8)
         self.debug("FINAL_PIXELS {}".format(final_pixels))
 
-        # create 85 packets of 3 rows and a last one of one row
-        for x in range(0, 255, 3):
-            start_col = x
-            end_col = x + 3
-            matrix_packet = final_pixels[start_col:end_col, :].reshape(768)
+        start_cols = np.arange(0, 256, columns_per_packet)
+        if force or self._uploaded_pixels is None:
+            self.resetPixels()
+        else:
+            changed_cols = np.any(final_pixels != self._uploaded_pixels, axis=1)
+            start_cols = start_cols[np.logical_or.reduceat(changed_cols, start_cols)]
+            self.debug("Uploading {} changed packets".format(start_cols.size))
+
+        # pack the whole matrix in one go, each column takes 192 bytes
+        formatted = self._formatPixelBits(final_pixels).reshape(256, 256 * 3 // 4)
+
+        # the last packet holds the remaining columns if 256 is not a multiple of columns_per_packet
+        for start_col in start_cols.tolist():
             self._ctrl.requestSetIntBytes(
                 SpidrCmds.CMD_SET_PIXCONF,
                 self._dev_num,
-                x,
-                self._formatPixelBits(matrix_packet),
+                start_col,
+                formatted[start_col : start_col + columns_per_packet].reshape(-1),
             )
 
-        # last row
-        matrix_packet = final_pixels[255, :].reshape(256)
-
-        self._ctrl.requestSetIntBytes(
-            SpidrCmds.CMD_SET_PIXCONF,
-            self._dev_num,
-            255,
-            self._formatPixelBits(matrix_packet),
-        )
-        # Should be length 393216
+        self._uploaded_pixels = final_pixels
 
     @property
     def timer(self):
@@ -19,6 +19,25 @@
 # see <https://www.gnu.org/licenses/>.
 
 from pymepix.processing import MessageType
-from pymepix.pymepix_connection import PollBufferEmpty, PymepixConnection
 from pymepix.timepixdef import *
-from pymepix.post_processing import run_post_processing
+
+# loaded on first use, they pull in zmq, h5py, tqdm, ...
+_LAZY = {
+    "PollBufferEmpty": "pymepix.pymepix_connection",
+    "PymepixConnection": "pymepix.pymepix_connection",
+    "run_post_processing": "pymepix.post_processing",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
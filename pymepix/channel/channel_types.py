@@ -6,6 +6,7 @@ class ChannelDataType(Enum):
     PIXEL = 'pixel'
     TOF = 'tof'
     CENTROID = 'centroid'
+    HISTOGRAM = 'hist'
 
 
 class Commands(Enum):
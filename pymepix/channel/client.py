@@ -3,16 +3,39 @@ import zmq
 
 import queue
 
+from pymepix.channel.channel_types import ChannelDataType
+from pymepix.channel.serialization import decode_message
+
 
 class Client(threading.Thread):
+    """Receives data from a :class:`Data_Channel`
+
+    Parameters
+    ----------
+    channel_address : tuple
+        ip and port of the data channel
+    callback : function, optional
+        Called with every received message
+    queue_maxsize : int
+        Messages kept in the queue, newer ones are dropped if it is full (Default: 4)
+    topics : list of str, optional
+        Data types or decimated streams to receive, see :func:`pymepix.channel.streams.stream_topic`,
+        e.g. ``["centroid", "pixel/hist=64,hz=1"]``. Commands are always received. (Default: everything)
+    """
 
-    def __init__(self, channel_address, callback=None, queue_maxsize=4):
+    def __init__(self, channel_address, callback=None, queue_maxsize=4, topics=None):
         threading.Thread.__init__(self)
         self.daemon = True
         self._socket = None
         self._address = "tcp://{}:{}".format(*channel_address)
         self._callback = callback
         self.q = queue.Queue(queue_maxsize)
+        if topics is None:
+            self.topics = None
+        else:
+            self.topics = set(topics) | {ChannelDataType.COMMAND.value}
+        self._last_seq = {}
+        self.lost = 0
         self.register(channel_address)
         self.running = True
         self.start()
@@ -34,12 +57,34 @@ class Client(threading.Thread):
         print('connecting to address: ', "tcp://{}:{}".format(*channel_address))
         # Connects to a bound socket
         self._socket.connect("tcp://{}:{}".format(*channel_address))
-        self._socket.subscribe("")
+        for topic in self.topics if self.topics is not None else [""]:
+            self._socket.subscribe(topic)
+
+    def receive(self):
+        """Receives one message as dict with type, data and sequence number
+
+        The type is the topic of the message, e.g. ``pixel`` or ``pixel/hist=64``.
+        The arrays in data are read-only views into the received message.
+        Messages lost between channel and client are counted in ``lost``.
+        Returns None for messages of topics which were not subscribed but match one by prefix.
+        """
+        data_type, data, seq = decode_message(self._socket.recv_multipart(copy=False))
+        if self.topics is not None and data_type not in self.topics:
+            return None
+        last_seq = self._last_seq.get(data_type)
+        if last_seq is not None and seq > last_seq + 1:
+            self.lost += seq - last_seq - 1
+        self._last_seq[data_type] = seq
+        return {'type': data_type, 'data': data, 'seq': seq}
 
     def run(self):
         print('start receiving data')
         while self.running:
-            obj = self._socket.recv_pyobj()
+            if not self._socket.poll(100):
+                continue
+            obj = self.receive()
+            if obj is None:
+                continue
             if not self.q.full():
                 self.q.put_nowait(obj)
             if self._callback != None:
@@ -1,20 +1,37 @@
+import queue
 import threading
 import zmq
-import queue
 
 from pymepix.channel.channel_types import ChannelDataType
+from pymepix.channel.serialization import encode_message
+from pymepix.channel.streams import Stream
+from pymepix.core.dispatcher import BoundedQueue, DropPolicy
+from pymepix.core.log import Logger
 from pymepix.processing.datatypes import MessageType
 
+_CHANNEL_TYPES = {
+    MessageType.PixelData: ChannelDataType.PIXEL,
+    MessageType.EventData: ChannelDataType.TOF,
+    MessageType.CentroidData: ChannelDataType.CENTROID,
+}
 
-class Data_Channel(threading.Thread):
 
-    def __init__(self):
+class Data_Channel(threading.Thread, Logger):
+
+    def __init__(self, maxsize=100, policy=DropPolicy.DROP_OLDEST, detector_shape=(256, 256)):
         threading.Thread.__init__(self)
+        Logger.__init__(self, "Data_Channel")
         self.daemon = True
-        self.q = queue.Queue()
+        # bounded, so a slow network drops batches instead of growing memory
+        self.q = BoundedQueue(maxsize, policy)
         self.socket = None
         self.address = None
         self.bound = False
+        # sequence numbers per topic, a client only sees the topics it subscribed to
+        self.seq = {}
+        self.detector_shape = detector_shape
+        self.subscriptions = set()
+        self.streams = {}
         self.lock = threading.Lock()
 
     def public_address(self):
@@ -27,7 +44,8 @@ class Data_Channel(threading.Thread):
                 host, s_port = api_address.split("//")[-1].split(":")
                 self.port = int(s_port)
                 context = zmq.Context()
-                self.socket = context.socket(zmq.PUB)
+                # XPUB tells which topics are subscribed, derived streams are only computed if needed
+                self.socket = context.socket(zmq.XPUB)
                 self.socket.bind(f"tcp://{host}:{s_port}")
 
     def unregister(self):
@@ -36,30 +54,82 @@ class Data_Channel(threading.Thread):
                 self.socket.unbind(self.address)
                 self.address = None
                 self.socket = None
+                self.subscriptions.clear()
+                self.streams.clear()
 
     def stop(self):
-        self.q.put(None)
+        self.q.put(None, force=True)
+
+    def _update_subscriptions(self):
+        """Reads subscribe/unsubscribe notifications from the XPUB socket"""
+        while self.socket.poll(0):
+            message = self.socket.recv()
+            if not message:
+                continue
+            topic = message[1:].decode(errors="replace")
+            if message[0] == 1:
+                self.subscriptions.add(topic)
+                if "/" in topic and topic not in self.streams:
+                    try:
+                        self.streams[topic] = Stream(topic, self.detector_shape)
+                    except ValueError as e:
+                        self.warning(f"Ignoring subscription: {e}")
+            else:
+                self.subscriptions.discard(topic)
+                self.streams.pop(topic, None)
+
+    def _subscribed(self, topic):
+        return any(topic.startswith(subscription) for subscription in self.subscriptions)
+
+    def _publish(self, topic, data):
+        seq = self.seq.get(topic, 0)
+        self.socket.send_multipart(encode_message(topic, data, seq), copy=False)
+        self.seq[topic] = seq + 1
 
     def run(self):
         while True:
-            new_data = self.q.get()
-            if new_data is None:
-                break
+            try:
+                new_data = self.q.get(timeout=0.1)
+            except queue.Empty:
+                new_data = False
 
             with self.lock:
-                if self.socket is not None:
-                    self.socket.send_pyobj(new_data)
+                if self.socket is None:
+                    if new_data is None:
+                        break
+                    continue
+                self._update_subscriptions()
+                if new_data is None:
+                    break
+                if new_data is False:
+                    continue
+
+                data_type, data = new_data['type'], new_data['data']
+                # raw data is only serialized if a client wants it, e.g. not for 'pixel/hz=1' alone
+                if data_type == ChannelDataType.COMMAND.value or self._subscribed(data_type):
+                    self._publish(data_type, data)
+                for stream in list(self.streams.values()):
+                    if stream.data_type == data_type:
+                        decimated = stream.process(data)
+                        if decimated is not None:
+                            self._publish(stream.topic, decimated)
 
     def send(self, data_type, data):
         if data_type == ChannelDataType.COMMAND:
-            self.q.put_nowait({'type': data_type.value, 'data': data.value})
+            # commands are never dropped
+            self.q.put_nowait({'type': data_type.value, 'data': data.value}, force=True)
         else:
             self.q.put_nowait({'type': data_type.value, 'data': data})
 
+    @staticmethod
+    def message_for(message_type, data):
+        """The channel message for pipeline output, None if the type is not published"""
+        data_type = _CHANNEL_TYPES.get(message_type)
+        if data_type is None:
+            return None
+        return {'type': data_type.value, 'data': data}
+
     def send_data_by_message_type(self, message_type, data):
-        if message_type == MessageType.PixelData:
-            self.q.put_nowait({'type': ChannelDataType.PIXEL.value, 'data': data})
-        elif message_type == MessageType.EventData:
-            self.q.put_nowait({'type': ChannelDataType.TOF.value, 'data': data})
-        elif message_type == MessageType.CentroidData:
-            self.q.put_nowait({'type': ChannelDataType.CENTROID.value, 'data': data})
+        message = self.message_for(message_type, data)
+        if message is not None:
+            self.q.put_nowait(message)
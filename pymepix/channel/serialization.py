@@ -0,0 +1,100 @@
+"""Wire format of the data channel
+
+Every message is a zmq multipart message:
+
+1. the channel data type (``ChannelDataType.value``), usable as zmq topic
+2. a small JSON header with the sequence number and, for every array, its dtype and shape
+   (or the command for ``ChannelDataType.COMMAND``)
+3. one frame per array holding its raw buffer, sent without copying
+
+A consumer does not need pymepix or pickle to read the data, the header is enough to
+reconstruct the arrays, e.g. with ``np.frombuffer``.
+"""
+
+import json
+
+import numpy as np
+
+PROTOCOL_VERSION = 1
+
+
+def encode_message(data_type, data, seq):
+    """Splits a message into frames for ``socket.send_multipart(frames, copy=False)``
+
+    Parameters
+    ----------
+    data_type : str
+        Value of the :class:`ChannelDataType`
+    data
+        None, a numpy array, a tuple/list of arrays (entries may be None) or for commands a string
+    seq : int
+        Sequence number of the message, lets the receiver detect lost messages
+
+    Returns
+    -------
+    list
+        topic frame, header frame and the array buffers
+    """
+    header = {"v": PROTOCOL_VERSION, "seq": seq}
+    buffers = []
+    if data is None:
+        header["container"] = "none"
+    elif isinstance(data, str):
+        header["container"] = "str"
+        header["data"] = data
+    else:
+        if isinstance(data, (tuple, list)):
+            header["container"] = "tuple"
+            arrays = data
+        else:
+            header["container"] = "array"
+            arrays = (data,)
+
+        header["arrays"] = []
+        for array in arrays:
+            if array is None:
+                header["arrays"].append(None)
+                continue
+            array = np.ascontiguousarray(array)
+            header["arrays"].append([array.dtype.str, array.shape])
+            buffers.append(array)
+
+    return [data_type.encode(), json.dumps(header).encode()] + buffers
+
+
+def decode_message(frames):
+    """Reconstructs a message from the received frames
+
+    The arrays are views into the received frames, no data is copied. They are read-only.
+
+    Parameters
+    ----------
+    frames : list
+        Frames as returned by ``socket.recv_multipart``, with or without ``copy=False``
+
+    Returns
+    -------
+    tuple
+        data type, data and sequence number
+    """
+    frames = [memoryview(f.buffer) if hasattr(f, "buffer") else memoryview(f) for f in frames]
+    data_type = bytes(frames[0]).decode()
+    header = json.loads(bytes(frames[1]))
+
+    container = header["container"]
+    if container == "none":
+        data = None
+    elif container == "str":
+        data = header["data"]
+    else:
+        buffers = iter(frames[2:])
+        data = tuple(
+            None
+            if desc is None
+            else np.frombuffer(next(buffers), dtype=np.dtype(desc[0])).reshape(desc[1])
+            for desc in header["arrays"]
+        )
+        if container == "array":
+            data = data[0]
+
+    return data_type, data, header["seq"]
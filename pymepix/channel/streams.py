@@ -0,0 +1,132 @@
+"""Subscriptions with server-side decimation on the data channel
+
+A client subscribes to the plain data type (``pixel``, ``tof``, ``centroid``) to get every batch,
+or to a derived stream which the channel produces only while somebody is subscribed to it::
+
+    pixel/every=10          every 10th batch
+    tof/hz=2                at most 2 batches per second
+    centroid/hist=128       a 128x128 histogram of x, y instead of the hits
+    pixel/hist=64,hz=1      a 64x64 image once per second
+
+Batches skipped by ``every`` or ``hz`` are dropped, except for histograms which accumulate all
+hits until the next one is sent. Use :func:`stream_topic` to build the topic.
+"""
+
+import time
+
+import numpy as np
+
+from pymepix.channel.channel_types import ChannelDataType
+
+_OPTIONS = {"every": int, "hz": float, "hist": int}
+
+# index of the x and y arrays in the data of each type
+_XY_INDEX = {
+    ChannelDataType.PIXEL.value: (0, 1),
+    ChannelDataType.TOF.value: (1, 2),
+    ChannelDataType.CENTROID.value: (1, 2),
+}
+
+
+def stream_topic(data_type, every=None, hz=None, hist=None):
+    """Topic of a (decimated) data stream
+
+    Parameters
+    ----------
+    data_type : :class:`ChannelDataType` or str
+        Type of the data
+    every : int, optional
+        Send only every Nth batch
+    hz : float, optional
+        Send at most this many batches per second
+    hist : int, optional
+        Send a hist x hist histogram of the hit positions instead of the hits
+
+    Returns
+    -------
+    str
+        Topic to subscribe to
+    """
+    base = data_type.value if isinstance(data_type, ChannelDataType) else data_type
+    options = {"every": every, "hz": hz, "hist": hist}
+    spec = ",".join(f"{name}={value:g}" for name, value in options.items() if value is not None)
+    topic = f"{base}/{spec}" if spec else base
+    parse_topic(topic)
+    return topic
+
+
+def parse_topic(topic):
+    """Splits a topic into data type and decimation options
+
+    Raises
+    ------
+    ValueError
+        If the topic is no valid data stream
+    """
+    base, _, spec = topic.partition("/")
+    if base not in _XY_INDEX:
+        raise ValueError(f"Unknown data type {base} in topic {topic}")
+    options = {}
+    if spec:
+        for option in spec.split(","):
+            name, _, value = option.partition("=")
+            if name not in _OPTIONS:
+                raise ValueError(f"Unknown option {name} in topic {topic}")
+            options[name] = _OPTIONS[name](value)
+            if options[name] <= 0:
+                raise ValueError(f"Option {name} in topic {topic} must be positive")
+    return base, options
+
+
+class Stream:
+    """State of one decimated stream on the server side
+
+    Parameters
+    ----------
+    topic : str
+        Topic as built by :func:`stream_topic`
+    detector_shape : tuple
+        Number of pixels in x and y, the range of the histogram (Default: (256, 256))
+    """
+
+    def __init__(self, topic, detector_shape=(256, 256)):
+        self.topic = topic
+        self.data_type, options = parse_topic(topic)
+        self.every = options.get("every", 1)
+        self.min_interval = 1.0 / options["hz"] if "hz" in options else 0.0
+        self.bins = options.get("hist")
+        self.detector_shape = detector_shape
+        self._count = 0
+        self._last_sent = -np.inf
+        self._histogram = None
+
+    def _accumulate(self, data):
+        if self._histogram is None:
+            self._histogram = np.zeros((self.bins, self.bins), dtype=np.uint32)
+        ix, iy = _XY_INDEX[self.data_type]
+        x = (np.asarray(data[ix], dtype=np.float64) * self.bins / self.detector_shape[0]).astype(np.int64)
+        y = (np.asarray(data[iy], dtype=np.float64) * self.bins / self.detector_shape[1]).astype(np.int64)
+        valid = (x >= 0) & (x < self.bins) & (y >= 0) & (y < self.bins)
+        counts = np.bincount(x[valid] * self.bins + y[valid], minlength=self.bins * self.bins)
+        self._histogram += counts.reshape(self._histogram.shape).astype(np.uint32)
+
+    def process(self, data, now=None):
+        """Takes one batch, returns what to send or None if nothing is due"""
+        if self.bins is not None and data is not None:
+            self._accumulate(data)
+
+        self._count += 1
+        if self._count < self.every:
+            return None
+        now = time.monotonic() if now is None else now
+        if now - self._last_sent < self.min_interval:
+            return None
+
+        self._count = 0
+        self._last_sent = now
+        if self.bins is None:
+            return data
+        histogram, self._histogram = self._histogram, None
+        if histogram is None:
+            histogram = np.zeros((self.bins, self.bins), dtype=np.uint32)
+        return histogram
@@ -18,17 +18,31 @@
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
 
+import hashlib
 import xml.etree.ElementTree as et
 import zipfile
 import os
+import shutil
 import tempfile
 
 import numpy as np
 from pymepix.core.log import Logger
+from pymepix.util.storage import cache_file, remove_stale_cache
 
 from .timepixconfig import TimepixConfig
 
 
+def _reverse_bits(num, bitsize=4):
+    """Reverses the binary representation of num, padded to at least bitsize bits"""
+    reverse = bin(num)[-1:1:-1]
+    reverse = reverse + (bitsize - len(reverse)) * "0"
+    return int(reverse, 2)
+
+
+# lookup table for the bit reversal of the (8 bit) threshold values
+_REVERSE_BITS_LUT = np.array([_reverse_bits(x) for x in range(256)], dtype=np.int16)
+
+
 class SophyConfig(TimepixConfig, Logger):
     """This class provides functionality for interpreting a .spx config file from SoPhy."""
 
@@ -80,26 +94,76 @@ class SophyConfig(TimepixConfig, Logger):
         self.loadFile(self.__filename)
 
     def loadFile(self, filename):
-        spx = zipfile.ZipFile(filename)
-        names = spx.namelist()
-        xml_string = spx.read(names[0])
+        if self._loadCache(filename):
+            self.debug(f"Loaded {filename} from cache")
+            return
+
+        with zipfile.ZipFile(filename) as spx:
+            names = spx.namelist()
+            xml_string = spx.read(names[0])
+
+            self.parseDAC(xml_string)
 
-        self.parseDAC(xml_string)
+            self.parsePixelConfig(spx, names[-3:])
 
-        self.parsePixelConfig(spx, names[-3:])
+        self._saveCache(filename)
 
     def saveMask(self):
-        old_file = zipfile.ZipFile(self.__filename, mode='r')
-        
-        names = old_file.namelist()
-        mask_filename = names[-3]
+        with zipfile.ZipFile(self.__filename, mode='r') as old_file:
+            names = old_file.namelist()
+            mask_filename = names[-3]
 
-        buffer = old_file.read(mask_filename)
+            buffer = old_file.read(mask_filename)
         buffer_header = buffer[:27]
 
         new_buffer = buffer_header + SophyConfig.__transform_to_bytes(self._mask)
 
         SophyConfig.__replace_in_zip(self.__filename, mask_filename, new_buffer)
+        # the modification time changed, store the current state under the new key
+        self._saveCache(self.__filename)
+
+    @staticmethod
+    def _cachePrefix(filename):
+        """Prefix of the cache files of one .spx file, older versions are removed when a new one is saved"""
+        path_digest = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()[:16]
+        return f"sophy-{path_digest}"
+
+    @staticmethod
+    def _cacheFile(filename):
+        """Cache file for the parsed config, keyed by path, modification time and size of the .spx file"""
+        stat = os.stat(filename)
+        key = f"{stat.st_mtime_ns}:{stat.st_size}"
+        return cache_file(SophyConfig._cachePrefix(filename), key)
+
+    def _loadCache(self, filename):
+        """Loads the parsed config from cache, returns False if there is no valid cache entry"""
+        try:
+            with np.load(SophyConfig._cacheFile(filename), allow_pickle=False) as cache:
+                dac_values = dict(
+                    zip(cache["dac_keys"].tolist(), cache["dac_values"].tolist())
+                )
+                mask, test, thresh = cache["mask"], cache["test"], cache["thresh"]
+        except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+            return False
+
+        self._dac_values.update(dac_values)
+        self._mask, self._test, self._thresh = mask, test, thresh
+        return True
+
+    def _saveCache(self, filename):
+        try:
+            cache = SophyConfig._cacheFile(filename)
+            np.savez(
+                cache,
+                dac_keys=np.array(list(self._dac_values.keys())),
+                dac_values=np.array(list(self._dac_values.values())),
+                mask=self._mask,
+                test=self._test,
+                thresh=self._thresh,
+            )
+            remove_stale_cache(SophyConfig._cachePrefix(filename), cache)
+        except OSError as e:
+            self.warning(f"Could not write config cache for {filename}: {e}")
 
     @staticmethod
     def __transform_to_bytes(mask):
@@ -111,21 +175,38 @@ class SophyConfig(TimepixConfig, Logger):
 
     @staticmethod
     def __replace_in_zip(zip_filename, filename_to_replace, data_to_replace):
-
-        tmpfd, tmpname = tempfile.mkstemp(dir=os.path.dirname(zip_filename))
-        os.close(tmpfd)
-        
-        with zipfile.ZipFile(zip_filename, mode='r') as zin:
-            with zipfile.ZipFile(tmpname, mode='w') as zout:
-                for name in zin.namelist():
-                    if name != filename_to_replace:
-                        zout.writestr(name, zin.read(name))
-                    else:
-                        zout.writestr(filename_to_replace, data_to_replace)
-
-         # replace with the temp archive
-        os.remove(zip_filename)
-        os.rename(tmpname, zip_filename)
+        """Replaces a single member of the archive
+
+        The (small) archive is rebuilt in a temporary file next to it, checked and then renamed
+        over the original. So the original is complete until the new one is.
+        """
+        tmpfd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(zip_filename)))
+        try:
+            with os.fdopen(tmpfd, "wb") as f:
+                with zipfile.ZipFile(zip_filename) as src, zipfile.ZipFile(f, mode="w") as dst:
+                    if filename_to_replace not in src.namelist():
+                        raise KeyError(f"There is no item named {filename_to_replace!r} in the archive")
+                    dst.comment = src.comment
+                    for info in src.infolist():
+                        new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                        new_info.compress_type = info.compress_type
+                        new_info.external_attr = info.external_attr
+                        new_info.comment = info.comment
+                        if info.filename == filename_to_replace:
+                            dst.writestr(new_info, data_to_replace)
+                        else:
+                            dst.writestr(new_info, src.read(info))
+                f.flush()
+                os.fsync(f.fileno())
+            with zipfile.ZipFile(tmpname) as zf:
+                bad = zf.testzip()
+                if bad is not None:
+                    raise zipfile.BadZipFile(f"{bad} is corrupt in the rewritten {zip_filename}")
+            shutil.copymode(zip_filename, tmpname)
+            os.replace(tmpname, zip_filename)
+        except BaseException:
+            os.remove(tmpname)
+            raise
 
     def parseDAC(self, xmlstring):
         """Reads and formats DAC parameters"""
@@ -163,11 +244,7 @@ class SophyConfig(TimepixConfig, Logger):
         pass
 
     def _reverseBits(self, num):
-        bitsize = 4
-        binary = bin(num)
-        reverse = binary[-1:1:-1]
-        reverse = reverse + (bitsize - len(reverse)) * "0"
-        return int(reverse, 2)
+        return _reverse_bits(num)
 
     def parsePixelConfig(self, zip_file, file_names):
         """Reads and formats the pixel data from config file.
@@ -185,9 +262,7 @@ class SophyConfig(TimepixConfig, Logger):
         buffer = zip_file.read(file_names[2])
         self._thresh = np.frombuffer(buffer[27:], dtype=np.int16).copy() >> 8
         self._thresh = np.fliplr(
-            np.array([self._reverseBits(x) for x in self._thresh])
-            .reshape(256, 256)
-            .transpose()
+            _REVERSE_BITS_LUT[self._thresh & 0xFF].reshape(256, 256).transpose()
         )
 
     @property
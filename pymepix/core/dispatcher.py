@@ -0,0 +1,359 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Non-blocking fan-out of acquired data to several consumers
+
+Every consumer (poll buffer, user callback, data channel, data streams) gets its own bounded queue
+with a drop policy, so a slow consumer loses data instead of stalling the acquisition or growing memory.
+"""
+
+import asyncio
+import queue
+import threading
+from collections import deque
+from enum import Enum
+
+import numpy as np
+
+from pymepix.core.log import Logger
+
+__all__ = ["DropPolicy", "BoundedQueue", "CallbackWorker", "DataStream", "Dispatcher"]
+
+
+class DropPolicy(Enum):
+    """What a full :class:`BoundedQueue` does with new items"""
+
+    DROP_OLDEST = "drop_oldest"
+    """Discard the oldest queued item, consumers always see the latest data"""
+    DROP_NEWEST = "drop_newest"
+    """Discard the new item, consumers see a contiguous stretch of data"""
+    DECIMATE = "decimate"
+    """Discard every second queued item, consumers see data spread over the whole backlog"""
+
+
+class BoundedQueue:
+    """Thread safe queue which never blocks the producer
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of queued items (Default: 100)
+    policy : :class:`DropPolicy`
+        How to make room when the queue is full (Default: DROP_OLDEST)
+    """
+
+    def __init__(self, maxsize=100, policy=DropPolicy.DROP_OLDEST):
+        self._queue = deque()
+        self._not_empty = threading.Condition()
+        self.maxsize = maxsize
+        self.policy = DropPolicy(policy)
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item, force=False):
+        """Queues an item, dropping data according to the policy if the queue is full
+
+        Parameters
+        ----------
+        item
+            Item to queue
+        force : bool
+            Queue the item even if the queue is full, used for control messages (Default: False)
+
+        Returns
+        -------
+        bool
+            Whether the item was queued
+        """
+        with self._not_empty:
+            self.received += 1
+            if not force and len(self._queue) >= self.maxsize:
+                if self.policy is DropPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif self.policy is DropPolicy.DECIMATE and len(self._queue) > 1:
+                    kept = list(self._queue)[::2]
+                    self.dropped += len(self._queue) - len(kept)
+                    self._queue = deque(kept)
+                else:
+                    self._queue.popleft()
+                    self.dropped += 1
+            self._queue.append(item)
+            self._not_empty.notify()
+            return True
+
+    put_nowait = put
+
+    def get(self, block=True, timeout=None):
+        """Removes and returns the oldest item
+
+        Raises
+        ------
+        queue.Empty
+            If no item is available (within timeout when blocking)
+        """
+        with self._not_empty:
+            if block and not self._not_empty.wait_for(lambda: len(self._queue) > 0, timeout):
+                raise queue.Empty
+            if not self._queue:
+                raise queue.Empty
+            return self._queue.popleft()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def clear(self):
+        with self._not_empty:
+            self._queue.clear()
+
+    def empty(self):
+        return len(self._queue) == 0
+
+    def full(self):
+        return len(self._queue) >= self.maxsize
+
+    def __len__(self):
+        return len(self._queue)
+
+    def stats(self):
+        """Number of queued, received and dropped items"""
+        return {
+            "queued": len(self._queue),
+            "maxsize": self.maxsize,
+            "policy": self.policy.value,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+class CallbackWorker(threading.Thread, Logger):
+    """Calls a function for every item of a :class:`BoundedQueue` in its own thread
+
+    Items are (data_type, data) tuples, passed as two arguments to the callback.
+    """
+
+    def __init__(self, name, callback, bounded_queue):
+        threading.Thread.__init__(self, name=name)
+        Logger.__init__(self, name)
+        self.daemon = True
+        self.callback = callback
+        self.queue = bounded_queue
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.callback(*item)
+            except Exception as e:
+                self.error("Exception in data callback: {}".format(e), exc_info=True)
+
+    def stop(self):
+        """Stops the thread once the items queued so far have been handled"""
+        self.queue.put(None, force=True)
+
+
+def merge_batches(items):
+    """Joins (data_type, data) items of one type into one, None if their data can't be joined
+
+    The data has to be tuples of 1d arrays (or None) of the same layout, as sent by the pipeline.
+    """
+    datas = [data for _, data in items]
+    if not all(isinstance(data, tuple) and len(data) == len(datas[0]) for data in datas):
+        return None
+    merged = []
+    for fields in zip(*datas):
+        if all(field is None for field in fields):
+            merged.append(None)
+        elif all(isinstance(field, np.ndarray) and field.ndim == 1 for field in fields):
+            merged.append(np.concatenate(fields))
+        else:
+            return None
+    return items[0][0], tuple(merged)
+
+
+class DataStream(BoundedQueue):
+    """Consumer queue which is read with ``for`` or ``async for`` loops
+
+    The iteration wakes up as soon as data is queued and ends once the stream is closed.
+
+    Parameters
+    ----------
+    types : iterable, optional
+        Data types (:class:`MessageType`) to receive, all if None (Default: None)
+    max_batch : int
+        Join up to this many queued batches of the same type into one (Default: 1)
+    maxsize : int
+        Maximum number of queued batches (Default: 100)
+    policy : :class:`DropPolicy`
+        How to make room when the stream is full (Default: DROP_OLDEST)
+    on_close : function, optional
+        Called with the stream when it is closed, e.g. to unregister it
+    """
+
+    def __init__(self, types=None, max_batch=1, maxsize=100, policy=DropPolicy.DROP_OLDEST, on_close=None):
+        BoundedQueue.__init__(self, maxsize, policy)
+        self.types = None if types is None else frozenset(types)
+        self.max_batch = max_batch
+        self.closed = False
+        self._on_close = on_close
+        # taken from the queue but not returned, they did not fit into the last batch
+        self._pending = deque()
+        self._async_waiters = set()
+
+    def put(self, item, force=False):
+        if item is not None and self.types is not None and item[0] not in self.types:
+            return False
+        queued = BoundedQueue.put(self, item, force)
+        with self._not_empty:
+            waiters, self._async_waiters = self._async_waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # the loop of the waiting iterator was closed
+                pass
+        return queued
+
+    put_nowait = put
+
+    def close(self):
+        """Ends the iteration once the queued batches are read"""
+        if self.closed:
+            return
+        self.closed = True
+        if self._on_close is not None:
+            self._on_close(self)
+        self.put(None, force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _batch(self, item):
+        if item is None:
+            # keep the end marker for further calls
+            self._pending.appendleft(None)
+            return None
+        items = [item]
+        while len(items) < self.max_batch:
+            try:
+                following = self.get_nowait()
+            except queue.Empty:
+                break
+            if following is None or following[0] != item[0]:
+                self._pending.append(following)
+                break
+            items.append(following)
+        if len(items) == 1:
+            return item
+        merged = merge_batches(items)
+        if merged is None:
+            self._pending.extendleft(reversed(items[1:]))
+            return item
+        return merged
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._pending.popleft() if self._pending else self.get()
+        batch = self._batch(item)
+        if batch is None:
+            raise StopIteration
+        return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._pending:
+            try:
+                self._pending.append(self.get_nowait())
+            except queue.Empty:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                with self._not_empty:
+                    if self._queue:
+                        continue
+                    self._async_waiters.add((loop, future))
+                try:
+                    await future
+                finally:
+                    with self._not_empty:
+                        self._async_waiters.discard((loop, future))
+        batch = self._batch(self._pending.popleft())
+        if batch is None:
+            raise StopAsyncIteration
+        return batch
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Dispatcher(Logger):
+    """Passes every item to all registered consumers without ever blocking
+
+    A consumer is a :class:`BoundedQueue`, optionally with a function converting the item
+    beforehand. If the function returns None the item is skipped for this consumer.
+    """
+
+    def __init__(self, name="Dispatcher"):
+        Logger.__init__(self, name)
+        self._consumers = {}
+        self._lock = threading.Lock()
+
+    def addConsumer(self, name, bounded_queue, convert=None):
+        """Registers (or replaces) a consumer"""
+        with self._lock:
+            self._consumers = {**self._consumers, name: (bounded_queue, convert)}
+        self.debug("Added consumer {}".format(name))
+
+    def removeConsumer(self, name):
+        with self._lock:
+            consumers = dict(self._consumers)
+            consumers.pop(name, None)
+            self._consumers = consumers
+        self.debug("Removed consumer {}".format(name))
+
+    def consumer(self, name):
+        """The queue of a consumer, None if not registered"""
+        entry = self._consumers.get(name)
+        return None if entry is None else entry[0]
+
+    def dispatch(self, item):
+        # the dict is replaced on change, iterating over the current one needs no lock
+        for bounded_queue, convert in self._consumers.values():
+            if convert is not None:
+                converted = convert(item)
+                if converted is None:
+                    continue
+                bounded_queue.put(converted)
+            else:
+                bounded_queue.put(item)
+
+    def stats(self):
+        """Queued, received and dropped items per consumer"""
+        return {name: entry[0].stats() for name, entry in self._consumers.items()}
@@ -0,0 +1,240 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Long running jobs, like post-processing, in their own processes
+
+A :class:`JobManager` runs a function in a separate process per job, a limited number of them in
+parallel, and reports their progress. Callers get a job id immediately instead of waiting hours for
+a conversion to finish.
+"""
+
+import inspect
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+
+from pymepix.core.log import Logger
+
+__all__ = ["JobCancelled", "JobManager"]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised in the job process by the progress callback once the job is cancelled"""
+
+
+def _run_job(job_id, target, kwargs, progress, cancel, results):
+    def progress_callback(value):
+        progress.value = value
+        if cancel.value:
+            raise JobCancelled()
+
+    try:
+        target(progress_callback=progress_callback, **kwargs)
+        progress.value = 1.0
+        results.put((job_id, DONE, None))
+    except JobCancelled:
+        results.put((job_id, CANCELLED, None))
+    except Exception as e:
+        results.put((job_id, FAILED, "{}: {}\n{}".format(type(e).__name__, e, traceback.format_exc())))
+
+
+class _Job:
+    def __init__(self, job_id, kwargs):
+        self.id = job_id
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.error = None
+        self.progress = multiprocessing.Value("d", 0.0, lock=False)
+        self.cancel = multiprocessing.Value("i", 0, lock=False)
+        self.process = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = None
+
+    def as_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress.value,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "arguments": {key: value for key, value in self.kwargs.items() if isinstance(value, (str, int, float))},
+        }
+
+
+class JobManager(Logger):
+    """Runs jobs in their own processes, at most max_parallel at a time
+
+    The target function gets a ``progress_callback`` keyword argument, called with the progress
+    between 0 and 1. Cancelling a running job makes the next call of progress_callback raise
+    :class:`JobCancelled`, the process is terminated if it does not stop within grace_time.
+
+    Parameters
+    ----------
+    target : function
+        Function to run, e.g. :func:`pymepix.post_processing.run_post_processing`
+    max_parallel : int
+        Number of jobs running at the same time, further jobs are queued (Default: 2)
+    grace_time : float
+        Seconds a cancelled job has to stop by itself (Default: 10)
+    max_finished : int
+        Number of finished jobs kept for status requests (Default: 100)
+    """
+
+    def __init__(self, target, max_parallel=2, grace_time=10.0, max_finished=100):
+        Logger.__init__(self, "JobManager")
+        self._target = target
+        self.max_parallel = max(1, max_parallel)
+        self.grace_time = grace_time
+        self._max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._queued = deque()
+        self._results = multiprocessing.Queue()
+        self._lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(target=self._monitor, name="JobManager", daemon=True)
+        self._thread.start()
+
+    def submit(self, **kwargs):
+        """Queues a job, returns its id
+
+        Raises
+        ------
+        TypeError
+            If the arguments don't match the target function
+        """
+        inspect.signature(self._target).bind(progress_callback=None, **kwargs)
+        job = _Job(uuid.uuid4().hex, kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._queued.append(job)
+            self._start_queued()
+        self.info("Queued job {}".format(job.id))
+        return job.id
+
+    def status(self, job_id):
+        """Status of a job as dict, None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.as_dict()
+
+    def jobs(self):
+        """Status of all known jobs"""
+        with self._lock:
+            return [job.as_dict() for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job, returns False if there is no such unfinished job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in (QUEUED, RUNNING):
+                return False
+            if job.status == QUEUED:
+                self._queued.remove(job)
+                self._finish(job, CANCELLED)
+            elif job.cancel_requested is None:
+                job.cancel.value = 1
+                job.cancel_requested = time.monotonic()
+        self.info("Cancelling job {}".format(job_id))
+        return True
+
+    def shutdown(self):
+        """Cancels all jobs and stops the monitoring thread"""
+        for job in self.jobs():
+            self.cancel(job["job_id"])
+        self._running = False
+        self._thread.join()
+        with self._lock:
+            processes = [job.process for job in self._jobs.values() if job.process is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    def _start_queued(self):
+        running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+        while self._queued and running < self.max_parallel:
+            job = self._queued.popleft()
+            # not a daemon, post-processing starts processes itself
+            job.process = multiprocessing.Process(
+                target=_run_job,
+                args=(job.id, self._target, job.kwargs, job.progress, job.cancel, self._results),
+                name="Job-{}".format(job.id),
+            )
+            job.process.start()
+            job.status = RUNNING
+            job.started = time.time()
+            running += 1
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        finished = [j for j in self._jobs.values() if j.status in (DONE, FAILED, CANCELLED)]
+        for old in finished[: max(0, len(finished) - self._max_finished)]:
+            del self._jobs[old.id]
+
+    def _monitor(self):
+        while self._running:
+            try:
+                job_id, status, error = self._results.get(timeout=0.2)
+            except Exception:
+                job_id = None
+
+            # (job, status, error) of the jobs which ended and jobs to terminate
+            finished, terminate = [], []
+            with self._lock:
+                if job_id in self._jobs and self._jobs[job_id].status == RUNNING:
+                    finished.append((self._jobs[job_id], status, error))
+
+                for job in self._jobs.values():
+                    if job.status != RUNNING or job.id == job_id:
+                        continue
+                    if job.cancel_requested is not None and time.monotonic() - job.cancel_requested > self.grace_time:
+                        terminate.append(job)
+                    elif not job.process.is_alive() and self._results.empty():
+                        # died without reporting, e.g. killed
+                        finished.append((job, FAILED, "Process exited with code {}".format(job.process.exitcode)))
+
+            # without the lock, a slow exit must not block status requests
+            for job in terminate:
+                self.warning("Terminating job {}".format(job.id))
+                job.process.terminate()
+                finished.append((job, CANCELLED, None))
+            for job, _status, _error in finished:
+                job.process.join()
+
+            with self._lock:
+                for job, status, error in finished:
+                    self._finish(job, status, error)
+                    self.info("Job {} {}".format(job.id, status))
+                self._start_queued()
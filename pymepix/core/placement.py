@@ -0,0 +1,183 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Placement of pipeline processes on CPUs
+
+A placement is a dict, given per stage class in the ``placement`` section of the config or per
+stage with :meth:`AcquisitionPipeline.addStage`::
+
+    placement:
+      UdpSampler: {numa: nic, cpus: "2-5", realtime: 50}
+      Raw2Disk: {cpus: "6"}
+      PipelinePacketProcessor: {cpus: "8-15"}
+      PipelineCentroidCalculator: {cpus: "16-31", nice: 10}
+
+Keys (all optional):
+
+- ``cpus``: CPUs the process may run on, as list or string like ``"0-3,8"``
+- ``numa``: NUMA node whose CPUs are used (intersected with ``cpus``), ``nic`` for the node of the
+  network interface the UDP data arrives on
+- ``realtime``: priority (1-99) for the SCHED_FIFO real-time scheduler
+- ``nice``: nice value, also used if real-time scheduling is not permitted
+
+Settings which are not permitted or not supported by the system are skipped with a warning, the
+acquisition runs anyway.
+"""
+
+import fcntl
+import os
+import socket
+import struct
+import threading
+
+import pymepix.config.load_config as cfg
+
+__all__ = ["parse_cpus", "placement_for", "apply_placement", "effective_placement", "nic_numa_node"]
+
+_SIOCGIFADDR = 0x8915
+
+
+def parse_cpus(spec):
+    """Set of CPU numbers from a list or a string like "0-3,8" """
+    if isinstance(spec, int):
+        return {spec}
+    if not isinstance(spec, str):
+        return {int(cpu) for cpu in spec}
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def placement_for(name, placement=None):
+    """Placement of a stage: the given one or the entry of the config for the class name"""
+    if placement is not None:
+        return placement
+    return (cfg.default_cfg.get("placement") or {}).get(name)
+
+
+def interface_for_ip(ip):
+    """Name of the network interface with the given IPv4 address, None if there is none"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            try:
+                request = struct.pack("256s", name[:15].encode())
+                address = socket.inet_ntoa(fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, request)[20:24])
+            except OSError:
+                continue
+            if address == ip:
+                return name
+    return None
+
+
+def nic_numa_node(ip):
+    """NUMA node of the network interface with the given address, None if unknown"""
+    interface = interface_for_ip(ip)
+    if interface is None:
+        return None
+    try:
+        with open(f"/sys/class/net/{interface}/device/numa_node") as f:
+            node = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return node if node >= 0 else None
+
+
+def numa_node_cpus(node):
+    with open(f"/sys/devices/system/node/node{node}/cpulist") as f:
+        return parse_cpus(f.read())
+
+
+def effective_placement(pid=0):
+    """CPUs, scheduler and nice value a process (or thread) actually runs with"""
+    policy = os.sched_getscheduler(pid)
+    return {
+        "pid": pid or threading.get_native_id(),
+        "cpus": sorted(os.sched_getaffinity(pid)),
+        "realtime": os.sched_getparam(pid).sched_priority if policy == os.SCHED_FIFO else None,
+        "nice": os.getpriority(os.PRIO_PROCESS, pid),
+    }
+
+
+def apply_placement(placement, logger, nic_ip=None, pid=0):
+    """Applies a placement to the calling process (or thread with pid 0)
+
+    Parameters
+    ----------
+    placement : dict
+        See module documentation, nothing happens if None
+    logger : :class:`Logger`
+        Reports skipped settings and the effective placement
+    nic_ip : str, optional
+        Address the process receives data on, needed for ``numa: nic``
+    pid : int
+        Process or thread ID, 0 for the calling thread
+
+    Returns
+    -------
+    dict
+        The effective placement, None if nothing was applied
+    """
+    if not placement:
+        return None
+
+    cpus = parse_cpus(placement["cpus"]) if "cpus" in placement else None
+    numa = placement.get("numa")
+    if numa == "nic":
+        numa = nic_numa_node(nic_ip) if nic_ip is not None else None
+        if numa is None:
+            logger.warning(f"NUMA node of the interface with address {nic_ip} unknown, not pinned to it")
+    if numa is not None:
+        try:
+            node_cpus = numa_node_cpus(numa)
+        except OSError:
+            logger.warning(f"NUMA node {numa} not found")
+        else:
+            if cpus is not None and not cpus & node_cpus:
+                logger.warning(f"CPUs {sorted(cpus)} are not on NUMA node {numa}, using the whole node")
+            cpus = node_cpus if cpus is None or not cpus & node_cpus else cpus & node_cpus
+
+    if cpus is not None:
+        try:
+            os.sched_setaffinity(pid, cpus)
+        except OSError as e:
+            logger.warning(f"Could not pin to CPUs {sorted(cpus)}: {e}")
+
+    realtime_set = False
+    if "realtime" in placement:
+        try:
+            os.sched_setscheduler(pid, os.SCHED_FIFO, os.sched_param(int(placement["realtime"])))
+            realtime_set = True
+        except OSError as e:
+            logger.warning(f"Real-time priority not permitted ({e}), set CAP_SYS_NICE or rtprio limits")
+    if "nice" in placement and not realtime_set:
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, int(placement["nice"]))
+        except OSError as e:
+            logger.warning(f"Could not set nice value {placement['nice']}: {e}")
+
+    effective = effective_placement(pid)
+    logger.info(f"Running on CPUs {effective['cpus']}, real-time priority {effective['realtime']}, "
+                f"nice {effective['nice']}")
+    return effective
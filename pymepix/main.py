@@ -27,11 +27,13 @@ import time
 
 import re
 
+import numpy as np
+
 import pymepix.config.load_config as cfg
-from pymepix.post_processing import run_post_processing
-from pymepix.pymepix_connection import PymepixConnection
+from pymepix.core.jobs import JobManager
 
-from pymepix.processing.acquisition import PixelPipeline, CentroidPipeline
+# the acquisition and post-processing modules are imported by the commands using them,
+# so e.g. "pymepix-acq --help" does not load the whole pipeline
 
 from tornado.web import Application, RequestHandler, HTTPError
 import json
@@ -47,6 +49,8 @@ logging.basicConfig(
 
 
 def connect_timepix(args):
+    from pymepix.pymepix_connection import PymepixConnection
+
     if not os.path.exists(args.output):
         # Connect to camera
         pymepix = PymepixConnection(spidr_address=(args.ip, args.port),
@@ -87,6 +91,8 @@ def connect_timepix(args):
         )
 
 def post_process(args):
+    from pymepix.post_processing import run_post_processing
+
     run_post_processing(
         args.file.name,
         args.output_file,
@@ -94,6 +100,25 @@ def post_process(args):
         args.timewalk_file,
         args.cent_timewalk_file,
         args.cam_gen,
+        pixel_calibration_file=args.pixel_calibration_file,
+        trainid_file=args.trainid_file,
+        trainid_offset=args.trainid_offset,
+    )
+
+
+def calibrate_timewalk(args):
+    from pymepix.util.timewalk import compute_timewalk_lookup, load_calibration_data
+
+    tof, tot = load_calibration_data(
+        args.file,
+        centroided=args.centroided,
+        number_processes=args.number_of_processes,
+        camera_generation=args.cam_gen,
+    )
+    lut = compute_timewalk_lookup(tof, tot, args.region, min_counts=args.min_counts)
+    np.save(args.output_file, lut)
+    logging.info(
+        f"Timewalk lookup table with {np.count_nonzero(lut)} non-zero entries saved to {args.output_file}"
     )
 
 
@@ -146,6 +171,7 @@ class TPXpropertyHandler(RequestHandler):
         except:
             raise HTTPError(400, u"Bad request")
 
+        property_cache.clear()
         for key, val in data.items():
             ref = timepix_obj
             tkns = re.findall(r"[\w']+|\[\d+\]", key)
@@ -157,6 +183,104 @@ class TPXpropertyHandler(RequestHandler):
 
         self.write(data)
 
+class PropertyCache:
+    """Recently read property values, to answer repeated polls without asking the hardware"""
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, path, max_age):
+        """Cached value of path if not older than max_age seconds, raises KeyError otherwise"""
+        timestamp, value = self._values[path]
+        if time.monotonic() - timestamp > max_age:
+            raise KeyError(path)
+        return value
+
+    def put(self, path, value):
+        self._values[path] = (time.monotonic(), value)
+
+    def clear(self):
+        self._values.clear()
+
+
+property_cache = PropertyCache()
+
+
+def read_properties(paths, max_age=0.0):
+    """Resolves several property paths, values can come from the cache if max_age > 0
+
+    Returns
+    -------
+    dict
+        'values' with the JSON serializable values and 'errors' with the reason for the others
+    """
+    global timepix_obj
+    values, errors = {}, {}
+    for path in paths:
+        if max_age > 0:
+            try:
+                values[path] = property_cache.get(path, max_age)
+                continue
+            except KeyError:
+                pass
+        try:
+            value = get_path(timepix_obj, re.findall(r"[\w']+|\[\d+\]", path))
+        except HTTPError:
+            errors[path] = "Bad request"
+            continue
+        if not is_jsonable(value):
+            errors[path] = "Parameter value is not JSON serializable"
+            continue
+        property_cache.put(path, value)
+        values[path] = value
+    return {'values': values, 'errors': errors}
+
+
+class TPXpropertiesHandler(RequestHandler):
+    """Reads and writes many properties in one request
+
+    GET ?param_name=a&param_name=b&max_age=1 reads, values up to max_age seconds old come from a cache.
+    POST {"set": {"a": 1}, "get": ["b"], "max_age": 1} sets first, then reads.
+    """
+
+    def get(self):
+        paths = self.get_arguments('param_name')
+        try:
+            max_age = float(self.get_argument('max_age', 0))
+        except ValueError:
+            raise HTTPError(400, u"Bad request")
+        self.write(read_properties(paths, max_age))
+
+    def post(self):
+        global timepix_obj
+        try:
+            data = json.loads(self.request.body)
+            to_set = data.get('set', {})
+            to_get = data.get('get', [])
+            max_age = float(data.get('max_age', 0))
+        except:
+            raise HTTPError(400, u"Bad request")
+
+        set_errors = {}
+        if to_set:
+            # a write can change other values as well
+            property_cache.clear()
+        for key, val in to_set.items():
+            tkns = re.findall(r"[\w']+|\[\d+\]", key)
+            try:
+                ref = get_path(timepix_obj, tkns[:-1])
+                if tkns[-1][0] != '[':
+                    setattr(ref, tkns[-1], val)
+                else:
+                    ref[int(tkns[-1][1:-1])] = val
+            except Exception as e:
+                set_errors[key] = str(e) or "Bad request"
+
+        result = read_properties(to_get, max_age)
+        result['set_errors'] = set_errors
+        self.write(result)
+
+
 class TPXmethodHandler(RequestHandler):
     def post(self):
         global timepix_obj
@@ -175,6 +299,7 @@ class TPXmethodHandler(RequestHandler):
 
             data.pop('func_name')
 
+            property_cache.clear()
             res = ref(**data)
 
             if is_jsonable(res):
@@ -184,31 +309,89 @@ class TPXmethodHandler(RequestHandler):
         except:
             raise HTTPError(400, u"Bad request")
 
+class HistogramHandler(RequestHandler):
+    def get(self):
+        global timepix_obj
+
+        name = self.get_argument('name', 'hits')
+        histograms = timepix_obj.histograms
+        if histograms is None:
+            raise HTTPError(404, u"Online histograms are disabled")
+        snapshot = histograms.snapshot()
+        if name not in snapshot or name == 'version':
+            raise HTTPError(400, u"Bad request")
+
+        result = {name: snapshot[name].tolist(), 'version': snapshot['version']}
+        if name == 'tof':
+            result['tof_edges'] = snapshot['tof_edges'].tolist()
+        if name == 'tot':
+            result['unit'] = histograms.tot_unit
+        self.write(result)
+
+    def delete(self):
+        global timepix_obj
+
+        if timepix_obj.histograms is None:
+            raise HTTPError(404, u"Online histograms are disabled")
+        timepix_obj.histograms.reset()
+        self.write({'message': 'reset'})
+
+
 class PostprocessHandler(RequestHandler):
+    """Post-processing runs as job in its own process, the requests return immediately"""
+
     def post(self):
+        global post_processing_jobs
         try:
             data = json.loads(self.request.body)
         except:
             raise HTTPError(400, u"Bad request")
 
         try:
-            run_post_processing(**data)
-        except:
+            job_id = post_processing_jobs.submit(**data)
+        except TypeError:
             raise HTTPError(400, u"Bad request")
 
+        self.set_status(202)
+        self.write({'job_id': job_id})
+
+    def get(self):
+        global post_processing_jobs
+        job_id = self.get_argument('job_id', None)
+        if job_id is None:
+            self.write({'jobs': post_processing_jobs.jobs()})
+            return
+
+        status = post_processing_jobs.status(job_id)
+        if status is None:
+            raise HTTPError(404, u"Unknown job")
+        self.write(status)
+
+    def delete(self):
+        global post_processing_jobs
+        job_id = self.get_argument('job_id')
+        if not post_processing_jobs.cancel(job_id):
+            raise HTTPError(404, u"Unknown or finished job")
+        self.write(post_processing_jobs.status(job_id))
+
 
 def make_app():
     urls = [
         ("/", RootHandler),
         (r"/tpxproperty", TPXpropertyHandler),
+        (r"/tpxproperties", TPXpropertiesHandler),
         (r"/tpxmethod", TPXmethodHandler),
+        (r"/histogram", HistogramHandler),
         (r"/postprocess", PostprocessHandler)
     ]
     return Application(urls, debug=True)
 
 
 def start_api(args):
-    global timepix_obj
+    global timepix_obj, post_processing_jobs
+    from pymepix.post_processing import run_post_processing
+    from pymepix.processing.acquisition import CentroidPipeline
+    from pymepix.pymepix_connection import PymepixConnection
 
     logging.getLogger("tornado").setLevel(logging.ERROR)
 
@@ -233,6 +416,11 @@ def start_api(args):
     # Set the bias voltage
     timepix_obj.biasVoltage = args.bias
 
+    # clients poll temperatures etc., answer them from memory
+    timepix_obj.startMonitoring()
+
+    post_processing_jobs = JobManager(run_post_processing, max_parallel=args.max_jobs)
+
     app = make_app()
     app.listen(args.api_port)
     IOLoop.instance().start()
@@ -364,6 +552,26 @@ def main():
         type=argparse.FileType("rb"),
         help="File containing the centroided time walk information",
     )
+    parser_post_process.add_argument(
+        "-p",
+        "--pixel_calibration_file",
+        dest="pixel_calibration_file",
+        type=str,
+        help="File (.npz) with per-pixel energy and timewalk calibration, replaces the timewalk file",
+    )
+    parser_post_process.add_argument(
+        "--trainid_file",
+        dest="trainid_file",
+        type=str,
+        help="Train ID log recorded with the acquisition, the train IDs are added to the timing group",
+    )
+    parser_post_process.add_argument(
+        "--trainid_offset",
+        dest="trainid_offset",
+        type=int,
+        default=0,
+        help="Delay of the train ID messages relative to the triggers in ns. Default - 0",
+    )
     parser_post_process.add_argument(
         "-n",
         "--number_of_processes",
@@ -391,6 +599,74 @@ def main():
     )
 
 
+    parser_calibrate = subparsers.add_parser(
+        "calibrate-timewalk",
+        help="Compute a timewalk lookup table from a sharp peak in the time-of-flight spectrum.",
+    )
+    parser_calibrate.set_defaults(func=calibrate_timewalk)
+    parser_calibrate.add_argument(
+        "-f",
+        "--file",
+        dest="file",
+        type=str,
+        help="Post-processed HDF5 file or raw data file",
+        required=True,
+    )
+    parser_calibrate.add_argument(
+        "-o",
+        "--output_file",
+        dest="output_file",
+        type=str,
+        help="File (.npy) where the lookup table is stored, usable as timewalk file for post-process",
+        required=True,
+    )
+    parser_calibrate.add_argument(
+        "-r",
+        "--region",
+        dest="region",
+        type=float,
+        nargs=2,
+        metavar=("START", "END"),
+        help="Time-of-flight range of the calibration peak in seconds",
+        required=True,
+    )
+    parser_calibrate.add_argument(
+        "--centroided",
+        dest="centroided",
+        action="store_true",
+        help="Calibrate the centroids (cent_timewalk_file) instead of the single hits",
+    )
+    parser_calibrate.add_argument(
+        "--min_counts",
+        dest="min_counts",
+        type=int,
+        default=20,
+        help="Minimum number of hits per ToT value. Default - 20",
+    )
+    parser_calibrate.add_argument(
+        "-n",
+        "--number_of_processes",
+        dest="number_of_processes",
+        type=int,
+        default=4,
+        help="The number of processes used for post-processing raw files",
+    )
+    parser_calibrate.add_argument(
+        "--config",
+        dest="cfg",
+        type=str,
+        default="default.yaml",
+        help="Config file",
+    )
+    parser_calibrate.add_argument(
+        "-g",
+        "--cam_gen",
+        dest="cam_gen",
+        type=int,
+        default=3,
+        help="Camera generation",
+    )
+
     parser_api_service = subparsers.add_parser(
         "api-service", help="start api service."
     )
@@ -472,6 +748,14 @@ def main():
         help="Camera generation",
     )
 
+    parser_api_service.add_argument(
+        "--max_jobs",
+        dest="max_jobs",
+        type=int,
+        default=2,
+        help="Number of post-processing jobs running in parallel. Default - 2",
+    )
+
     parser_api_service.add_argument(
         "-pl",
         "--pipeline",
@@ -13,9 +13,15 @@ def updateProgressBar(progress):
    pass 
 
 def run_post_processing(input_file_name, output_file, number_processes, timewalk_file, cent_timewalk_file, camera_generation=3,
-                        progress_callback=updateProgressBar, clustering_args={}, dbscan_clustering=True, **kwargs):
+                        progress_callback=updateProgressBar, clustering_args={}, dbscan_clustering=True,
+                        trainid_file=None, trainid_offset=0, **kwargs):
     with ProgressBar(total=1.0, dynamic_ncols=True) as progress_bar:
         progress_bar.gui_bar_fun = progress_callback
         file_sampler = RawFileSampler(input_file_name, output_file, number_processes, timewalk_file, cent_timewalk_file,
                                       progress_bar.update_to, camera_generation,clustering_args, dbscan_clustering, **kwargs)
         file_sampler.run()
+
+    if trainid_file is not None:
+        from pymepix.util.trainid import merge_train_ids
+
+        merge_train_ids(output_file, trainid_file, trainid_offset)
@@ -18,5 +18,18 @@
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
 
-from .acquisition import *
 from .datatypes import MessageType
+
+
+def __getattr__(name):
+    # the pipelines (and with them zmq, pyserial, ...) are only imported when used
+    if name.startswith("_"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from . import acquisition
+
+    try:
+        value = getattr(acquisition, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    globals()[name] = value
+    return value
@@ -20,9 +20,12 @@
 
 """Module that contains predefined acquisition pipelines for the user to use"""
 
+import pymepix.config.load_config as cfg
 from pymepix.processing.logic.centroid_calculator import CentroidCalculator
+from pymepix.processing.logic.online_histograms import OnlineHistograms
 from .baseacquisition import AcquisitionPipeline
 from .pipeline_centroid_calculator import PipelineCentroidCalculator
+from .pipeline_online_histograms import PipelineOnlineHistograms
 from .pipeline_packet_processor import PipelinePacketProcessor
 from .logic.packet_processor_factory import packet_processor_factory
 from .udpsampler import UdpSampler
@@ -36,24 +39,53 @@ class PixelPipeline(AcquisitionPipeline):
     """
 
     def __init__(self, data_queue, address, longtime, use_event=False, name="Pixel", event_window=(0, 1E-3),
-                 camera_generation=3):
+                 camera_generation=3, online_histograms=None, position_offset=(0, 0), zmq_port=None,
+                 persistent=None, pixel_calibration=None):
         """
         Parameters:
-        use_event (boolean): If packets are forwarded to the centroiding. If True centroids are calculated."""
-        AcquisitionPipeline.__init__(self, name, data_queue)
+        use_event (boolean): If packets are forwarded to the centroiding. If True centroids are calculated.
+        online_histograms (boolean): If hit map, ToF and centroid histograms are accumulated in an extra stage
+            of the pipeline, which every batch of data passes (Default: online_histograms of the config or False).
+        position_offset ((int, int)): Position of the chip in a multi-chip detector, added to x and y.
+        zmq_port (int): Control port of the pipeline, has to be unique for every chip (Default: from config).
+        persistent (boolean): Keep the processes between acquisitions (Default: persistent_pipeline of the config).
+        pixel_calibration (str): Per-pixel energy and timewalk calibration file of the chip, applied while decoding
+            (Timepix3 only), see :class:`~pymepix.processing.logic.pixel_calibration.PixelCalibration`."""
+        AcquisitionPipeline.__init__(self, name, data_queue, persistent)
         self.info("Initializing Pixel pipeline")
 
         PacketProcessorClass = packet_processor_factory(camera_generation)
-        self.packet_processor = PacketProcessorClass(handle_events=use_event, event_window=event_window)
+        processor_args = {}
+        if pixel_calibration is not None:
+            if camera_generation == 3:
+                processor_args["pixel_calibration"] = pixel_calibration
+            else:
+                self.warning("Per-pixel calibration is only supported for Timepix3, it is ignored")
+        self.packet_processor = PacketProcessorClass(
+            handle_events=use_event, event_window=event_window, position_offset=position_offset, **processor_args
+        )
+        self._zmq_port = zmq_port
 
-        self.addStage(0, UdpSampler, address, longtime)
+        self.addStage(0, UdpSampler, address, longtime, zmq_port=zmq_port)
         self.addStage(2, PipelinePacketProcessor, num_processes=2)
         self._reconfigureProcessor()
 
+        self.online_histograms = None
+        if online_histograms is None:
+            online_histograms = cfg.default_cfg.get("online_histograms", False)
+        if online_histograms:
+            shape = (256, 256) if camera_generation == 3 else (448, 512)
+            self.online_histograms = OnlineHistograms(
+                shape, tof_range=event_window, origin=position_offset, tot_unit=self.packet_processor.tot_unit
+            )
+            # last stage, sees the output of all others
+            self.addStage(10, PipelineOnlineHistograms, self.online_histograms)
+
     def _reconfigureProcessor(self):
         self.getStage(2).configureStage(
             PipelinePacketProcessor,
-            packet_processor=self.packet_processor
+            packet_processor=self.packet_processor,
+            zmq_port=self._zmq_port,
         )
     @property
     def pipeline_packet_processor(self):
@@ -68,13 +100,13 @@ class CentroidPipeline(PixelPipeline):
     when dealing with a huge number of objects
     """
 
-    def __init__(self, data_queue, address, longtime, camera_generation=3):
+    def __init__(self, data_queue, address, longtime, camera_generation=3, **kwargs):
         PixelPipeline.__init__(
             self, data_queue, address, longtime, use_event=True, name="Centroid",
-            camera_generation=camera_generation
+            camera_generation=camera_generation, **kwargs
         )
         self.info("Initializing Centroid pipeline")
-        self.centroid_calculator=CentroidCalculator()
+        self.centroid_calculator=CentroidCalculator(tot_unit=self.packet_processor.tot_unit)
 
         self.addStage(4, PipelineCentroidCalculator, num_processes=6)
 
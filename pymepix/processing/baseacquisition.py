@@ -26,7 +26,7 @@ import zmq
 
 import pymepix.config.load_config as cfg
 from pymepix.core.log import Logger
-from pymepix.processing.usbtrainid import USBTrainID
+from pymepix.core.placement import effective_placement, placement_for
 
 
 class AcquisitionStage(Logger):
@@ -42,11 +42,15 @@ class AcquisitionStage(Logger):
     ------------
     stage: int
         Initial position in the pipeline, lower stages are executed first
+    placement: dict, optional
+        CPUs and priority of the processes, see :mod:`pymepix.core.placement`. Defaults to the entry
+        of the config for the pipeline class.
     """
 
-    def __init__(self, stage, num_processes=1):
+    def __init__(self, stage, num_processes=1, placement=None):
         Logger.__init__(self, "AcqStage-{}".format(stage))
         self._stage_number = stage
+        self._placement = placement
 
         self._pipeline_objects = []
         self._pipeline_klass = None
@@ -89,6 +93,29 @@ class AcquisitionStage(Logger):
     def numProcess(self, value):
         self._num_processes = max(1, value)
 
+    @property
+    def placement(self):
+        """CPUs and priority of the processes, takes effect on next acquisition"""
+        if self._pipeline_klass is None:
+            return self._placement
+        return placement_for(self._pipeline_klass.__name__, self._placement)
+
+    @placement.setter
+    def placement(self, value):
+        self._placement = value
+
+    def placementReport(self):
+        """Effective CPUs, real-time priority and nice value of the running processes"""
+        report = []
+        for p in self._pipeline_objects:
+            if p.pid is None or not p.is_alive():
+                continue
+            try:
+                report.append({"name": p.name, **effective_placement(p.pid)})
+            except OSError:
+                pass
+        return report
+
     def configureStage(self, pipeline_klass, *args, **kwargs):
         """Configures the stage with a particular processing class
 
@@ -153,6 +180,7 @@ class AcquisitionStage(Logger):
                 shared_output=self._output_queue,
             )
             p.daemon = True
+            p.placement = self.placement
             self._pipeline_objects.append(p)
 #            if self._output_queue is None: do we really need it?
 #                self._output_queue = p.outputQueues()[-1]
@@ -161,22 +189,65 @@ class AcquisitionStage(Logger):
     def outputQueue(self):
         return self._output_queue
 
-    def start(self):
+    @property
+    def isAlive(self):
+        """Whether the stage is built with the configured number of processes and all of them run"""
+        return (
+            len(self._pipeline_objects) == self._num_processes
+            and all(p.is_alive() for p in self._pipeline_objects)
+        )
+
+    def pause(self, timeout=5.0):
+        """Lets the processes of the stage idle, the end of the run is passed down the pipeline
+
+        Returns once the last data has been sent on, or after timeout.
+        """
+        sources = [p for p in self._pipeline_objects if hasattr(p, "acquiring")]
+        for p in sources:
+            p.acquiring = False
+        for p in sources:
+            if not p.waitIdle(timeout):
+                self.warning("{} did not confirm the end of the run".format(p.name))
+
+    def resume(self):
+        """Continues acquiring with the processes of a paused stage"""
+        for p in self._pipeline_objects:
+            if hasattr(p, "acquiring"):
+                p.acquiring = True
+
+    def start(self, timeout=5.0):
+        """Starts the processes and waits until they are ready, at most timeout seconds each"""
         for p in self._pipeline_objects:
-            zmq_port = cfg.default_cfg['zmq_port']
             if p.name.find("UdpSampler-") > -1:
+                # every chip has its own pipeline and control port
+                zmq_port = self._zmq_port = p.zmq_port
                 self.udp_sock = self.ctx.socket(zmq.PAIR)
                 self.udp_sock.bind(f"tcp://127.0.0.1:{zmq_port}")
                 self.info(f'zmq bind on "tcp://127.0.0.1:{zmq_port}"')
 
-                if cfg.default_cfg["trainID"]["connected"]:
+                # there is one train ID receiver, recorded with the first chip
+                self._record_train_id = (
+                    cfg.default_cfg["trainID"]["connected"] and zmq_port == cfg.default_cfg['zmq_port']
+                )
+                if self._record_train_id:
                     self.train_sock = self.ctx.socket(zmq.PAIR)
                     self.train_sock.bind(f"ipc:///tmp/train_sock{zmq_port}")
                     self.info(f'trainID bind on "ipc:///tmp/train_sock{zmq_port}"')
                     self.startTrainID()
             p.start()
 
-    def stop(self, force=False):
+        for p in self._pipeline_objects:
+            if not p.waitReady(timeout):
+                self.warning("{} did not get ready".format(p.name))
+
+    def _join(self, p, timeout):
+        p.join(timeout)
+        if p.is_alive():
+            self.warning("{} did not stop within {} s, terminating it".format(p.name, timeout))
+            p.terminate()
+        p.join()
+
+    def stop(self, force=False, timeout=5.0):
         self.info("Stopping stage {}".format(self.stage))
         if self._input_queue is not None:
             # Put a none in and join all threads
@@ -184,9 +255,7 @@ class AcquisitionStage(Logger):
             for idx, p in enumerate(self._pipeline_objects):
                 p.enable = False
                 self.info("Waiting for process {}".format(idx))
-                p.join(1.0)
-                p.terminate()
-                p.join()
+                self._join(p, timeout)
                 self.info("Process stop complete")
             if self._input_queue.get() is not None:
                 self.error("Queue should only contain None!!")
@@ -194,25 +263,28 @@ class AcquisitionStage(Logger):
             self._input_queue.close()
         else:
             for p in self._pipeline_objects:
-                if p.name.find("UdpSampler-") > -1:
-                    self.debug(f"closing zmq socket for tcp://127.0.0.1:{cfg.default_cfg['zmq_port']}")
-                    self.udp_sock.close()
-                    if cfg.default_cfg["trainID"]["connected"]:
-                        self.stopTrainID()
-                        self.debug(f"closing zmq socket for icp:///tmp/train_sock{cfg.default_cfg['zmq_port']}")
-                        self.train_sock.close()
+                sampler = p.name.find("UdpSampler-") > -1
+                if sampler and self._record_train_id:
+                    self.stopTrainID()
+                    self.debug(f"closing zmq socket for icp:///tmp/train_sock{self._zmq_port}")
+                    self.train_sock.close()
                 p.enable = False
                 self.info("Joining thread {}".format(p))
-                p.join(1.0)
-                p.terminate()
-                p.join()
+                self._join(p, timeout)
                 self.info("Join complete")
+                if sampler:
+                    # closed only now, the file writer of the sampler replies on it until the end
+                    self.debug(f"closing zmq socket for tcp://127.0.0.1:{self._zmq_port}")
+                    self.udp_sock.close()
         self.info("Stop complete")
         self._pipeline_objects = []
 
     def startTrainID(self):
         self.info(f"start USBTrainID process")
         # generate worker to save the data directly to disk
+        # pyserial is only needed with a train ID receiver
+        from pymepix.processing.usbtrainid import USBTrainID
+
         self._trainIDRec = USBTrainID()
         self._trainIDRec.start()
 
@@ -220,15 +292,14 @@ class AcquisitionStage(Logger):
         self.info(f"stopping USBTrainID process")
         self.train_sock.send_string("STOP RECORDING")
         self.train_sock.send_string("SHUTDOWN")
-        self._trainIDRec.join(2.0)  # file still needs to be saved
-        self._trainIDRec.terminate()
-        self._trainIDRec.join()
+        self._join(self._trainIDRec, 5.0)  # file still needs to be saved
 
 
 class AcquisitionPipeline(Logger):
     """Class that manages various stages"""
 
-    def __init__(self, name, data_queue):
+    def __init__(self, name, data_queue, persistent=None):
+        """persistent (bool) keeps the processes between acquisitions, see :attr:`persistent`"""
         Logger.__init__(self, name + " AcqPipeline")
         self.info("Initializing pipeline")
         self._stages = []
@@ -236,10 +307,17 @@ class AcquisitionPipeline(Logger):
         self._data_queue = data_queue
 
         self._running = False
+        self._built = False
+        if persistent is None:
+            persistent = cfg.default_cfg.get("persistent_pipeline", False)
+        self.persistent = persistent
+
+    def addStage(self, stage_number, pipeline_klass, *args, num_processes=1, placement=None, **kwargs):
+        """Adds a stage to the pipeline
 
-    def addStage(self, stage_number, pipeline_klass, *args, num_processes=1, **kwargs):
-        """Adds a stage to the pipeline"""
-        stage = AcquisitionStage(stage_number, num_processes)
+        placement (dict) pins the processes of the stage to CPUs, see :mod:`pymepix.core.placement`
+        """
+        stage = AcquisitionStage(stage_number, num_processes, placement)
         self.info("Adding stage {} with klass {}".format(stage_number, pipeline_klass))
         stage.configureStage(pipeline_klass, *args, **kwargs)
         self._stages.append(stage)
@@ -256,9 +334,39 @@ class AcquisitionPipeline(Logger):
     def stages(self):
         return self._stages
 
+    @property
+    def persistent(self):
+        """Keep the processes when the acquisition stops
+
+        A persistent pipeline is built on the first start. Stopping it only lets the processes idle,
+        so the next start takes milliseconds instead of spawning all processes again. Call
+        :meth:`shutdown` to end the processes. Changes of the number of processes rebuild the pipeline
+        on the next start.
+        """
+        return self._persistent
+
+    @persistent.setter
+    def persistent(self, value):
+        self._persistent = bool(value)
+        if not self._persistent and self._built and not self._running:
+            self.shutdown()
+
+    @property
+    def isWarm(self):
+        """Whether the processes are running and the next start only has to resume them"""
+        return self._built and all(s.isAlive for s in self._stages)
+
     def start(self):
         """Starts all stages"""
-        # Sort them by stage number
+        if self._persistent and self.isWarm:
+            self.info("Resuming acquisition")
+            for s in self._stages:
+                s.resume()
+            self._running = True
+            return
+        if self._built:
+            # processes died or the number of processes changed
+            self.shutdown()
 
         self.info("Starting acquisition")
         # Build them
@@ -284,22 +392,47 @@ class AcquisitionPipeline(Logger):
             previous_stage = s
             self.debug("Last stage is {}".format(s))
 
+        # the UdpSampler sends the end of a run to every process of the stage receiving its packets
+        for s, next_stage in zip(self._stages, self._stages[1:]):
+            for p in s.processes:
+                if hasattr(p, "consumers"):
+                    p.consumers = next_stage.numProcess
+
         for s in self._stages:
             s.enable = True
             s.start()
+        self._built = True
         self._running = True
 
     @property
     def isRunning(self):
         return self._running
 
+    def placementReport(self):
+        """Effective placement of the processes of every stage, by stage number"""
+        return {s.stage: s.placementReport() for s in self._stages}
+
     def stop(self):
-        """Stops all stages"""
+        """Stops all stages, a persistent pipeline only pauses them"""
         self.info("Stopping acquisition")
         self.debug(self._stages)
         if self._running is True:
+            if self._persistent:
+                for s in self._stages:
+                    s.pause()
+            else:
+                for s in self._stages:
+                    s.stop()
+                self._built = False
+        self._running = False
+
+    def shutdown(self):
+        """Stops all stages and ends their processes, also of a persistent pipeline"""
+        if self._built:
+            self.info("Shutting down pipeline")
             for s in self._stages:
                 s.stop()
+        self._built = False
         self._running = False
 
 
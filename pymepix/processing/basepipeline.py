@@ -27,6 +27,7 @@ from multiprocessing.sharedctypes import Value
 import traceback
 
 from pymepix.core.log import ProcessLogger
+from pymepix.core.placement import apply_placement
 
 
 class BasePipelineObject(multiprocessing.Process, ProcessLogger):
@@ -49,6 +50,9 @@ class BasePipelineObject(multiprocessing.Process, ProcessLogger):
         Whether the input data should be propgated further down the chain
     """
 
+    placement = None
+    """CPUs and priority of the process, set by :class:`AcquisitionStage` before the start"""
+
     @classmethod
     def hasOutput(cls):
         """Defines whether this class can output results or not,
@@ -89,6 +93,8 @@ class BasePipelineObject(multiprocessing.Process, ProcessLogger):
             for x in range(num_outputs):
                 self.output_queue.append(Queue())
         self._enable = Value("I", 1)
+        # set once pre_run has set up the connections
+        self._ready = multiprocessing.Event()
 
     @property
     def outputQueues(self):
@@ -131,6 +137,20 @@ class BasePipelineObject(multiprocessing.Process, ProcessLogger):
         self.debug("Setting enabled flag to {}".format(value))
         self._enable.value = int(value)
 
+    def waitReady(self, timeout=None):
+        """Waits until the process has run :meth:`pre_run` and is processing
+
+        Returns
+        -------
+        bool
+            False if the timeout expired or the process ended before
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready.wait(0.05):
+            if not self.is_alive() or (deadline is not None and time.monotonic() > deadline):
+                return False
+        return True
+
     def pushOutput(self, data_type, data):
         """Pushes results to output queue (if available)
 
@@ -168,7 +188,9 @@ class BasePipelineObject(multiprocessing.Process, ProcessLogger):
         return None, None
 
     def run(self):
+        apply_placement(self.placement, self)
         self.pre_run()
+        self._ready.set()
         while True:
             enabled = self.enable
             try:
@@ -0,0 +1,128 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Receive buffers which are sent on without copying and only reused once zmq has released them"""
+
+import time
+
+import zmq
+
+from pymepix.core.log import Logger
+
+STAT_NAMES = ("buffers", "grown", "stalls", "overruns")
+"""Counters of a :class:`BufferRing`, in the order of its ``counters``"""
+
+
+class BufferRing(Logger):
+    """Ring of receive buffers with ownership tracking
+
+    Slices of the current buffer are sent with :meth:`send` (``copy=False``), which keeps a
+    :class:`zmq.MessageTracker` for every message. :meth:`advance` only moves on to a buffer that
+    all its messages have released. If there is none the ring grows, up to max_buffers. At the cap
+    it waits up to stall_timeout for the next buffer (a stall) and otherwise replaces it with a new
+    one (an overrun), zmq keeps the old one alive until it is sent. A buffer is never written to
+    while zmq still reads from it.
+
+    Parameters
+    ----------
+    buffer_size : int
+        Size of every buffer in bytes
+    num_buffers : int
+        Number of buffers to start with (Default: 10)
+    max_buffers : int
+        Number of buffers the ring grows to at most (Default: 64)
+    stall_timeout : float
+        Seconds to wait for a busy buffer once the ring has max_buffers (Default: 0.1)
+    counters : sequence, optional
+        Storage of the counters in the order of :data:`STAT_NAMES`, e.g. a shared
+        ``multiprocessing.Array`` to read them from another process (Default: a list)
+    """
+
+    def __init__(self, buffer_size, num_buffers=10, max_buffers=64, stall_timeout=0.1, counters=None):
+        Logger.__init__(self, "BufferRing")
+        self.buffer_size = buffer_size
+        self.max_buffers = max(max_buffers, num_buffers)
+        self.stall_timeout = stall_timeout
+        self.counters = [0] * len(STAT_NAMES) if counters is None else counters
+        self._buffers = [bytearray(buffer_size) for _ in range(num_buffers)]
+        self._views = [memoryview(buffer) for buffer in self._buffers]
+        self._trackers = [[] for _ in range(num_buffers)]
+        self._idx = 0
+        self.counters[0] = num_buffers
+
+    @property
+    def view(self):
+        """memoryview of the current buffer, to receive into"""
+        return self._views[self._idx]
+
+    @property
+    def stats(self):
+        """Number of buffers and how often the ring grew, stalled and overran"""
+        return dict(zip(STAT_NAMES, self.counters))
+
+    def send(self, sock, nbytes):
+        """Sends the first nbytes of the current buffer without copying"""
+        tracker = sock.send(self._views[self._idx][:nbytes], copy=False, track=True)
+        if not tracker.done:
+            self._trackers[self._idx].append(tracker)
+
+    def _released(self, idx):
+        self._trackers[idx] = [tracker for tracker in self._trackers[idx] if not tracker.done]
+        return not self._trackers[idx]
+
+    def _new_buffer(self, idx):
+        buffer = bytearray(self.buffer_size)
+        self._buffers[idx] = buffer
+        self._views[idx] = memoryview(buffer)
+        self._trackers[idx] = []
+
+    def advance(self):
+        """Moves on to the next buffer which is not in use any more"""
+        num_buffers = len(self._buffers)
+        for step in range(1, num_buffers + 1):
+            idx = (self._idx + step) % num_buffers
+            if self._released(idx):
+                self._idx = idx
+                return
+
+        if num_buffers < self.max_buffers:
+            # behind the current buffer, the others are reused in the same order as before
+            self._idx += 1
+            self._buffers.insert(self._idx, None)
+            self._views.insert(self._idx, None)
+            self._trackers.insert(self._idx, None)
+            self._new_buffer(self._idx)
+            self.counters[0] = len(self._buffers)
+            self.counters[1] += 1
+            self.debug("Grown to {} buffers".format(len(self._buffers)))
+            return
+
+        self._idx = (self._idx + 1) % num_buffers
+        self.counters[2] += 1
+        deadline = time.monotonic() + self.stall_timeout
+        try:
+            for tracker in self._trackers[self._idx]:
+                tracker.wait(max(deadline - time.monotonic(), 0.0))
+            self._trackers[self._idx] = []
+        except zmq.NotDone:
+            # zmq keeps the old buffer alive until it is sent
+            self.counters[3] += 1
+            self.warning("All {} buffers in use, replacing one".format(num_buffers))
+            self._new_buffer(self._idx)
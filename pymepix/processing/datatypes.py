@@ -39,3 +39,8 @@ class MessageType(IntEnum):
     """Open File message"""
     CloseFileCommand = 5
     """Close File Message"""
+
+
+END_OF_RUN = b"EOR"
+"""Sent by the UdpSampler of a persistent pipeline to every packet processor when the acquisition stops.
+Packet messages end with the 8 byte longtime, so they are never this short."""
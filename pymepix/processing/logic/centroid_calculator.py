@@ -25,10 +25,6 @@ from time import time
 import os
 
 import numpy as np
-import scipy.ndimage as nd
-from sklearn.cluster import DBSCAN
-
-from joblib import Parallel, delayed
 
 from pymepix.processing.logic.processing_step import ProcessingStep
 from pymepix.clustering.cluster_stream import ClusterStream
@@ -42,6 +38,9 @@ def perform_clustering_dbscan(shot, x, y, tof, _tof_scale, epsilon, min_samples)
             Discovering Clusters [p. 229-230] (https://www.aaai.org/Papers/KDD/1996/KDD96-037.pdf)
             A more specific explaination can be found here:
             https://stats.stackexchange.com/questions/306829/why-is-dbscan-deterministic"""
+        # sklearn takes long to import, only load it when clustering is actually done
+        from sklearn.cluster import DBSCAN
+
         if x.size >= 0:
             X = np.column_stack(
                 (shot * epsilon * 1_000, x, y, tof * _tof_scale)
@@ -77,6 +76,8 @@ def calculate_centroids_properties(shot, x, y, tof, tot, labels, _cent_timewalk_
 
         Currently this is issue exists only for the TOF-column as the other columns are integer-based values.
         """
+        import scipy.ndimage as nd
+
         label_index, cluster_size = np.unique(labels, return_counts=True)
         tot_max = np.array(
             nd.maximum_position(tot, labels=labels, index=label_index)
@@ -100,9 +101,8 @@ def calculate_centroids_properties(shot, x, y, tof, tot, labels, _cent_timewalk_
         if _cent_timewalk_lut is not None:
             # cluster_tof -= self._timewalk_lut[(cluster_tot / 25).astype(np.int) - 1]
             # cluster_tof *= 1e6
-            cluster_tof -= (
-                _cent_timewalk_lut[np.int_(cluster_totMax // 25) - 1] * 1e3
-            )
+            # the table is in seconds, like the tof
+            cluster_tof -= _cent_timewalk_lut[np.int_(cluster_totMax // 25) - 1]
             # TODO: should totAvg not also be timewalk corrected?!
             # cluster_tof *= 1e-6
 
@@ -164,6 +164,7 @@ class CentroidCalculator(ProcessingStep):
         number_of_processes=1,
         clustering_args={},
         dbscan_clustering = True,
+        tot_unit="ns",
         *args,
         **kwargs,
     ):
@@ -184,48 +185,60 @@ class CentroidCalculator(ProcessingStep):
         chunk_size_limit : int
             Maximum size of the chunks to increase the performance of DBSCAN. Higher and Lower values might increase the runtime.
         cent_timewalk_lut
-            Data for correction of the time-walk
-        parameter_wrapper_classe : ProcessingParameter
-            Class used to wrap the processing parameters to make them changable while processing is running (useful for online optimization)
+            Timewalk (s) of the maximum ToT code i + 1 of a cluster at index i, see
+            :func:`pymepix.util.timewalk.compute_timewalk_lookup`
+        tot_unit : str
+            Unit of the tot of the input, "keV" after a per-pixel energy calibration. The timewalk
+            table and the threshold, which are given in ToT, are ignored then.
         """
 
         super().__init__("CentroidCalculator", *args, **kwargs)
-
-        self._epsilon = self.parameter_wrapper_class(clustering_args.pop('epsilon', 2.0))
-        self._min_samples = self.parameter_wrapper_class(clustering_args.pop('min_samples', 3))
-        self._tot_threshold = self.parameter_wrapper_class(clustering_args.pop('tot_threshold', 0))
-        self._triggers_processed = self.parameter_wrapper_class(clustering_args.pop('triggers_processed', 1))
-
-        self._cs_sensor_size = self.parameter_wrapper_class(clustering_args.pop('cs_sensor_size', 256))
-        self._cs_min_cluster_size = self.parameter_wrapper_class(clustering_args.pop('cs_min_cluster_size', 3))
-        self._cs_max_dist_tof = self.parameter_wrapper_class(clustering_args.pop('cs_max_dist_tof', 5e-8))
-        self._cs_tot_offset = self.parameter_wrapper_class(clustering_args.pop('cs_tot_offset', 0.5))
+        self.tot_unit = tot_unit
+        if self.energy_calibrated:
+            if cent_timewalk_lut is not None:
+                self.warning("Energy calibrated input, the centroid timewalk table is ignored")
+                cent_timewalk_lut = None
+            if clustering_args.get('tot_threshold', 0):
+                self.warning("Energy calibrated input, tot_threshold is ignored")
+                clustering_args = {**clustering_args, 'tot_threshold': 0}
+
+        self.init_parameters(
+            epsilon=float(clustering_args.pop('epsilon', 2.0)),
+            min_samples=int(clustering_args.pop('min_samples', 3)),
+            tot_threshold=float(clustering_args.pop('tot_threshold', 0)),
+            triggers_processed=int(clustering_args.pop('triggers_processed', 1)),
+            cs_sensor_size=int(clustering_args.pop('cs_sensor_size', 256)),
+            cs_min_cluster_size=int(clustering_args.pop('cs_min_cluster_size', 3)),
+            cs_max_dist_tof=float(clustering_args.pop('cs_max_dist_tof', 5e-8)),
+            cs_tot_offset=float(clustering_args.pop('cs_tot_offset', 0.5)),
+            dbscan_clustering=bool(dbscan_clustering),
+        )
 
         self._chunk_size_limit = clustering_args.pop('chunk_size_limit',6_500)
 
         self._tof_scale = 1.7e7
         self._cent_timewalk_lut = cent_timewalk_lut
 
-        self._dbscan_clustering = self.parameter_wrapper_class(int(dbscan_clustering))
-
         self.number_of_processes = number_of_processes
 
 
     @property
     def epsilon(self):
-        return self._epsilon.value
+        self.refresh_parameters()
+        return self._params.epsilon
 
     @epsilon.setter
     def epsilon(self, epsilon):
-        self._epsilon.value = epsilon
+        self.set_parameters(epsilon=epsilon)
 
     @property
     def min_samples(self):
-        return self._min_samples.value
+        self.refresh_parameters()
+        return self._params.min_samples
 
     @min_samples.setter
     def min_samples(self, min_samples):
-        self._min_samples.value = min_samples
+        self.set_parameters(min_samples=min_samples)
 
     @property
     def tot_threshold(self):
@@ -233,70 +246,87 @@ class CentroidCalculator(ProcessingStep):
 
         This is useful in reducing the computational time in centroiding and can filter out
         noise. """
-        return self._tot_threshold.value
+        self.refresh_parameters()
+        return self._params.tot_threshold
 
     @tot_threshold.setter
     def tot_threshold(self, tot_threshold):
-        self._tot_threshold.value = tot_threshold
+        if self.energy_calibrated and tot_threshold:
+            self.warning("Energy calibrated input, tot_threshold is ignored")
+            return
+        self.set_parameters(tot_threshold=tot_threshold)
+
+    @property
+    def energy_calibrated(self):
+        """The tot of the input is the energy from a per-pixel calibration"""
+        return self.tot_unit == "keV"
 
     @property
     def triggers_processed(self):
         """ Setting for the number of packets skipped during processing. Every packet_skip packet is processed.
         This means for a value of 1 every packet is processed. For 2 only every 2nd packet is processed. """
-        return self._triggers_processed.value
+        self.refresh_parameters()
+        return self._params.triggers_processed
 
     @triggers_processed.setter
     def triggers_processed(self, triggers_processed):
-        self._triggers_processed.value = triggers_processed
+        self.set_parameters(triggers_processed=triggers_processed)
 
     @property
     def cs_sensor_size(self):
         """ Setting for the number of packets skipped during processing. Every packet_skip packet is processed.
         This means for a value of 1 every packet is processed. For 2 only every 2nd packet is processed. """
-        return self._cs_sensor_size.value
+        self.refresh_parameters()
+        return self._params.cs_sensor_size
     @cs_sensor_size.setter
     def cs_sensor_size(self, cs_sensor_size):
-        self._cs_sensor_size.value = cs_sensor_size
+        self.set_parameters(cs_sensor_size=cs_sensor_size)
 
     @property
     def cs_min_cluster_size(self):
         """ Setting the minimal cluster size in Cluster Streaming algorithm"""
-        return self._cs_min_cluster_size.value
+        self.refresh_parameters()
+        return self._params.cs_min_cluster_size
     @cs_min_cluster_size.setter
     def cs_min_cluster_size(self, cs_min_cluster_size):
-        self._cs_min_cluster_size.value = cs_min_cluster_size
+        self.set_parameters(cs_min_cluster_size=cs_min_cluster_size)
 
     @property
     def cs_max_dist_tof(self):
         """Setting the maximal ToF distance between the voxels belonging to the cluster in Cluster Streaming algorithm"""
-        return self._cs_max_dist_tof.value
+        self.refresh_parameters()
+        return self._params.cs_max_dist_tof
     @cs_max_dist_tof.setter
     def cs_max_dist_tof(self, cs_max_dist_tof):
-        self._cs_max_dist_tof.value = cs_max_dist_tof
+        self.set_parameters(cs_max_dist_tof=cs_max_dist_tof)
 
     @property
     def cs_tot_offset(self):
         """ Setting the ToT ratio factor of the voxel to the ToT of previous voxel in Cluster Streaming algorithm.
         Zero factor means ToT of prev. voxel should be larger. 0.5 factor means ToT of prev voxel could be high than
         the half of the considered voxel"""
-        return self._cs_tot_offset.value
+        self.refresh_parameters()
+        return self._params.cs_tot_offset
     @cs_tot_offset.setter
     def cs_tot_offset(self, cs_tot_offset):
-        self._cs_tot_offset.value = cs_tot_offset
+        self.set_parameters(cs_tot_offset=cs_tot_offset)
 
     @property
     def dbscan_clustering(self):
-        return bool(self._dbscan_clustering.value)
+        self.refresh_parameters()
+        return self._params.dbscan_clustering
 
     @dbscan_clustering.setter
     def dbscan_clustering(self, dbscan_clustering):
-        self._dbscan_clustering.value = int(dbscan_clustering)
+        self.set_parameters(dbscan_clustering=dbscan_clustering)
     def process(self, data):
 
         if data is None:
             return None
 
-        if self.dbscan_clustering:
+        # one consistent set of parameters for the whole batch
+        self.refresh_parameters()
+        if self._params.dbscan_clustering:
             shot, x, y, tof, tot = self.__skip_triggers(*data)
             chunks = self.__divide_into_chunks(shot, x, y, tof, tot)
             centroids_in_chunks = self.perform_centroiding_dbscan(chunks)
@@ -308,7 +338,7 @@ class CentroidCalculator(ProcessingStep):
 
     def __skip_triggers(self, shot, x, y, tof, tot):
         unique_shots = np.unique(shot)
-        selected_shots = unique_shots[:: self.triggers_processed]
+        selected_shots = unique_shots[:: self._params.triggers_processed]
         mask = np.isin(shot, selected_shots)
         return shot[mask], x[mask], y[mask], tof[mask], tot[mask]
 
@@ -388,14 +418,15 @@ class CentroidCalculator(ProcessingStep):
     def perform_centroiding_dbscan(self, chunks):
 #        with Pool(self.number_of_processes) as p:
 #            return p.map(self.calculate_centroids_dbscan, chunks)
+        from joblib import Parallel, delayed
 
-        return Parallel(n_jobs=self.number_of_processes)(delayed(calculate_centroids_dbscan)(c,self.tot_threshold, self._tof_scale, self.epsilon, self.min_samples, self._cent_timewalk_lut) for c in chunks)
+        return Parallel(n_jobs=self.number_of_processes)(delayed(calculate_centroids_dbscan)(c,self._params.tot_threshold, self._tof_scale, self._params.epsilon, self._params.min_samples, self._cent_timewalk_lut) for c in chunks)
 
 #        return map(self.calculate_centroids_dbscan, chunks)
 
     def perform_centroiding_cluster_stream(self, chunks):
-        self.cstream = ClusterStream(self.cs_sensor_size, self.cs_max_dist_tof,\
-                                     self.cs_min_cluster_size, self.cs_tot_offset)
+        self.cstream = ClusterStream(self._params.cs_sensor_size, self._params.cs_max_dist_tof,\
+                                     self._params.cs_min_cluster_size, self._params.cs_tot_offset)
 
 #        with Pool(self.number_of_processes) as p:
 #            return p.map(self.calculate_centroids_cluster_stream, chunks)
@@ -404,7 +435,7 @@ class CentroidCalculator(ProcessingStep):
     def calculate_centroids_dbscan(self, chunk):
         shot, x, y, tof, tot = chunk
 
-        tot_filter = tot > self.tot_threshold
+        tot_filter = tot > self._params.tot_threshold
         # Filter out pixels
         shot = shot[tot_filter]
         x = x[tot_filter]
@@ -437,13 +468,14 @@ class CentroidCalculator(ProcessingStep):
         shot, x, y, tof, tot = chunk
 
         if labels is not None and labels[label_filter].size > 0:
-            return self.calculate_centroids_properties(
+            return calculate_centroids_properties(
                 shot[label_filter],
                 x[label_filter],
                 y[label_filter],
                 tof[label_filter],
                 tot[label_filter],
                 labels[label_filter],
+                self._cent_timewalk_lut,
             )
 
         return None
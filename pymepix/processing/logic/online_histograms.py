@@ -0,0 +1,320 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+"""Histograms of the online data, accumulated once in the pipeline and shared with all consumers"""
+
+import time
+from enum import IntEnum
+from multiprocessing import RawArray, Value
+
+import numpy as np
+
+from pymepix.processing.datatypes import MessageType
+from pymepix.processing.logic.processing_step import ProcessingStep
+
+
+class HistogramMode(IntEnum):
+    """How old data leaves the histograms"""
+
+    Accumulate = 0
+    """Sum everything until :meth:`OnlineHistograms.reset` is called"""
+    Decay = 1
+    """Exponentially decrease older data with the time constant decay_time"""
+    Window = 2
+    """Sum only the data of the last window_time seconds"""
+
+
+class OnlineHistograms(ProcessingStep):
+    """Accumulates a hit map, a ToT weighted map, a ToF histogram and a centroid map in shared memory
+
+    The histograms are filled by one pipeline process and can be read from any other process with
+    :meth:`snapshot`. A version counter, odd while an update is in progress, ensures consistent
+    snapshots without locking the filling process.
+
+    Parameters
+    ----------
+    shape : (int, int)
+        Number of pixels in x and y (Default: (256, 256))
+    origin : (int, int)
+        Position of the first pixel, the chip offset in a multi-chip detector (Default: (0, 0))
+    tof_bins : int
+        Number of bins of the ToF histogram (Default: 1000)
+    tof_range : (float, float)
+        Range of the ToF histogram in seconds (Default: (0, 1e-3))
+    mode : :class:`HistogramMode`
+        How old data is removed (Default: Accumulate)
+    decay_time : float
+        Time constant in seconds of the Decay mode (Default: 10)
+    window_time : float
+        Length in seconds of the Window mode (Default: 10)
+    window_slices : int
+        Time resolution of the window, the number of sub histograms kept (Default: 10)
+    tot_unit : str
+        Unit of the tot the tot map is weighted with, "keV" for energy calibrated pixels (Default: ns)
+    """
+
+    def __init__(self, shape=(256, 256), tof_bins=1000, tof_range=(0.0, 1e-3), mode=HistogramMode.Accumulate,
+                 decay_time=10.0, window_time=10.0, window_slices=10, origin=(0, 0), tot_unit="ns"):
+        super().__init__("OnlineHistograms")
+        self.shape = tuple(shape)
+        self.origin = tuple(origin)
+        self.tot_unit = tot_unit
+        self.tof_edges = np.linspace(tof_range[0], tof_range[1], tof_bins + 1)
+        self.init_parameters(mode=int(mode), decay_time=float(decay_time), window_time=float(window_time))
+        self._window_slices = window_slices
+
+        n_pixels = self.shape[0] * self.shape[1]
+        self._sizes = {"hits": n_pixels, "tot": n_pixels, "tof": tof_bins, "centroids": n_pixels}
+        # flat shared buffer, views are created per process as numpy arrays can't be pickled as shared memory
+        self._buffer = RawArray("d", sum(self._sizes.values()))
+        self._version = Value("L", 0, lock=False)
+        self._reset_requested = Value("L", 0, lock=False)
+        self._active = Value("i", 0, lock=False)
+        self._views = None
+
+        self._reset_seen = 0
+        self._last_update = None
+        self._slices = None
+        self._slice_index = None
+
+    @property
+    def mode(self):
+        self.refresh_parameters()
+        return HistogramMode(self._params.mode)
+
+    @mode.setter
+    def mode(self, mode):
+        self.set_parameters(mode=int(HistogramMode(mode)))
+        self.reset()
+
+    @property
+    def decay_time(self):
+        self.refresh_parameters()
+        return self._params.decay_time
+
+    @decay_time.setter
+    def decay_time(self, value):
+        self.set_parameters(decay_time=value)
+
+    @property
+    def window_time(self):
+        self.refresh_parameters()
+        return self._params.window_time
+
+    @window_time.setter
+    def window_time(self, value):
+        self.set_parameters(window_time=value)
+        self.reset()
+
+    @property
+    def version(self):
+        """Incremented by two with every update"""
+        return self._version.value
+
+    def _histograms(self):
+        if self._views is None:
+            flat = np.frombuffer(self._buffer, dtype=np.float64)
+            self._views, start = {}, 0
+            for name, size in self._sizes.items():
+                view = flat[start:start + size]
+                self._views[name] = view if name == "tof" else view.reshape(self.shape)
+                start += size
+        return self._views
+
+    def snapshot(self, retries=100):
+        """Consistent copy of the histograms
+
+        Returns
+        -------
+        dict
+            hits, tot (hits weighted with their tot, see tot_unit), tof, tof_edges, centroids and the version
+        """
+        flat = np.frombuffer(self._buffer, dtype=np.float64)
+        for _ in range(retries):
+            version = self._version.value
+            if version % 2 == 0:
+                copy = flat.copy()
+                if self._version.value == version:
+                    break
+            time.sleep(1e-4)
+        else:
+            self.warning("No consistent snapshot of the histograms, returning the current state")
+            version, copy = self._version.value, flat.copy()
+
+        result, start = {"version": version, "tof_edges": self.tof_edges}, 0
+        for name, size in self._sizes.items():
+            view = copy[start:start + size]
+            result[name] = view if name == "tof" else view.reshape(self.shape)
+            start += size
+        return result
+
+    def reset(self):
+        """Clears all histograms
+
+        While the pipeline runs this is done by the filling process with the next batch of data.
+        """
+        if self._active.value:
+            self._reset_requested.value += 1
+        else:
+            self._clear()
+
+    def _clear(self):
+        self._version.value += 1
+        np.frombuffer(self._buffer, dtype=np.float64)[:] = 0
+        self._version.value += 1
+        self._slices = None
+        self._last_update = None
+
+    def pre_process(self):
+        self._active.value = 1
+        self._reset_seen = self._reset_requested.value
+
+    def post_process(self):
+        self._active.value = 0
+
+    def _age(self, histograms, now):
+        """Removes old data according to the mode"""
+        mode = self._params.mode
+        if mode == HistogramMode.Decay:
+            if self._last_update is not None and now > self._last_update:
+                factor = np.exp(-(now - self._last_update) / self._params.decay_time)
+                for histogram in histograms.values():
+                    histogram *= factor
+            self._last_update = now
+        elif mode == HistogramMode.Window:
+            slice_time = self._params.window_time / self._window_slices
+            index = int(now // slice_time)
+            if self._slices is None:
+                # per process sum of every slice, subtracted from the shared total once it is too old
+                self._slices = {name: np.zeros((self._window_slices,) + h.shape) for name, h in histograms.items()}
+                self._slice_index = index
+            for expired in range(self._slice_index + 1, min(index, self._slice_index + self._window_slices) + 1):
+                for name, histogram in histograms.items():
+                    old = self._slices[name][expired % self._window_slices]
+                    histogram -= old
+                    old[:] = 0
+            self._slice_index = index
+
+    def _add(self, histograms, name, values, weights=None):
+        """Adds to the shared histogram and, in window mode, to the current slice"""
+        histogram = histograms[name]
+        if name == "tof":
+            counts, _ = np.histogram(values, bins=self.tof_edges, weights=weights)
+        else:
+            x, y = values
+            x = np.asarray(x).astype(np.int64) - self.origin[0]
+            y = np.asarray(y).astype(np.int64) - self.origin[1]
+            valid = (x >= 0) & (x < self.shape[0]) & (y >= 0) & (y < self.shape[1])
+            if weights is not None:
+                weights = np.asarray(weights, dtype=np.float64)[valid]
+            counts = np.bincount(
+                x[valid] * self.shape[1] + y[valid], weights=weights, minlength=histogram.size
+            ).reshape(histogram.shape)
+        histogram += counts
+        if self._slices is not None and self._params.mode == HistogramMode.Window:
+            self._slices[name][self._slice_index % self._window_slices] += counts
+
+    def process(self, data, now=None):
+        """Adds one batch of pipeline output
+
+        Parameters
+        ----------
+        data : tuple
+            (:class:`MessageType`, data) as passed between pipeline stages
+        now : float, optional
+            Time of the batch, used by the decay and window modes (Default: time.monotonic())
+        """
+        message_type, message = data
+        if message_type not in (MessageType.PixelData, MessageType.EventData, MessageType.CentroidData):
+            return
+        now = time.monotonic() if now is None else now
+        histograms = self._histograms()
+        self.refresh_parameters()
+
+        if self._reset_requested.value != self._reset_seen:
+            self._reset_seen = self._reset_requested.value
+            self._clear()
+
+        self._version.value += 1
+        try:
+            self._age(histograms, now)
+            if message_type == MessageType.PixelData:
+                x, y, _toa, tot = message
+                self._add(histograms, "hits", (x, y))
+                self._add(histograms, "tot", (x, y), tot)
+            elif message_type == MessageType.EventData:
+                _trigger, _x, _y, tof, _tot = message
+                self._add(histograms, "tof", tof)
+            else:
+                _trigger, x, y = message[:3]
+                self._add(histograms, "centroids", (x, y))
+        finally:
+            self._version.value += 1
+
+
+class DetectorHistograms:
+    """Online histograms of all chips of a detector, read like one :class:`OnlineHistograms`
+
+    The maps of every chip are placed at its origin on a map of the whole detector, the ToF
+    histograms are summed.
+
+    Parameters
+    ----------
+    chips : list of :class:`OnlineHistograms`
+        Histograms of the chips, with the same ToF binning
+    shape : (int, int)
+        Number of pixels of the detector in x and y
+    """
+
+    def __init__(self, chips, shape):
+        self.chips = list(chips)
+        self.shape = tuple(shape)
+        self.tof_edges = self.chips[0].tof_edges
+        self.tot_unit = self.chips[0].tot_unit
+
+    @property
+    def version(self):
+        """Changes with every update of any chip"""
+        return sum(chip.version for chip in self.chips)
+
+    def snapshot(self):
+        """Consistent copy of the histograms of every chip, merged
+
+        Returns
+        -------
+        dict
+            hits, tot (hits weighted with their tot, see tot_unit), tof, tof_edges, centroids and the version
+        """
+        result = {"version": 0, "tof_edges": self.tof_edges, "tof": np.zeros(len(self.tof_edges) - 1)}
+        for name in ("hits", "tot", "centroids"):
+            result[name] = np.zeros(self.shape)
+        for chip in self.chips:
+            snapshot = chip.snapshot()
+            result["version"] += snapshot["version"]
+            result["tof"] += snapshot["tof"]
+            x0, y0 = chip.origin
+            x1, y1 = min(x0 + chip.shape[0], self.shape[0]), min(y0 + chip.shape[1], self.shape[1])
+            for name in ("hits", "tot", "centroids"):
+                result[name][x0:x1, y0:y1] += snapshot[name][: x1 - x0, : y1 - y0]
+        return result
+
+    def reset(self):
+        """Clears the histograms of all chips"""
+        for chip in self.chips:
+            chip.reset()
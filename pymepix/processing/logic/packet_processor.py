@@ -17,6 +17,7 @@
 #
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
+import os
 from enum import IntEnum
 from multiprocessing import Value
 from ctypes import c_bool
@@ -24,6 +25,7 @@ from ctypes import c_bool
 import numpy as np
 from pymepix.core.log import Logger
 
+from pymepix.processing.logic.pixel_calibration import PixelCalibration
 from pymepix.processing.logic.processing_step import ProcessingStep
 
 
@@ -52,7 +54,8 @@ class PacketProcessor(ProcessingStep):
         if you are sure about what you are doing
     """
     def __init__(self, handle_events=True, event_window=(0.0, 10000.0), position_offset=(0, 0), 
-                orientation=PixelOrientation.Up, start_time=0, timewalk_lut=None, *args, **kwargs):
+                orientation=PixelOrientation.Up, start_time=0, timewalk_lut=None, early_reject=False,
+                pixel_calibration=None, *args, **kwargs):
         """
         Constructor for the PacketProcessor.
 
@@ -67,45 +70,78 @@ class PacketProcessor(ProcessingStep):
         orientation : int
         start_time : int
         timewalk_lut
-            Data for correction of the time-walk
-        parameter_wrapper_classe : ProcessingParameter
-            Class used to wrap the processing parameters to make them changable while processing is running (useful for online optimization)
+            Timewalk (s) of ToT code i + 1 at index i, see :func:`pymepix.util.timewalk.compute_timewalk_lookup`
+        early_reject : boolean
+            Discard pixels outside the event window of their trigger before they are buffered for
+            event building, instead of after. Saves buffer time if most hits are outside the window.
+        pixel_calibration : PixelCalibration or str
+            Per-pixel timewalk and ToT to energy calibration (or its file), replaces timewalk_lut.
+            With an energy calibration the tot of the output is the energy in keV.
         """
     
         super().__init__("PacketProcessor", *args, **kwargs)
-        self._handle_events = self.parameter_wrapper_class(handle_events)
         event_window_min, event_window_max = event_window
-        self._event_window_min = self.parameter_wrapper_class(event_window_min)
-        self._event_window_max = self.parameter_wrapper_class(event_window_max)
+        self.init_parameters(
+            handle_events=bool(handle_events),
+            event_window_min=float(event_window_min),
+            event_window_max=float(event_window_max),
+            early_reject=bool(early_reject),
+        )
         self._orientation = orientation
         self._x_offset, self._y_offset = position_offset
         self._start_time =  start_time
         self._timewalk_lut = timewalk_lut
+        if isinstance(pixel_calibration, (str, os.PathLike)):
+            pixel_calibration = PixelCalibration(pixel_calibration)
+        self._pixel_calibration = pixel_calibration
+        if pixel_calibration is not None and timewalk_lut is not None:
+            self.warning("Per-pixel calibration given, the global timewalk_lut is ignored")
 
         self._trigger_counter = 0
 
         self.clearBuffers()
 
+    @property
+    def tot_unit(self):
+        """Unit of the tot of the output, the energy in keV with a per-pixel energy calibration"""
+        if self._pixel_calibration is not None and self._pixel_calibration.energy_lut is not None:
+            return "keV"
+        return "ns"
+
     @property
     def event_window(self):
-        return (self._event_window_min.value, self._event_window_max.value)
+        self.refresh_parameters()
+        return (self._params.event_window_min, self._params.event_window_max)
 
     @event_window.setter
     def event_window(self, event_window):
+        # both ends at once, processes never see a mix of old and new window
         event_window_min, event_window_max = event_window
-        self._event_window_min.value = event_window_min
-        self._event_window_max.value = event_window_max
+        self.set_parameters(event_window_min=event_window_min, event_window_max=event_window_max)
 
     @property
     def handle_events(self):
         """:noindex:"""
-        return self._handle_events.value
+        self.refresh_parameters()
+        return self._params.handle_events
 
     @handle_events.setter
     def handle_events(self, handle_events):
-        self._handle_events.value = handle_events
+        self.set_parameters(handle_events=handle_events)
+
+    @property
+    def early_reject(self):
+        """Discard pixels outside the event window before buffering them, can be changed while running"""
+        self.refresh_parameters()
+        return self._params.early_reject
+
+    @early_reject.setter
+    def early_reject(self, early_reject):
+        self.set_parameters(early_reject=early_reject)
 
     def process(self, data):
+        # one consistent set of parameters for the whole batch
+        self.refresh_parameters()
         packet_view = memoryview(data)
         packet = np.frombuffer(packet_view[:-8], dtype=np.uint64)
         # needs to be an integer or "(ltime >> 28) & 0x3" fails
@@ -144,7 +180,7 @@ class PacketProcessor(ProcessingStep):
             if pixels.size > 0:
                 pixel_data = self.process_pixels(np.int64(pixels), longtime)
 
-                if self.handle_events:
+                if self._params.handle_events:
                     result = self.find_events_fast()
                     if result is not None:
                         event_data, timestamps = result
@@ -206,7 +242,7 @@ class PacketProcessor(ProcessingStep):
 
         tdc_time[front_edge_type == False] *= -1
 
-        if self.handle_events:
+        if self._params.handle_events:
             if self._triggers is None:
                 self._triggers = m_trigTime
             else:
@@ -266,28 +302,55 @@ class PacketProcessor(ProcessingStep):
         globalToA[((col // 2) % 16) == 0] += 16 << 8
         finalToA = globalToA * time_unit * 1e-9
 
-        if self._timewalk_lut is not None:
-            finalToA -= self._timewalk_lut[np.int_(ToT // 25) - 1] * 1e3
+        if self._pixel_calibration is not None:
+            finalToA, ToT = self._pixel_calibration.apply(col, row, ToT, finalToA)
+        elif self._timewalk_lut is not None:
+            # the table is in seconds, like the time of arrival
+            finalToA -= self._timewalk_lut[np.int_(ToT // 25) - 1]
 
         x, y = self.orientPixels(col, row)
 
         x += self._x_offset
         y += self._y_offset
 
-        if self.handle_events:
+        if self._params.handle_events:
+            ev_x, ev_y, ev_toa, ev_tot = x, y, finalToA, ToT
+            keep = self.early_reject_filter(finalToA)
+            if keep is not None:
+                ev_x, ev_y, ev_toa, ev_tot = x[keep], y[keep], finalToA[keep], ToT[keep]
+
             if self._x is None:
-                self._x = x
-                self._y = y
-                self._toa = finalToA
-                self._tot = ToT
+                self._x = ev_x
+                self._y = ev_y
+                self._toa = ev_toa
+                self._tot = ev_tot
             else:
-                self._x = np.append(self._x, x)
-                self._y = np.append(self._y, y)
-                self._toa = np.append(self._toa, finalToA)
-                self._tot = np.append(self._tot, ToT)
+                self._x = np.append(self._x, ev_x)
+                self._y = np.append(self._y, ev_y)
+                self._toa = np.append(self._toa, ev_toa)
+                self._tot = np.append(self._tot, ev_tot)
 
         return x, y, finalToA, ToT
 
+    def early_reject_filter(self, toa):
+        """Selects the pixels which can still be part of an event, None if all are kept
+
+        Triggers arrive in order, so a pixel before the last known trigger already has its final
+        trigger and is dropped if it is outside the event window. Pixels after the last trigger are
+        kept as a later trigger may still claim them, pixels before the first are never used.
+        """
+        if not self._params.early_reject or self._triggers is None or self._triggers.size == 0:
+            return None
+
+        triggers = self._triggers
+        event_window_min, event_window_max = self._params.event_window_min, self._params.event_window_max
+        trigger_index = np.searchsorted(triggers, toa, side="right") - 1
+        tof = toa - triggers[np.maximum(trigger_index, 0)]
+        keep = (tof >= event_window_min) & (tof <= event_window_max)
+        keep |= toa >= triggers[-1]
+        keep &= trigger_index >= 0
+        return keep
+
     def correct_global_time(self, arr, ltime):
         pixelbits = (arr >> 28) & 0x3
         ltimebits = (ltime >> 28) & 0x3
@@ -350,7 +413,7 @@ class PacketProcessor(ProcessingStep):
                     tof = toa - start[event_mapping]
                     event_number = trigger_counter[event_mapping]
 
-                    event_window_min, event_window_max = self.event_window
+                    event_window_min, event_window_max = self._params.event_window_min, self._params.event_window_max
                     exp_filter = (tof >= event_window_min) & (tof <= event_window_max)
 
                     result = (
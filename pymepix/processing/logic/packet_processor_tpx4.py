@@ -22,6 +22,7 @@ import numpy as np
 import math
 from enum import IntEnum
 from pymepix.processing.logic.processing_step import ProcessingStep
+from pymepix.processing.logic.shared_processing_parameter import SharedProcessingParameter
 
 from pymepix.processing.logic.datatypes_tpx4 import PacketType, ReadoutMode
 
@@ -69,16 +70,16 @@ class PacketProcessor_tpx4(ProcessingStep):
         start_time : int
         timewalk_lut
             Data for correction of the time-walk
-        parameter_wrapper_classe : ProcessingParameter
-            Class used to wrap the processing parameters to make them changable while processing is running (useful for online optimization)
         """
 
         super().__init__("PacketProcessor", *args, **kwargs)
-        self._handle_events = self.parameter_wrapper_class(handle_events)
+        self.tot_unit = "ns"
+        # shared with the pipeline processes, can be changed while processing
+        self._handle_events = SharedProcessingParameter(handle_events)
         event_window_min, event_window_max = event_window
-        self._event_window_min = self.parameter_wrapper_class(event_window_min)
-        self._event_window_max = self.parameter_wrapper_class(event_window_max)
-        self._PC24bit = self.parameter_wrapper_class(False)
+        self._event_window_min = SharedProcessingParameter(event_window_min)
+        self._event_window_max = SharedProcessingParameter(event_window_max)
+        self._PC24bit = SharedProcessingParameter(False)
         self._orientation = orientation
         self._x_offset, self._y_offset = position_offset
         self._start_time = start_time
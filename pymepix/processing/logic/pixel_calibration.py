@@ -0,0 +1,203 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Per-pixel ToT to energy and timewalk calibration
+
+The calibration file (.npz) holds one 256x256 array per parameter, indexed by [column, row] of
+the unoriented pixel:
+
+- ``a``, ``b``, ``c``, ``t``: surrogate function ``ToT = a * E + b - c / (E - t)`` with the ToT in
+  clock cycles (25 ns) and the energy E in keV
+- ``tw_c``, ``tw_t``, ``tw_d``: timewalk ``dt = tw_c / (ToT - tw_t) + tw_d`` in ns with the ToT in ns
+
+Either group may be missing. At load time the functions are evaluated for every pixel and every
+ToT code into dense tables, which are cached next to the other pymepix caches under a key derived
+from the content of the calibration file. Only the tables of the latest content of a calibration
+file are kept, each table takes 256 MB. The tables are memory mapped, so all pipeline processes
+share one copy and only the pages actually used are read. Pickled (e.g. into a spawned pipeline
+process) only the file names are kept, the tables are mapped again on unpickling.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from pymepix.core.log import Logger
+from pymepix.util.storage import cache_file, remove_stale_cache
+
+N_PIXELS = 256 * 256
+N_TOT_CODES = 1024
+
+_ENERGY_KEYS = ("a", "b", "c", "t")
+_TIMEWALK_KEYS = ("tw_c", "tw_t", "tw_d")
+_TABLE_VERSION = 1
+
+
+def surrogate_energy(tot_codes, a, b, c, t):
+    """Energy (keV) for ToT codes (25 ns), the inverse of the surrogate function
+
+    Parameters broadcast against tot_codes. Where the function can't be inverted the energy is 0.
+    """
+    # a E^2 - (ToT + a t - b) E + (ToT t - b t - c) = 0, the larger root is the physical one
+    p = tot_codes + a * t - b
+    discriminant = p**2 - 4 * a * (tot_codes * t - b * t - c)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        energy = (p + np.sqrt(discriminant)) / (2 * a)
+    return np.where(np.isfinite(energy) & (energy > 0), energy, 0.0)
+
+
+def timewalk_delay(tot, tw_c, tw_t, tw_d):
+    """Timewalk (ns) for ToT values (ns), 0 where the function is not defined"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delay = tw_c / (tot - tw_t) + tw_d
+    return np.where(np.isfinite(delay) & (tot > tw_t), delay, 0.0)
+
+
+class PixelCalibration(Logger):
+    """Dense per-pixel lookup tables of energy and timewalk, indexed by pixel and ToT code
+
+    Parameters
+    ----------
+    filename : str
+        Calibration file (.npz), see module documentation
+    use_cache : bool
+        Store the computed tables on disk and reuse them for the same calibration (Default: True).
+        Without the cache an unpickled copy computes the tables again.
+    """
+
+    def __init__(self, filename, use_cache=True):
+        super().__init__("PixelCalibration")
+        self.filename = filename
+        self.use_cache = use_cache
+        with open(filename, "rb") as f:
+            self.digest = hashlib.sha1(f.read()).hexdigest()
+        # cache files of the tables, other processes map the same files
+        self._table_paths = {}
+        self._load_tables()
+
+        if self.energy_lut is None and self.timewalk_lut is None:
+            raise ValueError(
+                f"{filename} contains neither energy {_ENERGY_KEYS} nor timewalk {_TIMEWALK_KEYS} parameters"
+            )
+
+    def __getstate__(self):
+        # a pickled table would be copied (256 MB each) into every process
+        state = self.__dict__.copy()
+        state["energy_lut"] = state["timewalk_lut"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load_tables()
+
+    def _load_tables(self):
+        self.energy_lut = None
+        self.timewalk_lut = None
+        with np.load(self.filename) as params:
+            if all(k in params for k in _ENERGY_KEYS):
+                self.energy_lut = self._table("energy", self._compile_energy, params)
+            if all(k in params for k in _TIMEWALK_KEYS):
+                self.timewalk_lut = self._table("timewalk", self._compile_timewalk, params)
+
+    @staticmethod
+    def _pixel_params(params, keys):
+        values = []
+        for key in keys:
+            value = np.asarray(params[key], dtype=np.float64)
+            if value.shape != (256, 256):
+                raise ValueError(f"Calibration parameter {key} has shape {value.shape}, expected (256, 256)")
+            values.append(value.reshape(N_PIXELS, 1))
+        return values
+
+    @staticmethod
+    def _compile(function, x, pixel_params):
+        # in blocks of pixels, the float64 intermediates of the full table would need several GB
+        table = np.empty((N_PIXELS, N_TOT_CODES), dtype=np.float32)
+        for start in range(0, N_PIXELS, 4096):
+            block = slice(start, start + 4096)
+            table[block] = function(x, *(p[block] for p in pixel_params))
+        return table
+
+    @classmethod
+    def _compile_energy(cls, params):
+        codes = np.arange(N_TOT_CODES, dtype=np.float64)
+        return cls._compile(surrogate_energy, codes, cls._pixel_params(params, _ENERGY_KEYS))
+
+    @classmethod
+    def _compile_timewalk(cls, params):
+        tot = np.arange(N_TOT_CODES, dtype=np.float64) * 25
+
+        # stored in seconds like the time of arrival it corrects
+        def delay_s(tot, *tw):
+            return timewalk_delay(tot, *tw) * 1e-9
+
+        return cls._compile(delay_s, tot, cls._pixel_params(params, _TIMEWALK_KEYS))
+
+    def _table(self, name, compile_table, params):
+        if not self.use_cache:
+            return compile_table(params)
+
+        # tables of older versions of the same file are removed, they are prefixed with its path
+        path_digest = hashlib.sha1(os.path.abspath(self.filename).encode("utf-8")).hexdigest()[:16]
+        prefix = f"pixelcal-{name}-{path_digest}"
+        if name not in self._table_paths:
+            key = f"{self.digest}-{N_TOT_CODES}-{_TABLE_VERSION}"
+            self._table_paths[name] = cache_file(prefix, key, ext="npy")
+        path = self._table_paths[name]
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+
+        self.info(f"Computing {name} table for {self.filename}")
+        table = compile_table(params)
+        # other processes may load the table meanwhile, only show them a complete file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp_path, path)
+        # processes still mapping an old table keep it until they close it
+        remove_stale_cache(prefix, path)
+        return np.load(path, mmap_mode="r")
+
+    def apply(self, col, row, tot, toa):
+        """Corrects a batch of hits with one lookup per table
+
+        Parameters
+        ----------
+        col, row : numpy.ndarray
+            Unoriented pixel position
+        tot : numpy.ndarray
+            ToT (ns)
+        toa : numpy.ndarray
+            Time of arrival (s)
+
+        Returns
+        -------
+        tuple
+            Corrected toa and the energy (keV), or tot if there is no energy calibration
+        """
+        index = (col * 256 + row) * N_TOT_CODES + np.minimum(tot // 25, N_TOT_CODES - 1)
+        if self.timewalk_lut is not None:
+            toa = toa - self.timewalk_lut.reshape(-1)[index]
+        if self.energy_lut is not None:
+            tot = self.energy_lut.reshape(-1)[index]
+        return toa, tot
@@ -20,7 +20,7 @@
 from abc import abstractmethod, ABC
 
 from pymepix.core.log import Logger
-from pymepix.processing.logic.shared_processing_parameter import SharedProcessingParameter
+from pymepix.processing.logic.shared_processing_parameter import ParameterUpdateTimeout, SharedParameterBlock
 
 class ProcessingStep(Logger, ABC):
     """Representation of one processing step in the pipeline for processing timepix raw data. 
@@ -34,9 +34,35 @@ class ProcessingStep(Logger, ABC):
      - PipelineCentroidCalculator and PipelinePacketProcessor build on top of CentroidCalculator and PacketProcessor to provide an integration in the existing online processing pipeline for online analysis.
     """
 
-    def __init__(self, name, parameter_wrapper_class=SharedProcessingParameter):
+    def __init__(self, name):
         super().__init__(name)
-        self.parameter_wrapper_class = parameter_wrapper_class
+        self._parameters = None
+        self._params = None
+        self._stuck_version = None
+
+    def init_parameters(self, **parameters):
+        """Puts the tunable parameters into one SharedParameterBlock, shared with the pipeline processes"""
+        self._parameters = SharedParameterBlock(**parameters)
+        self._params = self._parameters.snapshot()
+
+    def refresh_parameters(self):
+        """Takes a new snapshot of the parameters if they were changed, call once per batch.
+
+        Between calls the parameters are read from the local snapshot without touching shared memory.
+        """
+        version = self._parameters.version
+        if version != self._params.version and version != self._stuck_version:
+            try:
+                self._params = self._parameters.snapshot()
+            except ParameterUpdateTimeout as e:
+                # a writer died during the update, carry on with the last consistent parameters
+                self.error(f"{e}, keeping the previous parameters")
+                self._stuck_version = version
+
+    def set_parameters(self, **parameters):
+        """Changes one or several parameters at once for all processes"""
+        self._parameters.update(**parameters)
+        self._params = self._parameters.snapshot()
 
     def pre_process(self):
         pass
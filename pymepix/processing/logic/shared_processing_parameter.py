@@ -17,10 +17,17 @@
 #
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
-from multiprocessing import Value
+import time
+from multiprocessing import Lock, RawArray, Value
+from types import SimpleNamespace
+
+
 class UnknownParameterTypeException(Exception):
     pass
 
+class ParameterUpdateTimeout(Exception):
+    pass
+
 class SharedProcessingParameter(): #ProcessingParameter):
     """ Variang of the ProcessingParameter used for sharing among multiple processes. This class has to be used 
     if running with the multiprocessing pipeline to ensure all instances of the processing classes are updated
@@ -41,3 +48,71 @@ class SharedProcessingParameter(): #ProcessingParameter):
     @value.setter
     def value(self, value):
         self._value.value = value
+
+
+class SharedParameterBlock():
+    """ All tunable parameters of a processing step in one block of shared memory.
+
+    Readers take a consistent snapshot without locking: a version counter is odd while a writer
+    updates the block, a reader retries if the version was odd or changed during its copy.
+    Writers update several parameters at once, e.g. both ends of the event window, so no
+    reader sees a half updated set. Values are stored as doubles and converted back to the type
+    of their default (bool, int or float). If a writer dies during an update the block stays
+    locked, readers and writers give up after a timeout with ParameterUpdateTimeout. """
+
+    def __init__(self, **parameters):
+        self._types = {}
+        for name, value in parameters.items():
+            if not isinstance(value, (bool, int, float)):
+                raise UnknownParameterTypeException(name)
+            self._types[name] = type(value)
+        self._index = {name: index for index, name in enumerate(parameters)}
+        self._values = RawArray('d', [float(value) for value in parameters.values()])
+        self._version = Value('L', 0, lock=False)
+        self._write_lock = Lock()
+
+    @property
+    def version(self):
+        """ Incremented by two with every update """
+        return self._version.value
+
+    def snapshot(self, timeout=1.0):
+        """ Consistent copy of all parameters, attributes named like the parameters
+
+        Raises ParameterUpdateTimeout if there was no consistent copy within timeout seconds. """
+        deadline = None
+        while True:
+            version = self._version.value
+            if version % 2 == 0:
+                values = self._values[:]
+                if self._version.value == version:
+                    break
+            # only the retries look at the clock
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise ParameterUpdateTimeout(f"Parameters stayed in update {version} for {timeout} s")
+            time.sleep(0)
+        parameters = {name: self._types[name](values[index]) for name, index in self._index.items()}
+        return SimpleNamespace(version=version, **parameters)
+
+    def get(self, name):
+        return getattr(self.snapshot(), name)
+
+    def update(self, timeout=1.0, **values):
+        """ Sets one or several parameters atomically
+
+        Raises ParameterUpdateTimeout if another writer holds the block for more than timeout seconds. """
+        for name in values:
+            if name not in self._index:
+                raise KeyError(name)
+        if not self._write_lock.acquire(timeout=timeout):
+            raise ParameterUpdateTimeout(f"Parameters locked by another writer for {timeout} s")
+        try:
+            self._version.value += 1
+            for name, value in values.items():
+                self._values[self._index[name]] = float(value)
+            self._version.value += 1
+        finally:
+            self._write_lock.release()
+
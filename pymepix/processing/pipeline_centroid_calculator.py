@@ -21,7 +21,6 @@
 """Processors relating to centroiding"""
 from pymepix.processing.datatypes import MessageType
 from pymepix.processing.logic.centroid_calculator import CentroidCalculator
-from pymepix.processing.logic.shared_processing_parameter import SharedProcessingParameter
 
 from .basepipeline import BasePipelineObject
 
@@ -31,7 +30,7 @@ class PipelineCentroidCalculator(BasePipelineObject):
 
     def __init__(
         self,
-        centroid_calculator: CentroidCalculator = CentroidCalculator(parameter_wrapper_class=SharedProcessingParameter),
+        centroid_calculator: CentroidCalculator = None,
         input_queue=None,
         create_output=True,
         num_outputs=1,
@@ -44,6 +43,9 @@ class PipelineCentroidCalculator(BasePipelineObject):
             num_outputs=num_outputs,
             shared_output=shared_output
         )
+        if centroid_calculator is None:
+            # created here, a default argument would be built (with shared memory) at import
+            centroid_calculator = CentroidCalculator()
         self.centroid_calculator = centroid_calculator
 
     def process(self, data_type=None, data=None):
@@ -0,0 +1,59 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Pipeline stage filling the online histograms"""
+from pymepix.processing.logic.online_histograms import OnlineHistograms
+
+from .basepipeline import BasePipelineObject
+
+
+class PipelineOnlineHistograms(BasePipelineObject):
+    """Fills :class:`OnlineHistograms` with the pixels, events and centroids passing through
+
+    The data is passed on unchanged. Use a single process, the histograms have one writer.
+    """
+
+    def __init__(
+        self,
+        online_histograms: OnlineHistograms,
+        input_queue=None,
+        create_output=True,
+        num_outputs=1,
+        shared_output=None,
+    ):
+        super().__init__(
+            PipelineOnlineHistograms.__name__,
+            input_queue=input_queue,
+            create_output=create_output,
+            num_outputs=num_outputs,
+            shared_output=shared_output,
+        )
+        self.online_histograms = online_histograms
+
+    def pre_run(self):
+        self.online_histograms.pre_process()
+
+    def post_run(self):
+        self.online_histograms.post_process()
+        return None, None
+
+    def process(self, data_type=None, data=None):
+        self.online_histograms.process((data_type, data))
+        return None, None
@@ -19,8 +19,7 @@
 # see <https://www.gnu.org/licenses/>.
 
 from enum import IntEnum
-from pymepix.processing.datatypes import MessageType
-from pymepix.processing.logic.shared_processing_parameter import SharedProcessingParameter
+from pymepix.processing.datatypes import END_OF_RUN, MessageType
 
 import zmq
 
@@ -37,11 +36,12 @@ class PipelinePacketProcessor(BasePipelineObject):
 
     def __init__(
         self,
-        packet_processor: PacketProcessor = PacketProcessor(parameter_wrapper_class=SharedProcessingParameter),
+        packet_processor: PacketProcessor = None,
         input_queue=None,
         create_output=True,
         num_outputs=1,
-        shared_output=None
+        shared_output=None,
+        zmq_port=None,
     ):
         # set input_queue to None for now, or baseaqusition.build would have to be modified
         # input_queue is replace by zmq
@@ -52,13 +52,18 @@ class PipelinePacketProcessor(BasePipelineObject):
             num_outputs=num_outputs,
             shared_output=shared_output,
         )
+        if packet_processor is None:
+            # created here, a default argument would be built (with shared memory) at import
+            packet_processor = PacketProcessor()
         self.packet_processor = packet_processor
+        # socket of the UdpSampler of the same pipeline
+        self.zmq_port = cfg.default_cfg['zmq_port'] if zmq_port is None else zmq_port
 
     def init_new_process(self):
         self.debug("create ZMQ socket")
         ctx = zmq.Context.instance()
         self._packet_sock = ctx.socket(zmq.PULL)
-        self._packet_sock.connect(f"ipc:///tmp/packetProcessor{cfg.default_cfg['zmq_port']}")
+        self._packet_sock.connect(f"ipc:///tmp/packetProcessor{self.zmq_port}")
 
     def pre_run(self):
         self.init_new_process()
@@ -68,9 +73,23 @@ class PipelinePacketProcessor(BasePipelineObject):
         self._packet_sock.close()
         return None, self.packet_processor.post_process()
 
+    def end_run(self):
+        """Passes on the events still buffered when a persistent pipeline stops and starts afresh"""
+        event_data, _pixel_data, _timestamps, _ = self.packet_processor.post_process()
+        self.packet_processor.clearBuffers()
+        if event_data is not None:
+            self.pushOutput(MessageType.EventData, event_data)
+
     def process(self, data_type=None, data=None):
+        # wake up regularly to notice when the process is disabled
+        if not self._packet_sock.poll(100):
+            return None, None
+        packets = self._packet_sock.recv(copy=False)
+        if len(packets) < 8 and packets.bytes == END_OF_RUN:
+            self.end_run()
+            return None, None
         # timestamps are not required for online processing
-        result = self.packet_processor.process(self._packet_sock.recv(copy=False))
+        result = self.packet_processor.process(packets)
         if result is not None:
             event_data, pixel_data, _timestamps, _ = result
 
@@ -22,7 +22,6 @@ import os
 import struct
 
 import numpy as np
-import h5py
 from .logic.centroid_calculator import CentroidCalculator
 from .logic.packet_processor_factory import packet_processor_factory
 
@@ -40,12 +39,14 @@ class RawFileSampler():
         camera_generation=3,
         clustering_args={},
         dbscan_clustering=True,
+        pixel_calibration_file=None,
         **kwargs
     ):
         self._filename = file_name
         self._output_file = output_file
         self.timewalk_file = timewalk_file
         self.cent_timewalk_file = cent_timewalk_file
+        self.pixel_calibration_file = pixel_calibration_file
 
         self._number_of_processes = number_of_processes
         self._progress_callback = progress_callback
@@ -73,12 +74,16 @@ class RawFileSampler():
         if self.cent_timewalk_file is not None:
             cent_timewalk_lut = np.load(self.cent_timewalk_file)
 
-        self.packet_processor = packet_processor_factory(self.camera_generation)(start_time=self._startTime, timewalk_lut=timewalk_lut)
+        packet_processor_args = {"start_time": self._startTime, "timewalk_lut": timewalk_lut}
+        if self.pixel_calibration_file is not None:
+            packet_processor_args["pixel_calibration"] = self.pixel_calibration_file
+        self.packet_processor = packet_processor_factory(self.camera_generation)(**packet_processor_args)
 
         self.centroid_calculator = CentroidCalculator(cent_timewalk_lut=cent_timewalk_lut,
                                                       number_of_processes=self._number_of_processes,
                                                       clustering_args=self._clustering_args,
-                                                      dbscan_clustering=self._dbscan_clustering
+                                                      dbscan_clustering=self._dbscan_clustering,
+                                                      tot_unit=self.packet_processor.tot_unit
                                                      )
 
     def pre_run(self):
@@ -179,6 +184,13 @@ class RawFileSampler():
 
     def saveToHDF5(self, output_file, raw, clusters, timeStamps, _trigger_data):
         if output_file is not None:
+            import h5py
+
+            tot_unit = self.packet_processor.tot_unit
+            if tot_unit == "keV":
+                tot_description = "energy"
+            else:
+                tot_description = "time above threshold"
             with h5py.File(output_file, "a") as f:
                 names = ["trigger nr", "x", "y", "tof", "tot avg", "tot max", "clustersize"]
                 ###############
@@ -195,14 +207,14 @@ class RawFileSampler():
                         grp.attrs["nr events"] = 0
                         for i, key in enumerate(names):
                             grp.create_dataset(key, data=clusters[i], maxshape=(None,))
-                        f["centroided/tot max"].attrs["unit"] = "s"
-                        f["centroided/tot avg"].attrs["unit"] = "s"
+                        f["centroided/tot max"].attrs["unit"] = tot_unit
+                        f["centroided/tot avg"].attrs["unit"] = tot_unit
                         f["centroided/tot max"].attrs[
                             "description"
-                        ] = "maximum of time above threshold in cluster"
+                        ] = f"maximum of {tot_description} in cluster"
                         f["centroided/tot avg"].attrs[
                             "description"
-                        ] = "mean of time above threshold in cluster"
+                        ] = f"mean of {tot_description} in cluster"
                         f["centroided/tof"].attrs["unit"] = "s"
                         f["centroided/x"].attrs["unit"] = "pixel"
                         f["centroided/y"].attrs["unit"] = "pixel"
@@ -225,10 +237,12 @@ class RawFileSampler():
                         grp.create_dataset("x", data=raw[1].astype(np.uint8), maxshape=(None,))
                         grp.create_dataset("y", data=raw[2].astype(np.uint8), maxshape=(None,))
                         grp.create_dataset("tof", data=raw[3], maxshape=(None,))
-                        grp.create_dataset("tot", data=raw[4].astype(np.uint32), maxshape=(None,))
+                        # the energy of calibrated pixels is kept as float
+                        tot = raw[4] if tot_unit == "keV" else raw[4].astype(np.uint32)
+                        grp.create_dataset("tot", data=tot, maxshape=(None,))
 
                         f["raw/tof"].attrs["unit"] = "s"
-                        f["raw/tot"].attrs["unit"] = "s"
+                        f["raw/tot"].attrs["unit"] = tot_unit
                         f["raw/x"].attrs["unit"] = "pixel"
                         f["raw/y"].attrs["unit"] = "pixel"
 
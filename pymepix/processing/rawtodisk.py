@@ -27,6 +27,7 @@ import numpy as np
 import zmq
 
 from pymepix.core.log import ProcessLogger
+from pymepix.core.placement import apply_placement
 import pymepix.config.load_config as cfg
 
 
@@ -37,29 +38,39 @@ class Raw2Disk(ProcessLogger):
     Intended to allow writing of raw data while minimizing impact on UDP reception reliability.
     """
 
-    def __init__(self, context=None):
-        """ Need to pass a ZMQ context object to ensure that inproc sockets can be created """
+    def __init__(self, context=None, zmq_port=None, placement=None):
+        """ Need to pass a ZMQ context object to ensure that inproc sockets can be created
+        zmq_port is the control port of the pipeline (Default: zmq_port of the config)
+        placement pins the writer thread to CPUs, see :mod:`pymepix.core.placement` """
         ProcessLogger.__init__(self, "Raw2Disk")
+        self._zmq_port = cfg.default_cfg['zmq_port'] if zmq_port is None else zmq_port
+        self._placement = placement
 
         self.info("init raw2disk")
 
         self.writing = False  # Keep track of whether we're currently writing a file
         self.stop_thr = False
 
-        self.sock_addr = f"inproc://filewrite-{cfg.default_cfg['zmq_port']}"
+        self.sock_addr = f"inproc://filewrite-{self._zmq_port}"
         self.my_context = context or zmq.Context.instance()
         # Paired socket allows two-way communication
         self.my_sock = self.my_context.socket(zmq.PAIR)  
         self.my_sock.bind(self.sock_addr)
+        # control socket of the owner, the data socket can't carry commands
+        self._ctl_sock = self.my_context.socket(zmq.PAIR)
+        self._ctl_sock.bind(f"{self.sock_addr}-ctl")
 
+        # set by the thread once its sockets are connected
+        self._ready = threading.Event()
         self.write_thr = threading.Thread(
-            target=self._run_filewriter_thr, args=(self.sock_addr, None)
+            target=self._run_filewriter_thr, args=(self.sock_addr, self.my_context)
         )
         # self.write_thr.daemon = True
         self.write_thr.start()
         self.debug(f"{__name__} thread started")
 
-        time.sleep(1)
+        if not self._ready.wait(5.0):
+            self.error("File writer thread did not start")
 
     def _run_filewriter_thr(self, sock_addr, context=None):
         """
@@ -72,14 +83,24 @@ class Raw2Disk(ProcessLogger):
         context
             ZMQ context
         """
+        apply_placement(self._placement, self)
         context = context or zmq.Context.instance()
         # socket for communication with UDPSampler
         inproc_sock = context.socket(zmq.PAIR)
         inproc_sock.connect(sock_addr)
+        ctl_sock = context.socket(zmq.PAIR)
+        ctl_sock.connect(f"{sock_addr}-ctl")
         # socket for cummunication with main
         z_sock = context.socket(zmq.PAIR)
-        z_sock.connect(f"tcp://127.0.0.1:{cfg.default_cfg['zmq_port']}")
-        self.info(f"zmq connect to tcp://127.0.0.1:{cfg.default_cfg['zmq_port']}")
+        z_sock.connect(f"tcp://127.0.0.1:{self._zmq_port}")
+        self.info(f"zmq connect to tcp://127.0.0.1:{self._zmq_port}")
+        poller = zmq.Poller()
+        poller.register(z_sock, zmq.POLLIN)
+        poller.register(ctl_sock, zmq.POLLIN)
+        # while writing the owner can still end the thread
+        write_poller = zmq.Poller()
+        write_poller.register(inproc_sock, zmq.POLLIN)
+        write_poller.register(ctl_sock, zmq.POLLIN)
 
         # socket to maxwell
         remote_server = cfg.default_cfg.get('remote_processing_host')
@@ -96,13 +117,17 @@ class Raw2Disk(ProcessLogger):
         writing = False
         shutdown = False
         filehandle = None
+        self._ready.set()
 
         while not shutdown:
             # wait for instructions, valid commands are
             # "SHUTDOWN": exits this loop and ends thread
             # "filename" in the form "/filename
             while waiting:
-                cmd = z_sock.recv_string()
+                if ctl_sock in dict(poller.poll()):
+                    cmd = ctl_sock.recv_string()
+                else:
+                    cmd = z_sock.recv_string()
                 if cmd == "SHUTDOWN":
                     self.info("SHUTDOWN received")
                     waiting = False
@@ -131,7 +156,18 @@ class Raw2Disk(ProcessLogger):
             while writing:
                 # Receive in efficient manner (noncopy with memoryview) and write to file
                 # Check for special message that indicates EOF.
-                data_view = memoryview(inproc_sock.recv(copy=False).buffer)
+                try:
+                    frame = inproc_sock.recv(zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    # only poll once the queued data is written, so none of it is lost
+                    if inproc_sock not in dict(write_poller.poll()):
+                        if ctl_sock.recv_string() == "SHUTDOWN":
+                            self.info("SHUTDOWN received while writing")
+                            writing = False
+                            self.writing = False
+                            shutdown = True
+                    continue
+                data_view = memoryview(frame.buffer)
                 # self.debug(f'got {data_view.tobytes()}')
                 if len(data_view) == 3:
                     if data_view.tobytes() == b"EOF":
@@ -154,16 +190,34 @@ class Raw2Disk(ProcessLogger):
                 if max_sock is not None:
                     # send filename to maxwell for conversion
                     max_sock.send_string(filename)
-            waiting = True
+            waiting = not shutdown
 
         # We reach this point only after "SHUTDOWN" command received
         self.debug("Thread is finishing")
         if max_sock is not None:
             max_sock.close()
         z_sock.close()
+        ctl_sock.close()
         inproc_sock.close()
         self.debug("Thread is finished")
 
+    def shutdown(self, timeout=5.0):
+        """Ends the writer thread once the current file (if any) is closed
+
+        Returns
+        -------
+        bool
+            False if the thread did not finish within timeout
+        """
+        if self.write_thr.is_alive():
+            self._ctl_sock.send_string("SHUTDOWN")
+            self.write_thr.join(timeout)
+        if self.write_thr.is_alive():
+            return False
+        self.my_sock.close()
+        self._ctl_sock.close()
+        return True
+
     def open_file(self, socket, filename):
         """
         Creates a file with a given filename and path.
@@ -220,11 +274,8 @@ class Raw2Disk(ProcessLogger):
         """Stuff to make sure sockets and files are closed..."""
         if self.write_thr.is_alive():
             if self.writing is True:
-                self.close()
-            self.my_sock.send_string("SHUTDOWN")
-            self.write_thr.join()
-            time.sleep(1)
-            self.my_sock.close()
+                self.my_sock.send(b"EOF")
+            self.shutdown()
             self.debug("object deleted")
         else:
             self.debug("thread already closed")
@@ -29,6 +29,9 @@ import zmq
 from pymepix.core.log import ProcessLogger
 
 # from pymepix.processing.basepipeline import BasePipelineObject
+from pymepix.core.placement import apply_placement, placement_for
+from pymepix.processing.bufferring import STAT_NAMES, BufferRing
+from pymepix.processing.datatypes import END_OF_RUN
 from pymepix.processing.rawtodisk import Raw2Disk
 import pymepix.config.load_config as cfg
 
@@ -41,6 +44,10 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
 
     """
 
+    placement = None
+    """CPUs and priority of the process, set by :class:`AcquisitionStage` before the start.
+    A "writer" entry places the thread writing raw files (Default: Raw2Disk entry of the config)"""
+
     def __init__(
         self,
         address,
@@ -51,6 +58,9 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
         create_output=True,
         num_outputs=1,
         shared_output=None,
+        zmq_port=None,
+        num_buffers=10,
+        max_buffers=30,
     ):
         # BasePipelineObject.__init__(self, 'UdpSampler', input_queue=input_queue, create_output=create_output,
         #                            num_outputs=num_outputs, shared_output=shared_output)
@@ -63,11 +73,23 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
             "chunk_size": chunk_size,
             "flush_timeout": flush_timeout,
             "longtime": longtime,
+            "num_buffers": num_buffers,
+            "max_buffers": max_buffers,
         }
+        # counters of the receive buffers, see bufferStats
+        self._buffer_stats = multiprocessing.Array(ctypes.c_ulong, len(STAT_NAMES))
         self._record = Value(ctypes.c_bool, False)
         self._enable = Value(ctypes.c_bool, True)
         self._close_file = Value(ctypes.c_bool, False)
+        # a persistent pipeline keeps the process and switches between acquiring and idle
+        self._acquiring = Value(ctypes.c_bool, True)
+        self._consumers = Value(ctypes.c_uint, 1)
+        self._idle = multiprocessing.Event()
+        # set once the sockets are bound and the file writer runs
+        self._ready = multiprocessing.Event()
         self.loop_count = 0
+        # control port and socket names of this pipeline, unique per chip
+        self.zmq_port = cfg.default_cfg['zmq_port'] if zmq_port is None else zmq_port
 
     def init_new_process(self):
         """create connections and initialize variables in new process"""
@@ -76,17 +98,13 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
             self._chunk_size = self.init_param["chunk_size"] * 8192
             self._flush_timeout = self.init_param["flush_timeout"]
             self._packets_collected = 0
-            self._packet_buffer_list = [
-                bytearray(int(1.5 * self._chunk_size)) for i in range(10)
-            ]  # ring buffer to put received data in
-            self._buffer_list_idx = 0
-            self._packet_buffer_view_list = [
-                memoryview(self._packet_buffer_list[i])
-                for i in range(len(self._packet_buffer_list))
-            ]
-            self._packet_buffer_view = self._packet_buffer_view_list[
-                self._buffer_list_idx
-            ]
+            # ring buffer to put received data in, slices are sent on without copying
+            self._ring = BufferRing(
+                int(1.5 * self._chunk_size),
+                num_buffers=self.init_param["num_buffers"],
+                max_buffers=self.init_param["max_buffers"],
+                counters=self._buffer_stats,
+            )
             self._recv_bytes = 0
             self._total_time = 0.0
             self._longtime = self.init_param["longtime"]
@@ -95,7 +113,7 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
             self.debug("create packetprocessor socket")
             ctx = zmq.Context.instance()
             self._packet_sock = ctx.socket(zmq.PUSH)
-            self._packet_sock.bind(f"ipc:///tmp/packetProcessor{cfg.default_cfg['zmq_port']}")
+            self._packet_sock.bind(f"ipc:///tmp/packetProcessor{self.zmq_port}")
         except Exception as e:
             self.error("Exception occured in init!!!")
             self.error(e, exc_info=True)
@@ -110,7 +128,8 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
             )  # NIC buffer
         except OSError:
             self.warning("NIC memory you try to allocate is too much.")
-        self._sock.settimeout(1.0)
+        # short timeout, the flags are checked in between
+        self._sock.settimeout(0.1)
         self.info("Establishing connection to : {}:{}".format(*address))
         self._sock.bind(address)
 
@@ -179,6 +198,70 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
         self.debug(f"Setting record flag to {value}")
         self._record.value = bool(value)
 
+    @property
+    def acquiring(self):
+        """Forward the received packets, when False the process idles until set again
+
+        Going idle flushes the buffer and sends :data:`END_OF_RUN` to every packet processor.
+        """
+        return bool(self._acquiring.value)
+
+    @acquiring.setter
+    def acquiring(self, value):
+        self.debug(f"Setting acquiring flag to {value}")
+        if value:
+            self._idle.clear()
+        self._acquiring.value = bool(value)
+
+    @property
+    def consumers(self):
+        """Number of packet processors, each of them gets an :data:`END_OF_RUN` message"""
+        return self._consumers.value
+
+    @consumers.setter
+    def consumers(self, value):
+        self._consumers.value = value
+
+    @property
+    def bufferStats(self):
+        """Number of receive buffers and how often they grew, stalled and overran
+
+        A stall means all buffers were still in use by a slow consumer and the sampler waited,
+        an overrun that it gave up waiting and allocated a new buffer.
+        """
+        return dict(zip(STAT_NAMES, self._buffer_stats[:]))
+
+    def _reportBuffers(self):
+        stats = self.bufferStats
+        if stats["stalls"] or stats["overruns"]:
+            self.warning("Receive buffers: {}".format(stats))
+        else:
+            self.debug("Receive buffers: {}".format(stats))
+
+    def waitReady(self, timeout=None):
+        """Waits until the process receives packets
+
+        Returns
+        -------
+        bool
+            False if the timeout expired or the process ended before
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._ready.wait(0.05):
+            if not self.is_alive() or (deadline is not None and time.monotonic() > deadline):
+                return False
+        return True
+
+    def waitIdle(self, timeout=None):
+        """Waits until the end of the run has been passed on after acquiring was set to False
+
+        Returns
+        -------
+        bool
+            False if the timeout expired
+        """
+        return self._idle.wait(timeout)
+
     @property
     def close_file(self):
         return bool(self._close_file.value)
@@ -203,7 +286,8 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
     def pre_run(self):
         """init stuff which should only be available in new process"""
         self.init_new_process()
-        self.write2disk = Raw2Disk()
+        writer_placement = (self.placement or {}).get("writer")
+        self.write2disk = Raw2Disk(zmq_port=self.zmq_port, placement=placement_for("Raw2Disk", writer_placement))
         self._last_update = time.time()
 
     def post_run(self):
@@ -215,17 +299,8 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
             bytes_to_send = self._recv_bytes
             self._recv_bytes = 0
 
-            curr_list_idx = self._buffer_list_idx
-            self._buffer_list_idx = (self._buffer_list_idx + 1) % len(
-                self._packet_buffer_list
-            )
-            self._packet_buffer_view = self._packet_buffer_view_list[
-                self._buffer_list_idx
-            ]
-
-            self.write2disk.my_sock.send(
-                self._packet_buffer_list[curr_list_idx][:bytes_to_send], copy=False
-            )
+            self._ring.send(self.write2disk.my_sock, bytes_to_send)
+            self._ring.advance()
             if self.write2disk.writing:
                 self.write2disk.my_sock.send(
                     b"EOF"
@@ -243,16 +318,74 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
 
         return None, None
 
+    def _flush(self):
+        """Passes the received packets on to the packet processors and the raw file"""
+        if self.record:
+            self._ring.send(self.write2disk.my_sock, self._recv_bytes)
+        elif self.close_file:
+            self.close_file = False
+            self.debug("received close file")
+            self._ring.send(self.write2disk.my_sock, self._recv_bytes)
+            self.write2disk.my_sock.send(b"EOF")
+        # send stuff to packet processor only every 10th iteration
+        # elif self._buffer_list_idx == 9:
+        # add longtime to buffers end
+        bytes_to_send = self._recv_bytes + 8
+        self._ring.view[
+            self._recv_bytes : bytes_to_send
+        ] = np.uint64(self._longtime.value).tobytes()
+        self._ring.send(self._packet_sock, bytes_to_send)
+
+        self._recv_bytes = 0
+        self._ring.advance()
+        self._last_update = time.time()
+
+    def end_run(self):
+        """Flushes the last packets and tells every packet processor that the run is over"""
+        self._flush()
+        for _ in range(self.consumers):
+            self._packet_sock.send(END_OF_RUN)
+        self.debug("end of run sent")
+        self._reportBuffers()
+        self._idle.set()
+
+    def idle(self):
+        """Waits for the next run, packets received meanwhile are dropped unless the run started"""
+        try:
+            received = self._sock.recv_into(self._ring.view)
+        except (socket.timeout, socket.error):
+            received = 0
+        if self.acquiring:
+            self._recv_bytes = received
+        if self.close_file:
+            self.close_file = False
+            self.post_run()
+
     def run(self):
         """method which is executed in new process via multiprocessing.Process.start"""
+        # the writer thread is created first, so it doesn't inherit the CPUs and the scheduler of the
+        # sampler, placement only applies to the calling thread and the threads started after it
         self.pre_run()
+        apply_placement(self.placement, self, nic_ip=self.init_param["address"][0])
+        self._ready.set()
         enabled = self.enable
+        acquiring = True
         start = time.time()
         while True:
-            if enabled:
+            if enabled and acquiring != self.acquiring:
+                acquiring = not acquiring
+                if acquiring:
+                    self.debug("start of run")
+                    self._last_update = time.time()
+                else:
+                    self.end_run()
+            if enabled and not acquiring:
+                self.idle()
+                enabled = self.enable
+            elif enabled:
                 try:
                     self._recv_bytes += self._sock.recv_into(
-                        self._packet_buffer_view[self._recv_bytes :]
+                        self._ring.view[self._recv_bytes :]
                     )
                 except socket.timeout:
                     enabled = self.enable
@@ -282,43 +415,7 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
                     flush_time > self._flush_timeout
                 ):
                     # tpx_packets = self.get_useful_packets(packet)
-                    if self.record:
-                        self.write2disk.my_sock.send(
-                            self._packet_buffer_list[self._buffer_list_idx][
-                                : self._recv_bytes
-                            ],
-                            copy=False,
-                        )
-                    elif self.close_file:
-                        self.close_file = False
-                        self.debug("received close file")
-                        self.write2disk.my_sock.send(
-                            self._packet_buffer_list[self._buffer_list_idx][
-                                : self._recv_bytes
-                            ],
-                            copy=False,
-                        )
-                        self.write2disk.my_sock.send(b"EOF")
-                    # send stuff to packet processor only every 10th iteration
-                    # elif self._buffer_list_idx == 9:
-                    # add longtime to buffers end
-                    bytes_to_send = self._recv_bytes + 8
-                    self._packet_buffer_view[
-                        self._recv_bytes : bytes_to_send
-                    ] = np.uint64(self._longtime.value).tobytes()
-                    self._packet_sock.send(
-                        self._packet_buffer_list[self._buffer_list_idx][:bytes_to_send],
-                        copy=False,
-                    )
-
-                    self._recv_bytes = 0
-                    self._buffer_list_idx = (self._buffer_list_idx + 1) % len(
-                        self._packet_buffer_list
-                    )
-                    self._packet_buffer_view = self._packet_buffer_view_list[
-                        self._buffer_list_idx
-                    ]
-                    self._last_update = time.time()
+                    self._flush()
                     enabled = self.enable
                     # if len(packet) > 1:
 
@@ -334,7 +431,9 @@ class UdpSampler(multiprocessing.Process, ProcessLogger):
                 self.debug("I AM LEAVING")
                 break
         self.post_run()
-        self.write2disk.my_sock.close()
+        self._reportBuffers()
+        if not self.write2disk.shutdown():
+            self.warning("File writer did not finish")
         self._packet_sock.close()
 
 
@@ -25,26 +25,30 @@ import os
 import stat
 import time
 
-import numpy as np
 import serial
 import zmq
 
 import pymepix.config.load_config as cfg
 from pymepix.core.log import ProcessLogger
+from pymepix.util.trainid import FRAME_SIZE, TRAINID_MAGIC, encode_records, parse_frames
 #from zmq.sugar.constants import NOBLOCK
 
 
 # Class to write raw data to files using ZMQ and a new thread to prevent IO blocking
 class USBTrainID(multiprocessing.Process, ProcessLogger):
     """
-    Class for asynchronously writing raw files
+    Class for asynchronously writing the train IDs received on the USB serial interface
     Intended to allow writing of raw data while minimizing impact on UDP reception reliability
+
+    The train IDs are logged in the binary format of :mod:`pymepix.util.trainid`, the file is
+    flushed every flush_interval seconds.
     """
 
-    def __init__(self, name="USBTrainId"):
+    def __init__(self, name="USBTrainId", flush_interval=1.0):
         multiprocessing.Process.__init__(self)
         ProcessLogger.__init__(self, name)
 
+        self._flush_interval = flush_interval
         device = cfg.default_cfg["trainID"]["device"]
         try:
             self._ser = None
@@ -61,20 +65,30 @@ class USBTrainID(multiprocessing.Process, ProcessLogger):
         except Exception:
             self.error(f"Problem in init connecting to {device} {Exception}")
 
-        # Configure serial interface
-        self._ser = serial.Serial(device, 115200)
+        # Configure serial interface, the timeout lets the recording loop check for commands
+        self._ser = serial.Serial(device, 115200, timeout=0.1)
+
+    def read_records(self, buffer):
+        """Reads all bytes available (at least a frame or until timeout) and parses them
+
+        Returns
+        -------
+        tuple
+            Time of arrival (ns), (train_id, beam_mode) of the complete frames and the bytes left over
+        """
+        data = self._ser.read(max(self._ser.in_waiting, FRAME_SIZE))
+        zeit = time.time_ns()
+        if not data:
+            return zeit, [], buffer
+        records, buffer, errors = parse_frames(buffer + data)
+        if errors:
+            self.info(f"{errors} frames with wrong CRC skipped")
+        return zeit, records, buffer
 
     def run(self):
         ctx = zmq.Context.instance()
         z_sock = ctx.socket(zmq.PAIR)
-        z_sock.connect("ipc:///tmp/train_sock")
-
-        # variables needed in loop
-        # times, ids = [], []
-        # Information fields read from the USB interface
-        timingInfoNames = ["Train ID", "Beam Mode", "CRC"]
-        # Number of bytes in each information field
-        timingInfoLength = [16, 8, 2]
+        z_sock.connect(f"ipc:///tmp/train_sock{cfg.default_cfg['zmq_port']}")
 
         # State machine etc. local variables
         waiting = True
@@ -99,6 +113,7 @@ class USBTrainID(multiprocessing.Process, ProcessLogger):
                         self.info(f"File {filename} opening")
                         # Open filehandle
                         filehandle = open(filename, "wb")
+                        filehandle.write(TRAINID_MAGIC)
                         z_sock.send_string("OPENED")
                         waiting = False
                         record = True
@@ -107,48 +122,17 @@ class USBTrainID(multiprocessing.Process, ProcessLogger):
                         self.info(f'"{cmd}" not a valid command')
                         z_sock.send_string(f'"{cmd}" in an INVALID command')
 
+            buffer = b""
+            last_flush = time.monotonic()
             while record:
-                # Align with beginning of word (STX = ASCII 02)
-                while bytes([2]) != self._ser.read(1):
-                    pass
-
-                # Reset information on each run
-                timingInfo = {k: "" for k in timingInfoNames}
-                # Get info according to Information fields and bytes fields
-                # Information fields are in order, so do not use standard Python dictionary
-                for info in range(len(timingInfoNames)):
-                    for sizeInfo in range(timingInfoLength[info]):
-                        timingInfo[timingInfoNames[info]] += self._ser.read(1).decode(
-                            "utf-8"
-                        )
-                zeit = time.time_ns()
-                # Check if last byte is a ETX
-                if bytes([3]) != self._ser.read(1):
-                    self.info("Not properly align, skipping this run.")
-                    continue
-
-                crc = ""
-                # Calculate crc
-                crcVal = 0
-                # data payload
-                timingPayload = timingInfo["Train ID"] + timingInfo["Beam Mode"]
-                for i in range(0, len(timingPayload), 2):
-                    crcVal ^= int(timingPayload[i : i + 2], 16)
-                if crcVal != int(timingInfo["CRC"], 16):
-                    crc = (
-                        " !!!Problem!!! Calculated CRC: " + str(hex(crcVal)[2:]).upper()
-                    )
-                    continue
-
-                # Train ID in decimal
-                timingInfo["Train ID"] = int(timingInfo["Train ID"], 16)
-
-                # ids.append(timingInfo['Train ID'])
-                # times.append(zeit)
-                # directly store data to disk
-                np.save(filehandle, zeit)
-                np.save(filehandle, timingInfo["Train ID"])
-                # print(timingInfo['Train ID'], zeit)
+                zeit, records, buffer = self.read_records(buffer)
+                if records:
+                    filehandle.write(encode_records(zeit, records))
+
+                now = time.monotonic()
+                if now - last_flush >= self._flush_interval:
+                    filehandle.flush()
+                    last_flush = now
 
                 if z_sock.poll(timeout=0):
                     cmd = z_sock.recv_string()
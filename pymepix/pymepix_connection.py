@@ -17,14 +17,17 @@
 #
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
+import os
+import queue
 import threading
 import time
-from collections import deque
 from multiprocessing import Queue
 
 import pymepix.config.load_config as cfg
+from pymepix.core.dispatcher import BoundedQueue, CallbackWorker, DataStream, Dispatcher, DropPolicy
 from pymepix.core.log import Logger
 from pymepix.processing.acquisition import PixelPipeline
+from pymepix.processing.logic.online_histograms import DetectorHistograms
 from .SPIDR.spidrcontroller import SPIDRController
 from .TPX4.tpx4controller import Timepix4Controller
 from .timepixdevice import TimepixDevice
@@ -51,6 +54,18 @@ class PymepixConnection(Logger):
         socket style tuple of SPIDR ip address and port
     src_ip_port : :obj:`tuple` of :obj:`str` and :obj:`int`, optional
         socket style tuple of the IP address and port of the interface that is connecting to SPIDR
+    chip_offsets : :obj:`list` of :obj:`tuple`, optional
+        Position (x, y) of every chip in a multi-chip detector, added to the pixel coordinates of its
+        data (Default: ``chip_offsets`` of the timepix config or (0, 0) for all chips)
+    persistent_pipeline : bool, optional
+        Keep the pipeline processes between acquisitions, see :attr:`persistentPipeline`
+        (Default: ``persistent_pipeline`` of the config or False)
+    pixel_calibration : str or :obj:`list` of str, optional
+        Per-pixel energy and timewalk calibration file (.npz) applied while decoding, one for all
+        chips or one (or None) per chip (Default: ``pixel_calibration`` of the timepix config)
+
+    Every chip runs its own acquisition pipeline (UDP sampler, raw file writer, decoding) with its
+    own control port, the outputs are merged in one data thread per chip.
 
     Examples
     --------
@@ -78,18 +93,44 @@ class PymepixConnection(Logger):
 
     """
 
-    def data_thread(self):
+    def data_thread(self, data_queue):
         self.info("Starting data thread")
         while True:
-            value = self._data_queue.get()
+            value = data_queue.get()
             self.debug("Popped value {}".format(value))
             if value is None:
                 break
 
-            data_type, data = value
-            self._event_callback(data_type, data)
+            # never blocks, slow consumers drop data according to their policy
+            self._dispatcher.dispatch(value)
+            self._publishHistograms()
 
-            self._channel.send_data_by_message_type(data_type, data)
+    def _publishHistograms(self):
+        """Sends a snapshot of the online histograms on the data channel every histogramInterval seconds"""
+        now = time.monotonic()
+        if now - self._histogram_published < self.histogramInterval:
+            return
+        # called by the data thread of every chip, one of them publishes
+        if not self._histogram_lock.acquire(blocking=False):
+            return
+        try:
+            self._publishSnapshot(now)
+        finally:
+            self._histogram_lock.release()
+
+    def _publishSnapshot(self, now):
+        if now - self._histogram_published < self.histogramInterval:
+            return
+        self._histogram_published = now
+        histograms = self.histograms
+        if histograms is None or histograms.version == self._histogram_version:
+            return
+        snapshot = histograms.snapshot()
+        self._histogram_version = snapshot["version"]
+        self._channel.send(
+            ChannelDataType.HISTOGRAM,
+            (snapshot["hits"], snapshot["tot"], snapshot["tof"], snapshot["tof_edges"], snapshot["centroids"]),
+        )
 
     def __init__(self,
                  spidr_address=(cfg.default_cfg['timepix']['tpx_ip'],
@@ -101,14 +142,38 @@ class PymepixConnection(Logger):
 
                  pipeline_class=PixelPipeline,
                  camera_generation=3,
+                 chip_offsets=None,
+                 persistent_pipeline=None,
+                 pixel_calibration=None,
                  ):
         Logger.__init__(self, "Pymepix")
 
-        self._channel = Data_Channel()
+        if chip_offsets is None:
+            chip_offsets = cfg.default_cfg['timepix'].get('chip_offsets')
+        self._chip_offsets = chip_offsets
+        if pixel_calibration is None:
+            pixel_calibration = cfg.default_cfg['timepix'].get('pixel_calibration')
+        self._pixel_calibration = pixel_calibration
+        chip_shape = (256, 256) if camera_generation == 3 else (448, 512)
+        offsets = chip_offsets or [(0, 0)]
+        detector_shape = tuple(max(offset[i] for offset in offsets) + chip_shape[i] for i in range(2))
+        self._detector_shape = detector_shape
+        self._channel = Data_Channel(detector_shape=detector_shape)
         self.chanAddress = api_channel_address
         self._channel.start()
         self._channel.register(f'tcp://{api_channel_address[0]}:{api_channel_address[1]}')
 
+        self._dispatcher = Dispatcher("Pymepix Dispatcher")
+        self._dispatcher.addConsumer("channel", self._channel.q, lambda item: Data_Channel.message_for(*item))
+        self._poll_buffer = BoundedQueue()
+        self._callback_worker = None
+        self._stream_count = 0
+
+        self.histogramInterval = 1.0
+        self._histogram_published = 0.0
+        self._histogram_version = None
+        self._histogram_lock = threading.Lock()
+
         self.camera_generation = camera_generation
 
         controllerClass = self._timepix_controller_class_factory(camera_generation)
@@ -118,14 +183,19 @@ class PymepixConnection(Logger):
         TimepixDeviceClass = self._timepix_device_class_factory(camera_generation)
         self._timepix_devices: list[TimepixDeviceClass] = []
 
-        self._data_queue = Queue()
+        self._data_queues = []
         self._createTimepix(pipeline_class)
+        if persistent_pipeline is not None:
+            self.persistentPipeline = persistent_pipeline
         self._controller.setBiasSupplyEnable(True)
         self.biasVoltage = 50
         self.enablePolling()
-        self._data_thread = threading.Thread(target=self.data_thread)
-        self._data_thread.daemon = True
-        self._data_thread.start()
+        self._data_threads = []
+        for idx, data_queue in enumerate(self._data_queues):
+            thread = threading.Thread(target=self.data_thread, args=(data_queue,), name=f"Pymepix data {idx}")
+            thread.daemon = True
+            thread.start()
+            self._data_threads.append(thread)
 
         self._running = False
 
@@ -145,8 +215,8 @@ class PymepixConnection(Logger):
         """If polling is used, returns data stored in data buffer.
 
 
-        the buffer is in the form of a ring and will overwrite older
-        values if it becomes full
+        the buffer is bounded and drops data according to its policy
+        (by default the oldest) if it becomes full
 
 
         Returns
@@ -155,18 +225,10 @@ class PymepixConnection(Logger):
 
 
         """
-        if block:
-            while True:
-                try:
-                    return self._poll_buffer.popleft()
-                except IndexError:
-                    time.sleep(0.5)
-                    continue
-        else:
-            try:
-                return self._poll_buffer.popleft()
-            except IndexError:
-                raise PollBufferEmpty
+        try:
+            return self._poll_buffer.get(block=block)
+        except queue.Empty:
+            raise PollBufferEmpty
 
     @property
     def pollBufferLength(self):
@@ -175,29 +237,63 @@ class PymepixConnection(Logger):
         Clears buffer on set
 
         """
-        return self._poll_buffer.maxlen
+        return self._poll_buffer.maxsize
 
     @pollBufferLength.setter
     def pollBufferLength(self, value):
         self.warning("Clearing polling buffer")
-        self._poll_buffer = deque(maxlen=value)
+        self._poll_buffer.clear()
+        self._poll_buffer.maxsize = value
 
     @property
     def dataCallback(self):
         """Function to call when data is received from a timepix device
 
-        This has the effect of disabling polling.
+        This has the effect of disabling polling. The function is called from its own thread
+        through a bounded queue, see :meth:`setDataCallback`.
 
         """
         return self._event_callback
 
     @dataCallback.setter
     def dataCallback(self, value):
-        self._event_callback = value
+        self.setDataCallback(value)
+
+    def setDataCallback(self, callback, maxsize=100, policy=DropPolicy.DROP_OLDEST):
+        """Sets the function to call when data is received from a timepix device
+
+        This has the effect of disabling polling.
+
+        Parameters
+        ----------
+        callback : function
+            Called with data_type and data
+        maxsize : int
+            Number of items queued for the callback before data is dropped (Default: 100)
+        policy : :class:`DropPolicy`
+            Which data to drop if the callback can't keep up (Default: DROP_OLDEST)
+
+        """
+        if self._callback_worker is not None:
+            self._callback_worker.stop()
+            self._callback_worker = None
+        self._dispatcher.removeConsumer("callback")
+        self._dispatcher.removeConsumer("poll")
+
+        self._event_callback = callback
         self.warning("Clearing polling buffer")
         self._poll_buffer.clear()
 
-    def enablePolling(self, maxlen=100):
+        if callback == self._pollCallback:
+            # polling needs no extra thread, poll() takes from the buffer directly
+            self._dispatcher.addConsumer("poll", self._poll_buffer)
+        else:
+            callback_queue = BoundedQueue(maxsize, policy)
+            self._callback_worker = CallbackWorker("Pymepix Callback", callback, callback_queue)
+            self._callback_worker.start()
+            self._dispatcher.addConsumer("callback", callback_queue)
+
+    def enablePolling(self, maxlen=100, policy=DropPolicy.DROP_OLDEST):
         """Enables polling mode
 
         This clears any user defined callbacks and the polling buffer
@@ -207,17 +303,105 @@ class PymepixConnection(Logger):
         self.info("Enabling polling")
 
         self.pollBufferLength = maxlen
+        self._poll_buffer.policy = DropPolicy(policy)
         self.dataCallback = self._pollCallback
 
     def _pollCallback(self, data_type, data):
-        self._poll_buffer.append((data_type, data))
+        self._poll_buffer.put((data_type, data))
+
+    def stream(self, types=None, max_batch=1, maxsize=100, policy=DropPolicy.DROP_OLDEST):
+        """Opens a data stream, read in a ``for`` or ``async for`` loop
+
+        Every stream has its own bounded queue and does not affect polling, the data callback or
+        other streams. The number of dropped batches is in :attr:`DataStream.dropped` and
+        :attr:`consumerStats`.
+
+        >>> with timepix.stream(types=[MessageType.PixelData], max_batch=10) as stream:
+        ...     for data_type, data in stream:
+        ...         ...
+
+        >>> async for data_type, data in timepix.stream():
+        ...     ...
+
+        Parameters
+        ----------
+        types : iterable of :class:`MessageType`, optional
+            Data types to receive, all if None (Default: None)
+        max_batch : int
+            Join up to this many queued batches of the same type into one (Default: 1)
+        maxsize : int
+            Number of batches queued before data is dropped (Default: 100)
+        policy : :class:`DropPolicy`
+            Which data to drop if the stream is not read fast enough (Default: DROP_OLDEST)
+
+        Returns
+        -------
+        :class:`DataStream`
+            The stream, iteration ends after :meth:`DataStream.close`
+
+        """
+        self._stream_count += 1
+        name = f"stream{self._stream_count}"
+        data_stream = DataStream(
+            types, max_batch, maxsize, policy, on_close=lambda _: self._dispatcher.removeConsumer(name)
+        )
+        self._dispatcher.addConsumer(name, data_stream)
+        return data_stream
+
+    def setConsumerLimits(self, name, maxsize=None, policy=None):
+        """Changes the queue of a data consumer
+
+        Parameters
+        ----------
+        name : str
+            'poll', 'callback', 'channel' or the name of a stream in :attr:`consumerStats`
+        maxsize : int, optional
+            Number of items queued before data is dropped
+        policy : :class:`DropPolicy`, optional
+            Which data to drop if the consumer can't keep up
+
+        """
+        consumer = self._dispatcher.consumer(name)
+        if consumer is None:
+            raise ValueError("No data consumer {}".format(name))
+        if maxsize is not None:
+            consumer.maxsize = maxsize
+        if policy is not None:
+            consumer.policy = DropPolicy(policy)
+
+    @property
+    def consumerStats(self):
+        """Queued, received and dropped items of every data consumer"""
+        return self._dispatcher.stats()
 
     def _createTimepix(self, pipeline_class=PixelPipeline):
         TimepixDeviceClass = self._timepix_device_class_factory(self.camera_generation)
+        devices = []
         for x in self._controller:
             status, enabled, locked = x.linkStatus
             if enabled != 0 and locked == enabled:
-                self._timepix_devices.append(TimepixDeviceClass(x, self._data_queue, pipeline_class))
+                devices.append(x)
+
+        if self._chip_offsets is not None and len(self._chip_offsets) < len(devices):
+            raise ValueError(f"{len(devices)} chips found but only {len(self._chip_offsets)} chip_offsets given")
+        calibrations = self._pixel_calibration
+        if calibrations is None or isinstance(calibrations, (str, os.PathLike)):
+            calibrations = [calibrations] * len(devices)
+        elif len(calibrations) < len(devices):
+            raise ValueError(f"{len(devices)} chips found but only {len(calibrations)} pixel_calibration files given")
+
+        for idx, x in enumerate(devices):
+            # independent pipelines, each with its own queue and ports
+            data_queue = Queue()
+            pipeline_args = {}
+            if self._chip_offsets is not None:
+                pipeline_args["pixel_offset"] = tuple(self._chip_offsets[idx])
+            if len(devices) > 1:
+                pipeline_args["zmq_port"] = cfg.default_cfg['zmq_port'] + idx
+            if calibrations[idx] is not None:
+                pipeline_args["pixel_calibration"] = calibrations[idx]
+            self._data_queues.append(data_queue)
+            self._timepix_devices.append(TimepixDeviceClass(x, data_queue, pipeline_class, **pipeline_args))
 
         self._num_timepix = len(self._timepix_devices)
         self.info("Found {} Timepix/Medipix devices".format(len(self._timepix_devices)))
@@ -225,16 +409,28 @@ class PymepixConnection(Logger):
             self.info("Device {} - {}".format(idx, tpx.devIdToString()))
 
     def start_recording(self, path):
+        before = [device.readTimer() for device in self._timepix_devices]
         self._controller.resetTimers()
         self._controller.restartTimers()
-        time.sleep(1)  # give camera time to reset timers
+        # the timestamps of the file only make sense once the camera has reset its timers
+        for device, timer in zip(self._timepix_devices, before):
+            device.waitTimerReset(timer)
 
-        self._timepix_devices[0].start_recording(path)
+        for idx, device in enumerate(self._timepix_devices):
+            device.start_recording(self.chipFileName(path, idx))
 
         self._channel.send(ChannelDataType.COMMAND, Commands.START_RECORD)
 
+    def chipFileName(self, path, idx):
+        """Raw file of one chip, path itself for a single chip and path with _chip<idx> suffix otherwise"""
+        if len(self._timepix_devices) < 2:
+            return path
+        root, ext = os.path.splitext(path)
+        return f"{root}_chip{idx}{ext}"
+
     def stop_recording(self):
-        self._timepix_devices[0].stop_recording()
+        for device in self._timepix_devices:
+            device.stop_recording()
         self._channel.send(ChannelDataType.COMMAND, Commands.STOP_RECORD)
 
     def start(self):
@@ -280,6 +476,34 @@ class PymepixConnection(Logger):
             t.stop()
         self._running = False
 
+    def close(self):
+        """Stops acquisition, ends all pipeline processes and open data streams
+
+        Needed with persistent pipelines.
+        """
+        self.stop()
+        for t in self._timepix_devices:
+            t.shutdown()
+        for name in list(self._dispatcher.stats()):
+            consumer = self._dispatcher.consumer(name)
+            if isinstance(consumer, DataStream):
+                consumer.close()
+
+    @property
+    def persistentPipeline(self):
+        """Keep the pipeline processes between acquisitions
+
+        Every start spawns the processes of the pipelines (and a stop ends them) unless this is set.
+        Persistent pipelines only idle when stopped, so starting again takes milliseconds, which pays
+        off in scans of many short runs. Call :meth:`close` to end the processes.
+        """
+        return all(t.acquisition.persistent for t in self._timepix_devices)
+
+    @persistentPipeline.setter
+    def persistentPipeline(self, value):
+        for t in self._timepix_devices:
+            t.acquisition.persistent = value
+
     @property
     def isAcquiring(self):
         return self._running
@@ -298,6 +522,33 @@ class PymepixConnection(Logger):
         self._channel.unregister()
         self._channel.register(f'tcp://{value[0]}:{value[1]}')
 
+    def startMonitoring(self, interval=2.0):
+        """Refreshes the monitoring values of the readout board (temperatures, voltages, ...) in the background
+
+        Reading them then doesn't send requests to the board, which is busy with acquisition commands.
+        Only supported by SPIDR (Timepix3).
+        """
+        if hasattr(self._controller, "startMonitoring"):
+            self._controller.startMonitoring(interval)
+        else:
+            self.warning("Monitoring cache not supported by {}".format(type(self._controller).__name__))
+
+    @property
+    def histograms(self):
+        """Online histograms of the detector, None if disabled
+
+        A single chip returns its :class:`OnlineHistograms`, several a :class:`DetectorHistograms`
+        which places the maps of every chip at its position in the detector.
+        Snapshots are published on the data channel as ``hist`` every histogramInterval seconds.
+        """
+        chips = [getattr(t.acquisition, "online_histograms", None) for t in self._timepix_devices]
+        chips = [chip for chip in chips if chip is not None]
+        if not chips:
+            return None
+        if len(chips) == 1 and chips[0].origin == (0, 0) and chips[0].shape == self._detector_shape:
+            return chips[0]
+        return DetectorHistograms(chips, self._detector_shape)
+
     def __getitem__(self, key) -> TimepixDevice:
         return self._timepix_devices[key]
 
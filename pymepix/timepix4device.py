@@ -39,13 +39,18 @@ class BadPixelFormat(Exception):
 class Timepix4Device(Logger):
     """ Provides a control of a timepix4 object """
 
-    def __init__(self, tpx4_device, data_queue, pipeline_class=PixelPipeline):
+    def __init__(self, tpx4_device, data_queue, pipeline_class=PixelPipeline, pixel_offset=None, zmq_port=None,
+                 pixel_calibration=None):
 
         self._device = tpx4_device
         Logger.__init__(self, "Timepix " + self.devIdToString())
         self._data_queue = data_queue
         self._udp_address = (self._device.ipAddrDest, self._device.serverPort)
         self.info("UDP Address is {}:{}".format(*self._udp_address))
+        # position in a multi-chip detector, control port of the own pipeline and calibration of the chip
+        self._pixel_offset_coords = pixel_offset
+        self._zmq_port = zmq_port
+        self._pixel_calibration = pixel_calibration
 
 
         self.camera_generation = 4
@@ -71,6 +76,18 @@ class Timepix4Device(Logger):
 
     def setupAcquisition(self, acquisition_klass, *args, **kwargs):
         self.info("Setting up acquisition class")
+        if self._pixel_offset_coords is not None:
+            kwargs.setdefault("position_offset", self._pixel_offset_coords)
+        if self._zmq_port is not None:
+            kwargs.setdefault("zmq_port", self._zmq_port)
+        if self._pixel_calibration is not None:
+            kwargs.setdefault("pixel_calibration", self._pixel_calibration)
+        # the processes of a persistent pipeline would outlive it
+        previous = getattr(self, "_acquisition_pipeline", None)
+        if previous is not None:
+            self.stop()
+            previous.shutdown()
+            kwargs.setdefault("persistent", previous.persistent)
         self._acquisition_pipeline = acquisition_klass(
             self._data_queue, self._udp_address, self._longtime, camera_generation=self.camera_generation, *args, **kwargs
         )
@@ -154,6 +171,14 @@ class Timepix4Device(Logger):
     def resumeHeartbeat(self):
         pass
 
+    def readTimer(self):
+        return self._longtime.value
+
+    def waitTimerReset(self, before, timeout=1.0):
+        """The timer of a Timepix4 can't be read back, gives the camera timeout seconds to reset"""
+        time.sleep(timeout)
+        return True
+
     def devIdToString(self):
         """Converts device ID into readable string
 
@@ -305,6 +330,12 @@ class Timepix4Device(Logger):
             self.pauseHeartbeat()
             self._acq_running = False
 
+    def shutdown(self):
+        """Stops acquisition and ends the processes of the pipeline, also if it is persistent"""
+        self.stop()
+        if self._acquisition_pipeline is not None:
+            self._acquisition_pipeline.shutdown()
+
     def start_recording(self, path):
         udp_sampler = self._acquisition_pipeline._stages[0]
         udp_sampler._pipeline_objects[0].record = True
@@ -48,30 +48,81 @@ class TimepixDevice(Logger):
         """Heartbeat thread"""
         self.info("Heartbeat thread starting")
         while self._run_timer:
-            while self._pause_timer and self._run_timer:
-                time.sleep(1.0)
-                continue
+            # sleeps while paused, wakes up as soon as the heartbeat is resumed
+            self._timer_active.wait()
+            if not self._run_timer:
+                break
+            self.readTimer()
+            self.debug(
+                "Reading heartbeat LSB: {} MSB: {} TIMER: {} ".format(
+                    self._timer_lsb, self._timer_msb, self._timer
+                )
+            )
+            self._timer_wakeup.wait(1.0)
+            self._timer_wakeup.clear()
 
+    def readTimer(self):
+        """Reads the timer of the device and updates the heartbeat
+
+        Returns
+        -------
+        int
+            Timer value in units of the global time
+        """
+        with self._timer_lock:
             self._timer_lsb, self._timer_msb = self._device.timer
             self._timer = (self._timer_msb & 0xFFFFFFFF) << 32 | (
                 self._timer_lsb & 0xFFFFFFFF
             )
             self._longtime.value = self._timer
-            self.debug(
-                "Reading heartbeat LSB: {} MSB: {} TIMER: {} ".format(
-                    self._timer_lsb, self._timer_msb, self._timer
-                )
-            )
-            time.sleep(1.0)
+        return self._timer
 
-    def __init__(self, spidr_device, data_queue, pipeline_class=PixelPipeline):
+    def waitTimerReset(self, before, timeout=1.0, threshold=40_000_000):
+        """Waits until the device acknowledges a timer reset
+
+        The reset is seen when the timer goes back, or runs below threshold (in 25 ns units).
+        A timer which was below threshold already before the reset can't be told apart and
+        counts as reset right away.
+
+        Parameters
+        ----------
+        before : int
+            Timer value read before the reset, see :meth:`readTimer`
+        timeout : float
+            Seconds to wait at most (Default: 1.0)
+        threshold : int
+            Timer values below count as reset (Default: 40_000_000, i.e. 1 s)
+
+        Returns
+        -------
+        bool
+            Whether the timer was reset within timeout
+        """
+        deadline = time.monotonic() + timeout
+        previous = before
+        while True:
+            timer = self.readTimer()
+            if timer < previous or timer < threshold:
+                return True
+            if time.monotonic() > deadline:
+                self.warning("Timer was not reset within {} s".format(timeout))
+                return False
+            previous = timer
+            # every read is a request on the control connection
+            time.sleep(0.02)
+
+    def __init__(self, spidr_device, data_queue, pipeline_class=PixelPipeline, pixel_offset=None, zmq_port=None,
+                 pixel_calibration=None):
 
         self._device = spidr_device
         Logger.__init__(self, "Timepix " + self.devIdToString())
         self._data_queue = data_queue
         self._udp_address = (self._device.ipAddrDest, self._device.serverPort)
         self.info("UDP Address is {}:{}".format(*self._udp_address))
-        self._pixel_offset_coords = (0, 0)
+        # position in a multi-chip detector, control port of the own pipeline and calibration of the chip
+        self._pixel_offset_coords = pixel_offset
+        self._zmq_port = zmq_port
+        self._pixel_calibration = pixel_calibration
         self._device.reset()
         self._device.reinitDevice()
 
@@ -84,7 +135,10 @@ class TimepixDevice(Logger):
         self._event_callback = None
 
         self._run_timer = True
-        self._pause_timer = False
+        self._timer_active = threading.Event()
+        self._timer_wakeup = threading.Event()
+        self._timer_lock = threading.Lock()
+        self._timer_lsb = self._timer_msb = self._timer = 0
 
         self.setEthernetFilter(0xFFFF)
 
@@ -110,6 +164,18 @@ class TimepixDevice(Logger):
 
     def setupAcquisition(self, acquisition_klass, *args, **kwargs):
         self.info("Setting up acquisition class")
+        if self._pixel_offset_coords is not None:
+            kwargs.setdefault("position_offset", self._pixel_offset_coords)
+        if self._zmq_port is not None:
+            kwargs.setdefault("zmq_port", self._zmq_port)
+        if self._pixel_calibration is not None:
+            kwargs.setdefault("pixel_calibration", self._pixel_calibration)
+        # the processes of a persistent pipeline would outlive it
+        previous = getattr(self, "_acquisition_pipeline", None)
+        if previous is not None:
+            self.stop()
+            previous.shutdown()
+            kwargs.setdefault("persistent", previous.persistent)
         self._acquisition_pipeline = acquisition_klass(
             self._data_queue, self._udp_address, self._longtime, *args, **kwargs
         )
@@ -184,10 +250,11 @@ class TimepixDevice(Logger):
         return self._acquisition_pipeline
 
     def pauseHeartbeat(self):
-        self._pause_timer = True
+        self._timer_active.clear()
 
     def resumeHeartbeat(self):
-        self._pause_timer = False
+        self._timer_active.set()
+        self._timer_wakeup.set()
 
     def devIdToString(self):
         """Converts device ID into readable string
@@ -294,10 +361,22 @@ class TimepixDevice(Logger):
     def pixelTest(self, value):
         self._device._pixel_test = value
 
-    def uploadPixels(self):
-        """Uploads local pixel configuration to timepix"""
+    def uploadPixels(self, columns_per_packet=3, force=False):
+        """Uploads local pixel configuration to timepix
 
-        self._device.uploadPixelConfig()
+        Only the columns that changed since the last upload are sent, e.g. masking a few
+        hot pixels during a run only sends the packets containing them.
+
+        Parameters
+        ----------
+        columns_per_packet : int, optional
+            Number of pixel columns sent per request to SPIDR, at most 4 (Default: 3)
+        force : bool, optional
+            Reset the pixels on the chip and upload the full configuration (Default: False)
+
+        """
+
+        self._device.uploadPixelConfig(columns_per_packet=columns_per_packet, force=force)
 
     def refreshPixels(self):
         """Loads timepix pixel configuration to local array"""
@@ -320,6 +399,12 @@ class TimepixDevice(Logger):
             self.pauseHeartbeat()
             self._acq_running = False
 
+    def shutdown(self):
+        """Stops acquisition and ends the processes of the pipeline, also if it is persistent"""
+        self.stop()
+        if self._acquisition_pipeline is not None:
+            self._acquisition_pipeline.shutdown()
+
     def start_recording(self, path):
         udp_sampler = self._acquisition_pipeline._stages[0]
         udp_sampler._pipeline_objects[0].record = True
@@ -0,0 +1,594 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Synthetic Timepix3/Timepix4 data with known ground truth
+
+Generates packet streams of clustered hits following periodic triggers, encoded exactly the way
+:class:`PacketProcessor` and :class:`PacketProcessor_tpx4` decode them. The data can be written to
+raw files in the :class:`Raw2Disk` format or sent over UDP like SPIDR does. The true cluster
+positions, times of flight and ToT are returned alongside, so the output of
+:class:`CentroidCalculator` can be compared against them with :func:`match_centroids`.
+"""
+
+import argparse
+import socket
+import time
+
+import numpy as np
+
+from pymepix.util.spidrDummyUDP import SPIDR_WORDS_PER_PACKET
+
+TRUTH_DTYPE = np.dtype(
+    [
+        ("shot", np.int64),
+        ("x", np.float64),
+        ("y", np.float64),
+        ("tof", np.float64),
+        ("tot", np.float64),
+        ("size", np.int64),
+    ]
+)
+"""Ground truth of one cluster: trigger number, true centre, time of flight, summed ToT (ns) and
+number of pixels. The time of flight is in s for Timepix3 and in ns for Timepix4, like the
+respective packet processor returns it."""
+
+_SENSOR_SIZE = {3: (256, 256), 4: (448, 512)}
+_MAX_TOT = {3: 0x3FF, 4: 0x7FF}
+
+# ToA rollover of Timepix4 pixels in ns, one heartbeat is sent at the start of every period
+_TPX4_ROLLOVER = 25.0 * 2 ** 16
+
+
+def _u64(value):
+    return np.asarray(value).astype(np.uint64)
+
+
+def encode_tpx3_pixels(x, y, toa, tot):
+    """Encodes Timepix3 data driven pixel packets (header 0xB)
+
+    Parameters
+    ----------
+    x, y : array_like
+        Column and row of the pixels
+    toa : array_like
+        Absolute time of arrival in s, i.e. longtime * 25 ns
+    tot : array_like
+        Time over threshold in ns, rounded to multiples of 25 ns
+
+    Returns
+    -------
+    tuple
+        The packets and the time of arrival :class:`PacketProcessor` will decode from them
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+
+    # the fine ToA counts 1.5625 ns backwards from the coarse 25 ns clock, corrected for the
+    # column dependent clock phase
+    fine = np.rint(np.asarray(toa) / (25e-9 / 16)).astype(np.int64)
+    phase = (x // 2) % 16
+    phase[phase == 0] = 16
+    coarse = (fine - phase + 15) // 16
+    ftoa = coarse * 16 + phase - fine
+    tot_raw = np.clip(np.rint(np.asarray(tot) / 25), 1, _MAX_TOT[3]).astype(np.int64)
+
+    data = ((coarse & 0x3FFF) << 14) | (tot_raw << 4) | ftoa
+    pix = (x % 2) * 4 + y % 4
+    words = (
+        (np.uint64(0xB) << np.uint64(60))
+        | (_u64(x & 0xFE) << np.uint64(52))
+        | (_u64(y & 0xFC) << np.uint64(45))
+        | (_u64(pix) << np.uint64(44))
+        | (_u64(data) << np.uint64(16))
+        | _u64((coarse >> 14) & 0xFFFF)
+    )
+    return words, fine * (25e-9 / 16)
+
+
+def encode_tpx3_triggers(toa, counter):
+    """Encodes rising edge TDC1 packets (0x6F)
+
+    Parameters
+    ----------
+    toa : array_like
+        Absolute trigger time in s
+    counter : array_like
+        Trigger number, only the lowest 12 bits are stored
+
+    Returns
+    -------
+    tuple
+        The packets and the trigger time :class:`PacketProcessor` will decode from them
+    """
+    units = np.rint(np.asarray(toa) / (25e-9 / 4096)).astype(np.int64)
+    coarse = units // 4096
+    remainder = units - coarse * 4096
+    phase = remainder // 512
+    fine = np.clip(np.rint((remainder - phase * 512) * 12 / 512), 0, 11).astype(np.int64)
+    decoded = coarse * 4096 + phase * 512 + ((fine << 9) // 12)
+
+    words = (
+        (np.uint64(0x6F) << np.uint64(56))
+        | (_u64(np.asarray(counter) & 0xFFF) << np.uint64(44))
+        | (_u64(coarse & 0xFFFFFFFF) << np.uint64(12))
+        | (_u64(phase) << np.uint64(9))
+        | (_u64(fine + 1) << np.uint64(5))
+    )
+    return words, decoded * (25e-9 / 4096)
+
+
+def encode_tpx3_heartbeats(longtime):
+    """Encodes pairs of heartbeat LSB (0x44) and MSB (0x45) packets for the given longtimes"""
+    longtime = _u64(longtime)
+    lsb = (np.uint64(0x44) << np.uint64(56)) | ((longtime & np.uint64(0xFFFFFFFF)) << np.uint64(16))
+    msb = (np.uint64(0x45) << np.uint64(56)) | (
+        ((longtime >> np.uint64(32)) & np.uint64(0xFFFF)) << np.uint64(16)
+    )
+    return np.stack((lsb, msb), axis=-1).reshape(-1)
+
+
+def encode_tpx4_pixels(x, y, toa, tot):
+    """Encodes Timepix4 pixel packets
+
+    Parameters
+    ----------
+    x, y : array_like
+        Column (0-447) and row (0-511) of the pixels
+    toa : array_like
+        Absolute time of arrival in ns
+    tot : array_like
+        Time over threshold in ns, rounded to multiples of 25 ns
+
+    Returns
+    -------
+    tuple
+        The packets and the time of arrival :class:`PacketProcessor_tpx4` will decode from them,
+        given a heartbeat at the start of every ToA rollover period
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    toa = np.asarray(toa, dtype=np.float64)
+
+    top = (y < 256).astype(np.int64)
+    col = np.where(top == 1, 447 - x, x)
+    row = np.where(top == 1, y, 511 - y)
+    superpixel = row // 4
+    pixel = (col % 2) * 4 + row % 4
+
+    start = np.floor(toa / _TPX4_ROLLOVER) * _TPX4_ROLLOVER
+    # clock distribution delay along the column, given by the superpixel group
+    delay = ((superpixel >> 2) - 15) * 0.78125
+    target = toa - start - delay
+    toa_raw = np.minimum(np.ceil(target / 25), 0xFFFF).astype(np.int64)
+    ftoa = np.clip(np.rint((toa_raw * 25 - target) / 1.5625), 0, 0x1F).astype(np.int64)
+    tot_raw = np.clip(np.rint(np.asarray(tot) / 25), 1, _MAX_TOT[4]).astype(np.int64)
+
+    # ultrafast ToA start and stop cancel each other, equal fToA rise and fall keep ToT exact
+    words = (
+        (_u64(top) << np.uint64(63))
+        | (_u64(col // 2) << np.uint64(55))
+        | (_u64(superpixel) << np.uint64(49))
+        | (_u64(pixel) << np.uint64(46))
+        | (_u64(toa_raw) << np.uint64(30))
+        | (np.uint64(0xF) << np.uint64(26))
+        | (np.uint64(0xF) << np.uint64(22))
+        | (_u64(ftoa) << np.uint64(17))
+        | (_u64(ftoa) << np.uint64(12))
+        | (_u64(tot_raw) << np.uint64(1))
+    )
+    return words, start + toa_raw * 25 - ftoa * 1.5625 + delay
+
+
+def encode_tpx4_heartbeats(toa):
+    """Encodes Timepix4 heartbeat packets for absolute times in ns"""
+    ticks = _u64(np.floor(np.asarray(toa) / 25))
+    return (np.uint64(0xE0) << np.uint64(55)) | (ticks & np.uint64(0xFFFFFFFFFFFF))
+
+
+class HitGenerator:
+    """Generates Timepix packet streams of clustered hits with ground truth
+
+    Every trigger is followed by a Poisson distributed number of clusters. The pixels of a cluster
+    are spread around its centre following a gaussian, the summed ToT is shared between them
+    according to their distance from the centre. Triggers are TDC1 packets for Timepix3 and hits
+    on the first trigger pixel (0, 0) for Timepix4.
+
+    Parameters
+    ----------
+    camera_generation : int
+        3 for Timepix3, 4 for Timepix4 (Default: 3)
+    trigger_frequency : float
+        Trigger rate in Hz, the period is rounded to multiples of 25 ns (Default: 10 kHz)
+    clusters_per_trigger : float
+        Mean number of clusters per trigger (Default: 5)
+    cluster_size : float
+        Mean number of pixels per cluster before removing duplicates (Default: 6)
+    cluster_sigma : float
+        Width in pixels of the gaussian cluster shape (Default: 0.8)
+    tof_range : (float, float)
+        Times of flight in s are drawn uniformly from this range (Default: 1 µs to 20 µs)
+    tof_peaks : list of float, optional
+        Draw the times of flight from these peaks (in s) instead, e.g. one per ion species
+    tof_width : float
+        Gaussian width in s of the tof_peaks (Default: 5 ns)
+    tot_mean, tot_sigma : float
+        Mean and width in ns of the gaussian ToT spectrum of whole clusters
+        (Default: 2000 ns and 500 ns)
+    time_spread : float
+        Gaussian spread in s of the pixel times within a cluster, only delaying (Default: 1 ns)
+    noise_rate : float
+        Rate in Hz of uncorrelated single pixel hits on the whole sensor (Default: 0)
+    heartbeat_interval : float
+        Time in s between Timepix3 heartbeats, Timepix4 gets one at every ToA rollover
+        (Default: 1 ms)
+    start_longtime : int
+        Timer value in 25 ns ticks of the first trigger (Default: 2**32)
+    seed : int, optional
+        Seed of the random number generator, the same seed gives the same data
+    """
+
+    def __init__(
+        self,
+        camera_generation=3,
+        trigger_frequency=10e3,
+        clusters_per_trigger=5.0,
+        cluster_size=6.0,
+        cluster_sigma=0.8,
+        tof_range=(1e-6, 20e-6),
+        tof_peaks=None,
+        tof_width=5e-9,
+        tot_mean=2000.0,
+        tot_sigma=500.0,
+        time_spread=1e-9,
+        noise_rate=0.0,
+        heartbeat_interval=1e-3,
+        start_longtime=2 ** 32,
+        seed=None,
+    ):
+        if camera_generation not in _SENSOR_SIZE:
+            raise ValueError(f"No hit generator for camera generation {camera_generation}")
+        self.camera_generation = camera_generation
+        self.sensor_size = _SENSOR_SIZE[camera_generation]
+
+        self.period = max(1, round(1 / trigger_frequency / 25e-9)) * 25e-9
+        self.clusters_per_trigger = clusters_per_trigger
+        self.cluster_size = cluster_size
+        self.cluster_sigma = cluster_sigma
+        self.tof_range = tof_range
+        self.tof_peaks = None if tof_peaks is None else np.asarray(tof_peaks, dtype=np.float64)
+        self.tof_width = tof_width
+        self.tot_mean = tot_mean
+        self.tot_sigma = tot_sigma
+        self.time_spread = time_spread
+        self.noise_rate = noise_rate
+        self.heartbeat_interval = heartbeat_interval
+        self.start_longtime = int(start_longtime)
+        if camera_generation == 4:
+            # keep the heartbeats on the ToA rollover
+            self.start_longtime -= self.start_longtime % 2 ** 16
+        self.seed = seed
+
+        max_tof = self.tof_range[1] if self.tof_peaks is None else self.tof_peaks.max()
+        if max_tof + 5 * max(time_spread, tof_width) >= self.period:
+            raise ValueError("Times of flight have to be shorter than the trigger period")
+
+    @property
+    def dtype(self):
+        """Byte order of the packets: little endian for Timepix3, big endian for Timepix4"""
+        return np.dtype("<u8") if self.camera_generation == 3 else np.dtype(">u8")
+
+    def _clusters(self, rng, shots, trigger_times):
+        """Pixels and ground truth of the clusters following the given triggers"""
+        width, height = self.sensor_size
+        sigma = self.cluster_sigma
+        margin = np.ceil(3 * sigma) + 1
+
+        n_clusters = rng.poisson(self.clusters_per_trigger, shots.size)
+        shot = np.repeat(shots, n_clusters)
+        start = np.repeat(trigger_times, n_clusters)
+        count = shot.size
+
+        cx = rng.uniform(margin, width - 1 - margin, count)
+        cy = rng.uniform(margin, height - 1 - margin, count)
+        if self.tof_peaks is None:
+            tof = rng.uniform(*self.tof_range, count)
+        else:
+            tof = rng.choice(self.tof_peaks, count) + rng.normal(0, self.tof_width, count)
+            tof = np.clip(tof, 0, None)
+        total_tot = np.clip(rng.normal(self.tot_mean, self.tot_sigma, count), 25, None)
+
+        size = 1 + rng.poisson(max(self.cluster_size - 1, 0), count)
+        cid = np.repeat(np.arange(count), size)
+        x = np.rint(cx[cid] + rng.normal(0, sigma, cid.size)).astype(np.int64)
+        y = np.rint(cy[cid] + rng.normal(0, sigma, cid.size)).astype(np.int64)
+
+        # a pixel fires only once per cluster
+        _, first = np.unique((cid * width + x) * height + y, return_index=True)
+        first.sort()
+        cid, x, y = cid[first], x[first], y[first]
+
+        weight = np.exp(-((x - cx[cid]) ** 2 + (y - cy[cid]) ** 2) / (2 * sigma ** 2))
+        weight_sum = np.bincount(cid, weight, minlength=count)
+        tot = np.clip(
+            np.rint(total_tot[cid] * weight / weight_sum[cid] / 25), 1, _MAX_TOT[self.camera_generation]
+        ) * 25
+        toa = start[cid] + tof[cid] + np.abs(rng.normal(0, self.time_spread, cid.size))
+
+        truth = np.empty(count, dtype=TRUTH_DTYPE)
+        truth["shot"] = shot
+        truth["x"] = cx
+        truth["y"] = cy
+        truth["tof"] = tof if self.camera_generation == 3 else tof * 1e9
+        truth["tot"] = np.bincount(cid, tot, minlength=count)
+        truth["size"] = np.bincount(cid, minlength=count)
+        return x, y, toa, tot, truth
+
+    def _noise(self, rng, begin, end):
+        width, height = self.sensor_size
+        count = rng.poisson(self.noise_rate * (end - begin))
+        x = rng.integers(0, width, count)
+        y = rng.integers(0, height, count)
+        if self.camera_generation == 4:
+            # keep the trigger pixels free
+            y[(y == 0) & (x < 4)] = 1
+        toa = rng.uniform(begin, end, count)
+        tot = rng.integers(1, 20, count) * 25.0
+        return x, y, toa, tot
+
+    def _encode(self, shots, trigger_times, hits, begin, end):
+        """Packets of one block, sorted by time"""
+        x, y, toa, tot = hits
+        base = self.start_longtime * 25e-9
+        if self.camera_generation == 3:
+            first = int(np.ceil(begin / self.heartbeat_interval))
+            last = int(np.ceil(end / self.heartbeat_interval))
+            beats = np.arange(first, last) * self.heartbeat_interval
+            longtime = self.start_longtime + np.floor(beats / 25e-9 + 1e-6).astype(np.int64)
+            parts = [
+                (encode_tpx3_heartbeats(longtime), np.repeat(beats, 2), np.tile([0, 1], beats.size)),
+                (encode_tpx3_triggers(base + trigger_times, shots)[0], trigger_times, 2),
+                (encode_tpx3_pixels(x, y, base + toa, tot)[0], toa, 3),
+            ]
+        else:
+            first = int(np.ceil(begin * 1e9 / _TPX4_ROLLOVER))
+            last = int(np.ceil(end * 1e9 / _TPX4_ROLLOVER))
+            beats = np.arange(first, last) * _TPX4_ROLLOVER
+            trigger_pixels = np.zeros(shots.size, dtype=np.int64)
+            parts = [
+                (encode_tpx4_heartbeats(base * 1e9 + beats), beats * 1e-9, 0),
+                (
+                    encode_tpx4_pixels(trigger_pixels, trigger_pixels, base * 1e9 + trigger_times * 1e9, 25)[0],
+                    trigger_times,
+                    2,
+                ),
+                (encode_tpx4_pixels(x, y, base * 1e9 + toa * 1e9, tot)[0], toa, 3),
+            ]
+
+        words = np.concatenate([p[0] for p in parts])
+        times = np.concatenate([p[1] for p in parts])
+        priority = np.concatenate([np.broadcast_to(p[2], p[0].shape) for p in parts])
+        return words[np.lexsort((priority, times))].astype(self.dtype)
+
+    def blocks(self, n_triggers, triggers_per_block=1024):
+        """Generates the data block by block to keep the memory use bounded
+
+        Parameters
+        ----------
+        n_triggers : int
+            Total number of triggers
+        triggers_per_block : int
+            Number of triggers in one block (Default: 1024)
+
+        Yields
+        ------
+        tuple
+            The packets of the block in the byte order of the detector and the ground truth
+            of its clusters as :data:`TRUTH_DTYPE` array
+        """
+        rng = np.random.default_rng(self.seed)
+        for first in range(0, n_triggers, triggers_per_block):
+            shots = np.arange(first, min(first + triggers_per_block, n_triggers))
+            begin, end = shots[0] * self.period, (shots[-1] + 1) * self.period
+            trigger_times = shots * self.period
+
+            x, y, toa, tot, truth = self._clusters(rng, shots, trigger_times)
+            nx, ny, ntoa, ntot = self._noise(rng, begin, end)
+            hits = (
+                np.concatenate((x, nx)),
+                np.concatenate((y, ny)),
+                np.concatenate((toa, ntoa)),
+                np.concatenate((tot, ntot)),
+            )
+            yield self._encode(shots, trigger_times, hits, begin, end), truth
+
+    def generate(self, n_triggers):
+        """All packets and the ground truth for n_triggers at once, see :meth:`blocks`"""
+        words, truth = zip(*self.blocks(n_triggers))
+        # concatenate returns native byte order
+        return np.concatenate(words).astype(self.dtype), np.concatenate(truth)
+
+    def write_raw(self, fname, n_triggers, start_time=None):
+        """Writes a raw file like :class:`Raw2Disk` does
+
+        Parameters
+        ----------
+        fname : str
+            Output file
+        n_triggers : int
+            Number of triggers
+        start_time : int, optional
+            Start time in ns stored in the file header (Default: now)
+
+        Returns
+        -------
+        numpy.ndarray
+            The ground truth as :data:`TRUTH_DTYPE` array
+        """
+        start_time = time.time_ns() if start_time is None else start_time
+        truth = []
+        with open(fname, "wb") as f:
+            f.write(int(start_time).to_bytes(8, "little"))
+            for words, block_truth in self.blocks(n_triggers):
+                f.write(words.tobytes())
+                truth.append(block_truth)
+        return np.concatenate(truth)
+
+    def stream(self, address, n_triggers, words_per_packet=SPIDR_WORDS_PER_PACKET, rate=None):
+        """Sends the data over UDP in datagrams like SPIDR does
+
+        Parameters
+        ----------
+        address : :obj:`tuple` of :obj:`str` and :obj:`int`
+            socket style tuple of the receiving ip address and port
+        n_triggers : int
+            Number of triggers
+        words_per_packet : int
+            Number of 64 bit words in each datagram (Default: 139, like SPIDR)
+        rate : float, optional
+            Target rate in MByte/s, None sends as fast as possible
+
+        Returns
+        -------
+        tuple
+            The ground truth as :data:`TRUTH_DTYPE` array and a dict with the number of
+            datagrams and bytes sent and the time taken
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        packet_bytes = words_per_packet * 8
+        sent_packets, sent_bytes = 0, 0
+        truth = []
+        start = time.perf_counter()
+        for words, block_truth in self.blocks(n_triggers):
+            data = memoryview(words.tobytes())
+            for begin in range(0, len(data), packet_bytes):
+                sent_bytes += sock.sendto(data[begin : begin + packet_bytes], address)
+                sent_packets += 1
+                if rate is not None:
+                    ahead = sent_bytes / (rate * 1e6) - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+            truth.append(block_truth)
+        sock.close()
+        return np.concatenate(truth), {
+            "packets": sent_packets,
+            "bytes": sent_bytes,
+            "time": time.perf_counter() - start,
+        }
+
+
+def match_centroids(truth, centroids, max_distance=2.0):
+    """Compares centroids with the ground truth
+
+    Every centroid is matched to the closest true cluster of the same trigger.
+
+    Parameters
+    ----------
+    truth : numpy.ndarray
+        Ground truth as :data:`TRUTH_DTYPE` array
+    centroids : tuple
+        Output of :meth:`CentroidCalculator.process`: trigger nr, x, y, tof, tot avg, tot max
+        and cluster size
+    max_distance : float
+        Maximum distance in pixels of a match (Default: 2)
+
+    Returns
+    -------
+    dict
+        efficiency (fraction of true clusters found), purity (fraction of centroids matching
+        a true cluster), split (fraction of true clusters found more than once) and the
+        rms of the x, y and tof residuals of the matches
+    """
+    from scipy.spatial import cKDTree
+
+    shot, x, y, tof = (np.asarray(c) for c in centroids[:4])
+    result = {"efficiency": 0.0, "purity": 0.0, "split": 0.0, "x rms": np.nan, "y rms": np.nan, "tof rms": np.nan}
+    if truth.size == 0 or shot.size == 0:
+        return result
+
+    # triggers are kept apart by a large offset in a third dimension
+    offset = 10 * (max_distance + 1)
+    tree = cKDTree(np.column_stack((truth["x"], truth["y"], truth["shot"] * offset)))
+    distance, index = tree.query(np.column_stack((x, y, shot * offset)), distance_upper_bound=max_distance)
+    matched = np.isfinite(distance)
+    found = np.bincount(index[matched], minlength=truth.size)
+
+    result["efficiency"] = np.count_nonzero(found) / truth.size
+    result["purity"] = np.count_nonzero(matched) / shot.size
+    result["split"] = np.count_nonzero(found > 1) / truth.size
+    if matched.any():
+        best = truth[index[matched]]
+        result["x rms"] = np.sqrt(np.mean((x[matched] - best["x"]) ** 2))
+        result["y rms"] = np.sqrt(np.mean((y[matched] - best["y"]) ** 2))
+        result["tof rms"] = np.sqrt(np.mean((tof[matched] - best["tof"]) ** 2))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Timepix data generator")
+    parser.add_argument("--output", type=str, help="raw file to write")
+    parser.add_argument("--truth", type=str, help="write the ground truth to this .npy file")
+    parser.add_argument("--ip", type=str, default="127.0.0.1", help="send to this address instead of writing a file")
+    parser.add_argument("--port", type=int, help="send over UDP to this port instead of writing a file")
+    parser.add_argument("--rate", type=float, help="target UDP rate in MByte/s (default: as fast as possible)")
+    parser.add_argument("--camera", type=int, default=3, choices=[3, 4], help="camera generation")
+    parser.add_argument("--triggers", type=int, default=10_000, help="number of triggers")
+    parser.add_argument("--frequency", type=float, default=10e3, help="trigger frequency in Hz")
+    parser.add_argument("--clusters", type=float, default=5.0, help="mean number of clusters per trigger")
+    parser.add_argument("--size", type=float, default=6.0, help="mean number of pixels per cluster")
+    parser.add_argument("--sigma", type=float, default=0.8, help="width of the clusters in pixels")
+    parser.add_argument("--tof", type=float, nargs=2, default=(1e-6, 20e-6), help="range of times of flight in s")
+    parser.add_argument("--tof-peaks", type=float, nargs="+", help="times of flight of the peaks in s")
+    parser.add_argument("--tot", type=float, nargs=2, default=(2000.0, 500.0), help="cluster ToT mean and width in ns")
+    parser.add_argument("--noise", type=float, default=0.0, help="rate of noise hits in Hz")
+    parser.add_argument("--seed", type=int, help="seed of the random number generator")
+    args = parser.parse_args()
+
+    if args.output is None and args.port is None:
+        parser.error("either --output or --port is required")
+
+    generator = HitGenerator(
+        camera_generation=args.camera,
+        trigger_frequency=args.frequency,
+        clusters_per_trigger=args.clusters,
+        cluster_size=args.size,
+        cluster_sigma=args.sigma,
+        tof_range=args.tof,
+        tof_peaks=args.tof_peaks,
+        tot_mean=args.tot[0],
+        tot_sigma=args.tot[1],
+        noise_rate=args.noise,
+        seed=args.seed,
+    )
+
+    if args.port is not None:
+        truth, stats = generator.stream((args.ip, args.port), args.triggers, rate=args.rate)
+        print(f"sent {stats['packets']} datagrams, {stats['bytes'] * 1e-6:.1f} MB "
+              f"in {stats['time']:.2f} s ({stats['bytes'] * 1e-6 / stats['time']:.1f} MByte/s)")
+    else:
+        truth = generator.write_raw(args.output, args.triggers)
+        print(f"wrote {args.output}")
+    print(f"{truth.size} clusters with {truth['size'].sum()} pixels")
+
+    if args.truth is not None:
+        np.save(args.truth, truth)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,13 +18,161 @@
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
 
+"""Replays recorded raw files over UDP, pretending to be SPIDR
+
+The data is sent as multi-word datagrams like SPIDR does. Sending can be spread over
+several processes, paced to a target rate, sent in bursts and with injected packet loss.
+This allows stress testing the acquisition pipeline locally over loopback.
+"""
+
 import argparse
+import multiprocessing
 import socket
-import struct
 import time
 
 import numpy as np
 
+# number of 64 bit words SPIDR packs into one datagram
+SPIDR_WORDS_PER_PACKET = 139
+
+
+def _send_packets(
+    fname,
+    address,
+    packet_indices,
+    words_per_packet,
+    repeats,
+    rate,
+    burst,
+    loss,
+    skip_header,
+    seed,
+    result_queue,
+):
+    """Sends the datagrams with the given indices, runs in its own process"""
+    data = np.fromfile(fname, dtype=np.uint64)
+    if skip_header:
+        data = data[1:]
+    data_view = memoryview(data).cast("B")
+    packet_bytes = words_per_packet * 8
+    rng = np.random.default_rng(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 8_000_000)
+    except OSError:
+        pass
+
+    sent_packets, sent_bytes, dropped = 0, 0, 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        # decide upfront which datagrams get lost
+        lost = rng.random(packet_indices.size) < loss if loss > 0 else None
+        for i, idx in enumerate(packet_indices.tolist()):
+            if lost is not None and lost[i]:
+                dropped += 1
+                continue
+            begin = idx * packet_bytes
+            packet = data_view[begin : begin + packet_bytes]
+            sock.sendto(packet, address)
+            sent_packets += 1
+            sent_bytes += len(packet)
+
+            # pace after every burst
+            if rate is not None and sent_packets % burst == 0:
+                ahead = sent_bytes / rate - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+    sock.close()
+    result_queue.put((sent_packets, sent_bytes, dropped, time.perf_counter() - start))
+
+
+def replay(
+    fname,
+    address=("127.0.0.1", 50000),
+    repeats=1,
+    words_per_packet=SPIDR_WORDS_PER_PACKET,
+    rate=None,
+    burst=1,
+    loss=0.0,
+    processes=1,
+    skip_header=False,
+):
+    """Sends a raw file to a UDP address
+
+    Parameters
+    ----------
+    fname : str
+        Raw file to send, as written by :class:`Raw2Disk`
+    address : :obj:`tuple` of :obj:`str` and :obj:`int`, optional
+        socket style tuple of the receiving ip address and port (Default: 127.0.0.1:50000)
+    repeats : int, optional
+        Number of times the data is sent (Default: 1)
+    words_per_packet : int, optional
+        Number of 64 bit words in each datagram (Default: 139, like SPIDR)
+    rate : float, optional
+        Target rate in MByte/s for all processes together, None sends as fast as possible
+    burst : int, optional
+        Number of datagrams sent back to back before pacing to the target rate (Default: 1)
+    loss : float, optional
+        Fraction of datagrams randomly left out to simulate packet loss (Default: 0.0)
+    processes : int, optional
+        Number of sending processes. The file is split into contiguous blocks, one per process,
+        so the order of datagrams between blocks is not preserved (Default: 1)
+    skip_header : bool, optional
+        Leave out the first word of the file holding the start time (Default: False)
+
+    Returns
+    --------
+    dict
+        Datagrams and bytes sent, datagrams dropped, time taken and achieved rates
+
+    """
+    processes = max(1, processes)
+    words = np.fromfile(fname, dtype=np.uint64).size - int(skip_header)
+    num_packets = -(-words // words_per_packet)
+    blocks = np.array_split(np.arange(num_packets), processes)
+    process_rate = None if rate is None else rate * 1e6 / processes
+
+    result_queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_send_packets,
+            args=(
+                fname,
+                address,
+                block,
+                words_per_packet,
+                repeats,
+                process_rate,
+                max(1, burst),
+                loss,
+                skip_header,
+                seed,
+                result_queue,
+            ),
+        )
+        for seed, block in enumerate(blocks)
+    ]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    results = [result_queue.get() for _ in workers]
+    elapsed = time.perf_counter() - start
+    for w in workers:
+        w.join()
+
+    sent_packets = sum(r[0] for r in results)
+    sent_bytes = sum(r[1] for r in results)
+    return {
+        "packets": sent_packets,
+        "bytes": sent_bytes,
+        "dropped": sum(r[2] for r in results),
+        "time": elapsed,
+        "MByte/s": sent_bytes * 1e-6 / elapsed,
+        "Mwords/s": sent_bytes / 8 * 1e-6 / elapsed,
+        "datagrams/s": sent_packets / elapsed,
+    }
+
 
 def main():
 
@@ -61,39 +209,72 @@ def main():
         default=1,
         help="number of cycles to send the data",
     )
-    
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--words",
+        dest="words",
+        type=int,
+        default=SPIDR_WORDS_PER_PACKET,
+        help="number of 64 bit words per datagram",
+    )
 
+    parser.add_argument(
+        "--rate",
+        dest="rate",
+        type=float,
+        default=None,
+        help="target rate in MByte/s (default: as fast as possible)",
+    )
+
+    parser.add_argument(
+        "--burst",
+        dest="burst",
+        type=int,
+        default=1,
+        help="number of datagrams sent back to back between pacing",
+    )
 
-    HOST, PORT = args.ip, args.port
-    # data = " ".join(sys.argv[1:])
+    parser.add_argument(
+        "--loss",
+        dest="loss",
+        type=float,
+        default=0.0,
+        help="fraction of datagrams to drop",
+    )
 
-    # SOCK_DGRAM is the socket type to use for UDP sockets
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    parser.add_argument(
+        "--processes",
+        dest="processes",
+        type=int,
+        default=1,
+        help="number of sending processes",
+    )
+
+    parser.add_argument(
+        "--skip-header",
+        dest="skip_header",
+        action="store_true",
+        help="do not send the start time stored in the first word of the file",
+    )
+
+    args = parser.parse_args()
+
+    stats = replay(
+        args.filename,
+        (args.ip, args.port),
+        repeats=args.repeats,
+        words_per_packet=args.words,
+        rate=args.rate,
+        burst=args.burst,
+        loss=args.loss,
+        processes=args.processes,
+        skip_header=args.skip_header,
+    )
 
-    fName = args.filename
-
-    repeats = args.repeats
-
-    data = np.fromfile(fName, dtype=np.uint64)
-
-    total = len(data)*repeats
-    last_progress = 0
-    startTime = time.time()
-    for rep in range(repeats):
-        for i, packet in enumerate(data[:]):
-            sock.sendto(struct.pack("Q", packet), (HOST, PORT))
-            progress = int((i+rep*len(data)) / total * 100)
-            if progress != 0 and progress % 5 == 0 and progress != last_progress:
-                print(f"Progress {progress :.1f}%")
-                last_progress = progress
-            # received = str(sock.recv(1024), "utf-8")
-    stopTime = time.time()
-    timeDiff = stopTime - startTime
-    num_packets = rep * len(data)
     print(
-        f"sent {num_packets} packets; {64*i*1e-6:.2f}MBits {(64*num_packets*1e-6)/timeDiff:.2f}MBits/sec; {(64*num_packets*1e-6/8)/timeDiff:.2f}MByte/sec"
+        f"sent {stats['packets']} datagrams ({stats['dropped']} dropped) in {stats['time']:.2f}s; "
+        f"{stats['MByte/s']:.2f}MByte/sec; {stats['MByte/s'] * 8:.2f}MBits/sec; "
+        f"{stats['Mwords/s']:.2f}Mpackets/sec"
     )
 
 if __name__ == "__main__":
@@ -19,9 +19,63 @@
 # see <https://www.gnu.org/licenses/>.
 
 """Useful functions to store data"""
+import hashlib
+import os
+
 import numpy as np
 
 
+def cache_file(prefix, key, ext="npz"):
+    """Returns the path of a cache file for the given key
+
+    The cache directory is taken from the ``cache_dir`` entry of the loaded config
+    and defaults to ``~/.cache/pymepix``. It is created if it does not exist yet.
+
+    Parameters
+    ----------
+    prefix : str
+        Name describing the type of cached data, used as start of the file name
+    key : str
+        Anything identifying the cached content, e.g. path and modification time of the source file
+    ext : str, optional
+        File extension of the cache file (Default: npz)
+
+    Returns
+    --------
+    str
+        Path to the cache file, the file itself might not exist
+    """
+    import pymepix.config.load_config as cfg
+
+    cache_dir = cfg.default_cfg.get(
+        "cache_dir", os.path.join(os.path.expanduser("~"), ".cache", "pymepix")
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    return os.path.join(cache_dir, f"{prefix}-{digest}.{ext}")
+
+
+def remove_stale_cache(prefix, keep):
+    """Removes the cache files with the given prefix except keep
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix the files were created with by :func:`cache_file`
+    keep : str
+        Path of the current cache file
+    """
+    cache_dir = os.path.dirname(keep)
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(f"{prefix}-") and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
 def open_output_file(filename, ext, index=0):
     import logging
     import os
@@ -18,121 +18,189 @@
 # You should have received a copy of the GNU General Public License along with this program. If not,
 # see <https://www.gnu.org/licenses/>.
 
+"""Calibration of the timewalk correction
+
+The time of arrival of small signals is late compared to large ones (timewalk). The delay is
+measured as a function of ToT from a peak in the time-of-flight spectrum which should be sharp:
+for every ToT value the hits are histogrammed relative to the peak centre and the mean of the
+distribution is the timewalk. The resulting lookup table is passed to the post-processing with
+``pymepix post-process -t LUT_FILE`` (or ``-c`` for centroids).
+
+All ToT bins are evaluated at once from a single 2-D histogram. Only bins whose distribution is
+not well described by its moments (asymmetric tails, background) are refined with a Gaussian fit.
+"""
+
 import numpy as np
 
+TOT_STEP = 25
+"""ToT of one clock cycle in ns, the resolution of the ToT measurement"""
+TOA_STEP = 1.5625
+"""Resolution of the time of arrival in ns"""
+LUT_SIZE = 0x3FF
+"""Number of entries of the lookup table, one per ToT code starting with code 1"""
+
 
-def compute_timewalk(tof, tot, region):
+def _gauss(x, a, mu, sigma):
+    return a * np.exp(-((x - mu) ** 2) / (2.0 * sigma**2))
+
+
+def _fit_bins(histogram, centres, peaks, means, widths, bins):
+    """Refines mean and width of the given ToT bins with a Gaussian fit, returns success per bin"""
     from scipy.optimize import curve_fit
 
-    # Filter for the calibration region we are looking at
+    # the full width at half maximum is not affected by tails
+    half_widths = (histogram[bins] >= histogram[bins].max(axis=1, keepdims=True) / 2).sum(axis=1)
+    sigma_guess = np.maximum(half_widths * TOA_STEP / 2.355, TOA_STEP)
+    fitted = np.zeros(len(bins), dtype=bool)
+    for i, b in enumerate(bins):
+        p0 = [histogram[b].max(), peaks[b], sigma_guess[i]]
+        try:
+            coeff, _ = curve_fit(_gauss, centres, histogram[b], p0=p0)
+        except (RuntimeError, ValueError):
+            continue
+        if np.all(np.isfinite(coeff)):
+            means[b], widths[b] = coeff[1], abs(coeff[2])
+            fitted[i] = True
+    return fitted
+
+
+def timewalk_profile(tof, tot, region, min_counts=20, fit=True):
+    """Timewalk of every ToT value
+
+    Parameters
+    ----------
+    tof : numpy.ndarray
+        Time of flight of the hits (s)
+    tot : numpy.ndarray
+        Time over threshold of the hits (ns)
+    region : tuple
+        Start and end of a sharp peak in the time-of-flight spectrum (s)
+    min_counts : int
+        ToT bins with fewer hits are skipped (Default: 20)
+    fit : bool
+        Refine asymmetric bins with a Gaussian fit, requires scipy (Default: True)
+
+    Returns
+    -------
+    tot_points : numpy.ndarray
+        ToT of the bins (ns)
+    means : numpy.ndarray
+        Timewalk of the bins (ns)
+    widths : numpy.ndarray
+        Standard deviation of the time of arrival within the bins (ns)
+    """
+    tof = np.asarray(tof)
+    tot = np.asarray(tot)
     region_filter = (tof >= region[0]) & (tof <= region[1])
     tof_region = tof[region_filter] * 1e9
     tot_region = tot[region_filter]
+    if tof_region.size < 100:
+        raise ValueError(f"Only {tof_region.size} hits in region {region}, too few for a calibration")
 
-    # Find maximum tot
-    percent_vals = len(tof_region) // 100
-    # Find maximum tot
-    # max_tot_index = np.argmax(tot_region)
-    center_tof = np.mean(tof_region[np.argsort(-tot_region)[0:percent_vals]])
-    print(center_tof)
-
-    # This is our 'correct' TOF
-    # center_tof = tof_region[max_tot_index]
-    # Compute the time difference
+    # the largest signals (top percent of ToT) define the 'correct' time of flight
+    top = tof_region.size // 100
+    center_tof = np.mean(tof_region[np.argpartition(-tot_region, top)[:top]])
     time_diff = tof_region - center_tof
 
-    time_walk_bin = int((np.max(tof_region) - np.min(tof_region)) / 1.562)
-    tot_bins = int(np.max(tot_region) - np.min(tot_region)) / 25
-    print(time_walk_bin, tot_bins)
-    # Sample on a 2d histogram
-    time_hist, tot_bins, time_bins = np.histogram2d(
-        tot_region, time_diff, bins=[tot_bins, time_walk_bin]
-    )
-    bin_edges = time_bins
-    bin_centres = (bin_edges[:-1] + bin_edges[1:]) / 2
-    tot_points = []
-    time_walk_points = []
-
-    total_bins = time_hist.shape[0]
-    print(total_bins)
-    # print(bin_centres)
-    # For each bin
-    for b in range(0, total_bins):
-        # print(b)
-        current_tot = time_hist[b]
-
-        #         plt.plot(bin_centres,current_tot)
-        #         plt.show()
-        #         center_guess = np.sum(current_tot*bin_centres)/np.sum(current_tot)
-        #         sigma_guess = np.sqrt(np.sum(current_tot*np.square(bin_centres - center_guess))/(np.sum(current_tot)-1))
-
-        #         print(center_guess,sigma_guess)
-        #         if b==4:
-        #             return
-        #         continue
-        # # Define model function to be used to fit to the data above:
-        def gauss(x, *p):
-            A, mu, sigma = p
-            return A * np.exp(-((x - mu) ** 2) / (2.0 * sigma ** 2))
-
-        # Fit sampled tot region with gaussian
-
-        center_guess = np.sum(current_tot * bin_centres) / np.sum(current_tot)
-        sigma_guess = np.sqrt(
-            np.sum(current_tot * np.square(bin_centres - center_guess))
-            / (np.sum(current_tot) - 1)
-        )
-        # print('CENTER ',center_guess)
-        # print('SIGMA ',sigma_guess)
-        # # p0 is the initial guess for the fitting coefficients (A, mu and sigma above)
-        p0 = [np.max(current_tot), center_guess, sigma_guess]
-        # print(p0)
-        try:
-
-            coeff, var_matrix = curve_fit(gauss, bin_centres, current_tot, p0=p0)
-        except Exception:
-            print(f"Counldn't do it {Exception}")
-            continue
-        print(tot_bins[b], coeff[1])
-        if np.isnan(coeff[2]):
-            continue
-        if coeff[1] < 1.525:
-            break
-        # print(coeff[1],coeff[2])
-        #         if(coeff[1]>last_mean):
-        #             continue
-        #         last_mean = coeff[1]
-        # # Get the fitted curve
-        # hist_fit = gauss(bin_centres, *coeff)
-
-        #         test = np.sum(current_tot)
-        #         if(test <=0):
-        #             continue
-        #         mean = np.sum(current_tot*bin_centres)/np.sum(current_tot)
-        #         if(mean < 0):
-        #             break
-
-        #         #Mean (coeff[1]) is the timewalk
-        #         time_walk_points.append(mean)
-        time_walk_points.append(coeff[1])
-        tot_points.append(tot_bins[b])
-        # print(tot_points)
-        # no point correcting further than this since its below 1.5625 ns
-
-    return np.array(tot_points), np.array(time_walk_points)
-
-
-def compute_timewalk_lookup(tof, tot, region):
-    from scipy import interpolate
-
-    tot_points, time_walk_points = compute_timewalk(tof, tot, region)
-    tot_lookup_table = np.zeros(0x3FF, dtype=np.float32)
-    tot_lookup_table[tot_points.astype(int) // 25] = time_walk_points[...]
-    f = interpolate.interp1d(np.array(tot_points), np.array(time_walk_points))
-    for x in range(0x3FF):
-        try:
-            val = f((x + 1) * 25)
-            tot_lookup_table[x] = val
-        except Exception:
-            pass
-    return tot_lookup_table * 1e-9
+    # 2-D histogram: one row per ToT code, columns in steps of the ToA resolution
+    tot_index = (tot_region // TOT_STEP).astype(np.int64)
+    time_start = time_diff.min()
+    time_index = ((time_diff - time_start) // TOA_STEP).astype(np.int64)
+    n_tot, n_time = tot_index.max() + 1, time_index.max() + 1
+    histogram = np.bincount(tot_index * n_time + time_index, minlength=n_tot * n_time)
+    histogram = histogram.reshape(n_tot, n_time).astype(np.float64)
+    centres = time_start + (np.arange(n_time) + 0.5) * TOA_STEP
+
+    counts = histogram.sum(axis=1)
+    used = counts >= max(min_counts, 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = histogram @ centres / counts
+        widths = np.sqrt((histogram @ centres**2 - counts * means**2) / (counts - 1))
+
+    if fit:
+        # a Gaussian has its maximum at the mean, otherwise the moments are pulled by tails
+        peaks = centres[np.argmax(histogram, axis=1)]
+        skewed = np.flatnonzero(used & (np.abs(peaks - means) > np.maximum(widths / 4, 2 * TOA_STEP)))
+        if skewed.size:
+            fitted = _fit_bins(histogram, centres, peaks, means, widths, skewed)
+            used[skewed[~fitted]] = False
+
+    used &= np.isfinite(means) & np.isfinite(widths)
+    tot_points = np.flatnonzero(used) * TOT_STEP
+    return tot_points, means[used], widths[used]
+
+
+def compute_timewalk(tof, tot, region, min_walk=1.525, **kwargs):
+    """Timewalk as a function of ToT
+
+    The curve ends at the first ToT whose timewalk is below the ToA resolution (min_walk), there is
+    no point in correcting further. Other parameters are passed to :func:`timewalk_profile`.
+
+    Returns
+    -------
+    tot_points : numpy.ndarray
+        ToT (ns)
+    time_walk_points : numpy.ndarray
+        Timewalk (ns)
+    """
+    tot_points, means, _ = timewalk_profile(tof, tot, region, **kwargs)
+    below = np.flatnonzero(means < min_walk)
+    if below.size:
+        tot_points, means = tot_points[: below[0]], means[: below[0]]
+    return tot_points, means
+
+
+def compute_timewalk_lookup(tof, tot, region, **kwargs):
+    """Lookup table for the timewalk correction of the packet processor and centroid calculator
+
+    Entry i holds the timewalk (s) of ToT code i + 1, interpolated between the measured points.
+    Outside of the measured range the correction is 0. Parameters are passed to
+    :func:`compute_timewalk`.
+    """
+    tot_points, time_walk_points = compute_timewalk(tof, tot, region, **kwargs)
+    if tot_points.size == 0:
+        return np.zeros(LUT_SIZE, dtype=np.float32)
+    codes = (np.arange(LUT_SIZE) + 1) * TOT_STEP
+    lut = np.interp(codes, tot_points, time_walk_points, left=0.0, right=0.0)
+    return (lut * 1e-9).astype(np.float32)
+
+
+def load_calibration_data(filename, centroided=False, **post_processing_args):
+    """Time of flight and ToT from a post-processed HDF5 file or a raw file
+
+    Raw files are post-processed without timewalk correction into a temporary HDF5 file first.
+
+    Parameters
+    ----------
+    filename : str
+        HDF5 file with "raw" (or "centroided") group, or raw acquisition file
+    centroided : bool
+        Use the centroids and their maximum ToT instead of the individual hits (Default: False)
+    post_processing_args
+        Passed to :func:`pymepix.post_processing.run_post_processing` for raw files
+
+    Returns
+    -------
+    tof : numpy.ndarray
+        Time of flight (s)
+    tot : numpy.ndarray
+        Time over threshold (ns)
+    """
+    import os
+    import tempfile
+
+    import h5py
+
+    group, tot_name = ("centroided", "tot max") if centroided else ("raw", "tot")
+    if h5py.is_hdf5(filename):
+        with h5py.File(filename, "r") as f:
+            return f[group]["tof"][:], f[group][tot_name][:]
+
+    from pymepix.post_processing import run_post_processing
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, "calibration.hdf5")
+        post_processing_args.setdefault("number_processes", os.cpu_count())
+        run_post_processing(filename, output_file, timewalk_file=None, cent_timewalk_file=None, **post_processing_args)
+        with h5py.File(output_file, "r") as f:
+            return f[group]["tof"][:], f[group][tot_name][:]
@@ -0,0 +1,192 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""Train IDs of the facility timing system (FLASH, European XFEL)
+
+:class:`pymepix.processing.usbtrainid.USBTrainID` receives the train IDs from the serial
+interface of the timing receiver and logs them with their time of arrival. This module holds
+the frame parser, the binary log format and the merge of the log into the post-processed data.
+
+The log starts with :data:`TRAINID_MAGIC` followed by fixed size records of
+:data:`TRAINID_DTYPE`, it can be read with ``np.fromfile(name, TRAINID_DTYPE, offset=8)``.
+"""
+
+import re
+
+import numpy as np
+
+TRAINID_MAGIC = b"PMXTID1\x00"
+"""First bytes of a train ID log"""
+
+TRAINID_DTYPE = np.dtype([("timestamp", "<u8"), ("train_id", "<u8"), ("beam_mode", "<u4")])
+"""One record of the log: time of arrival (ns since epoch), train ID and beam mode"""
+
+# STX, 16 hex digits train ID, 8 beam mode, 2 CRC, ETX
+_FRAME = re.compile(rb"\x02([0-9A-Fa-f]{16})([0-9A-Fa-f]{8})([0-9A-Fa-f]{2})\x03")
+FRAME_SIZE = 28
+
+
+def parse_frames(buffer):
+    """Extracts all complete frames from the bytes received so far
+
+    Parameters
+    ----------
+    buffer : bytes
+        Received bytes, may start or end within a frame
+
+    Returns
+    -------
+    records : list
+        (train_id, beam_mode) of every frame with correct checksum
+    remainder : bytes
+        Bytes after the last frame, which may be the start of the next one
+    errors : int
+        Number of frames with wrong checksum
+    """
+    records = []
+    errors = 0
+    end = 0
+    for match in _FRAME.finditer(buffer):
+        train_id, beam_mode, crc = match.groups()
+        # the checksum is the XOR of all payload bytes
+        payload = bytes.fromhex((train_id + beam_mode).decode())
+        checksum = 0
+        for byte in payload:
+            checksum ^= byte
+        if checksum == int(crc, 16):
+            records.append((int(train_id, 16), int(beam_mode, 16)))
+        else:
+            errors += 1
+        end = match.end()
+
+    remainder = buffer[end:]
+    # garbage without frame start can't become a frame anymore
+    start = remainder.rfind(b"\x02")
+    remainder = remainder[start:] if start >= 0 else b""
+    if len(remainder) >= FRAME_SIZE:
+        remainder = b""
+    return records, remainder, errors
+
+
+def encode_records(timestamp, records):
+    """Log records for frames received at the same time"""
+    array = np.empty(len(records), dtype=TRAINID_DTYPE)
+    array["timestamp"] = timestamp
+    if records:
+        array["train_id"], array["beam_mode"] = zip(*records)
+    return array.tobytes()
+
+
+def read_trainid_file(filename):
+    """Reads a train ID log
+
+    Logs written by older versions (pairs of ``np.save`` calls) are read as well, their beam mode is 0.
+
+    Returns
+    -------
+    numpy.ndarray
+        Records of :data:`TRAINID_DTYPE`
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(TRAINID_MAGIC)) == TRAINID_MAGIC:
+            return np.fromfile(f, dtype=TRAINID_DTYPE)
+
+        f.seek(0)
+        values = []
+        while True:
+            try:
+                values.append(int(np.load(f)))
+            except (EOFError, ValueError, OSError):
+                break
+    records = np.zeros(len(values) // 2, dtype=TRAINID_DTYPE)
+    records["timestamp"] = values[0 : 2 * len(records) : 2]
+    records["train_id"] = values[1 : 2 * len(records) : 2]
+    return records
+
+
+def match_train_ids(trigger_timestamps, records, offset=0):
+    """Train ID of every trigger
+
+    A trigger belongs to the last train received before it.
+
+    Parameters
+    ----------
+    trigger_timestamps : numpy.ndarray
+        Absolute time of the triggers (ns)
+    records : numpy.ndarray
+        Train ID log as returned by :func:`read_trainid_file`
+    offset : int
+        Delay of the train ID message relative to the trigger (ns), subtracted from the timestamps of
+        the log (Default: 0)
+
+    Returns
+    -------
+    numpy.ndarray
+        Train ID per trigger (int64), -1 for triggers before the first train
+    """
+    order = np.argsort(records["timestamp"], kind="stable")
+    train_times = records["timestamp"][order].astype(np.int64) - offset
+    index = np.searchsorted(train_times, np.asarray(trigger_timestamps, dtype=np.int64), side="right") - 1
+    train_ids = records["train_id"][order].astype(np.int64)
+    return np.where(index >= 0, train_ids[np.maximum(index, 0)], -1)
+
+
+def merge_train_ids(output_file, trainid_file, offset=0):
+    """Adds the train IDs to the ``timing`` group of a post-processed file
+
+    Writes the log to ``timing/trainid`` and the train ID of every trigger to
+    ``timing/timepix/train id``, next to the trigger numbers and timestamps.
+
+    Parameters
+    ----------
+    output_file : str
+        HDF5 file written by :class:`RawFileSampler`
+    trainid_file : str
+        Train ID log recorded during the acquisition
+    offset : int
+        See :func:`match_train_ids`
+
+    Returns
+    -------
+    int
+        Number of triggers with a train ID
+    """
+    import h5py
+
+    records = read_trainid_file(trainid_file)
+    with h5py.File(output_file, "a") as f:
+        timing = f.require_group("timing")
+        if "trainid" in timing:
+            del timing["trainid"]
+        grp = timing.create_group("trainid")
+        grp.attrs["description"] = "train IDs from the facility timing system"
+        grp.create_dataset("timestamp", data=records["timestamp"])
+        grp["timestamp"].attrs["unit"] = "ns"
+        grp.create_dataset("train id", data=records["train_id"])
+        grp.create_dataset("beam mode", data=records["beam_mode"])
+
+        if "timepix" not in timing:
+            return 0
+        train_ids = match_train_ids(timing["timepix/timestamp"][:], records, offset)
+        if "train id" in timing["timepix"]:
+            del timing["timepix/train id"]
+        timing["timepix"].create_dataset("train id", data=train_ids, maxshape=(None,))
+        timing["timepix/train id"].attrs["description"] = "train ID of the trigger, -1 if unknown"
+    return int(np.count_nonzero(train_ids >= 0))
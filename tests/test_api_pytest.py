@@ -0,0 +1,90 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the batched property endpoint of the API
+run: pytest test_api_pytest.py
+"""
+
+import json
+from urllib.parse import urlencode
+
+from tornado.testing import AsyncHTTPTestCase
+
+import pymepix.main as api
+
+
+class FakeDevice:
+    def __init__(self):
+        self.reads = 0
+        self._threshold = 100
+
+    @property
+    def Vthreshold_fine(self):
+        self.reads += 1
+        return self._threshold
+
+    @Vthreshold_fine.setter
+    def Vthreshold_fine(self, value):
+        self._threshold = value
+
+
+class FakeConnection:
+    def __init__(self):
+        self.devices = [FakeDevice()]
+        self.biasVoltage = 50
+        self.histograms = object()
+
+    def __getitem__(self, key):
+        return self.devices[key]
+
+
+class TestPropertiesHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        api.timepix_obj = FakeConnection()
+        api.property_cache.clear()
+        return api.make_app()
+
+    def read(self, *names, **kwargs):
+        query = urlencode([("param_name", name) for name in names] + list(kwargs.items()))
+        response = self.fetch("/tpxproperties?" + query)
+        assert response.code == 200
+        return json.loads(response.body)
+
+    def test_batch_read(self):
+        result = self.read("biasVoltage", "[0].Vthreshold_fine", "[0].missing", "histograms")
+        assert result["values"] == {"biasVoltage": 50, "[0].Vthreshold_fine": 100}
+        assert set(result["errors"]) == {"[0].missing", "histograms"}
+
+    def test_max_age(self):
+        device = api.timepix_obj[0]
+        self.read("[0].Vthreshold_fine", max_age=10)
+        self.read("[0].Vthreshold_fine", max_age=10)
+        assert device.reads == 1
+        # without max_age the hardware is always asked
+        self.read("[0].Vthreshold_fine")
+        assert device.reads == 2
+
+        body = json.dumps({"set": {"[0].Vthreshold_fine": 120}, "get": ["[0].Vthreshold_fine"], "max_age": 10})
+        result = json.loads(self.fetch("/tpxproperties", method="POST", body=body).body)
+        # setting clears the cache
+        assert result["values"] == {"[0].Vthreshold_fine": 120}
+        assert result["set_errors"] == {}
+        assert device.reads == 3
@@ -0,0 +1,82 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the receive buffers of the UdpSampler
+run: pytest test_bufferring_pytest.py
+"""
+
+import time
+
+import numpy as np
+import pytest
+import zmq
+
+from pymepix.processing.bufferring import BufferRing
+
+# larger than the copy threshold of pyzmq, smaller messages are copied anyway
+SIZE = 100_000
+
+
+@pytest.fixture
+def sockets():
+    # own context, the inproc address is free again once it is terminated
+    ctx = zmq.Context()
+    push = ctx.socket(zmq.PUSH)
+    push.bind("inproc://bufferring")
+    pull = ctx.socket(zmq.PULL)
+    pull.connect("inproc://bufferring")
+    yield push, pull
+    ctx.destroy(linger=0)
+
+
+def send_value(ring, sock, value):
+    ring.view[:SIZE] = np.full(SIZE, value, dtype=np.uint8).tobytes()
+    ring.send(sock, SIZE)
+    ring.advance()
+
+
+def test_reuses_released_buffers(sockets):
+    push, pull = sockets
+    ring = BufferRing(SIZE, num_buffers=2, max_buffers=4)
+    for value in range(10):
+        send_value(ring, push, value)
+        frame = pull.recv(copy=False)
+        assert bytes(frame.buffer[:1])[0] == value
+        del frame
+        # zmq releases the buffer in the background
+        time.sleep(0.01)
+    assert ring.stats == {"buffers": 2, "grown": 0, "stalls": 0, "overruns": 0}
+
+
+def test_grows_and_never_overwrites_held_data(sockets):
+    push, pull = sockets
+    ring = BufferRing(SIZE, num_buffers=2, max_buffers=4, stall_timeout=0.01)
+    held = []
+    for value in range(6):
+        send_value(ring, push, value)
+        held.append(pull.recv(copy=False))
+
+    stats = ring.stats
+    assert stats["buffers"] == 4 and stats["grown"] == 2
+    assert stats["stalls"] == 3 and stats["overruns"] == 3
+    # every message still holds the data it was sent with
+    for value, frame in enumerate(held):
+        assert np.all(np.frombuffer(frame.buffer, dtype=np.uint8) == value)
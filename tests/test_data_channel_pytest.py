@@ -0,0 +1,156 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the binary protocol of the data channel
+run: pytest test_data_channel_pytest.py
+"""
+
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from pymepix.channel.channel_types import ChannelDataType, Commands
+from pymepix.channel.client import Client
+from pymepix.channel.data_channel import Data_Channel
+from pymepix.channel.serialization import decode_message, encode_message
+from pymepix.channel.streams import Stream, parse_topic, stream_topic
+from pymepix.processing.datatypes import MessageType
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_encode_decode():
+    pixels = (
+        np.arange(10, dtype=np.uint64),
+        np.arange(10, dtype=np.uint64)[::-1],
+        np.linspace(0, 1, 10),
+        np.arange(20, dtype=np.int32).reshape(2, 10)[:, ::2],
+    )
+    frames = encode_message("pixel", pixels, 7)
+    assert frames[0] == b"pixel"
+    assert len(frames) == 6
+    data_type, data, seq = decode_message(frames)
+    assert (data_type, seq) == ("pixel", 7)
+    for original, decoded in zip(pixels, data):
+        assert decoded.dtype == original.dtype
+        assert np.array_equal(decoded, original)
+
+    # arrays are views into the received frames
+    assert np.shares_memory(decode_message(frames)[1][0], frames[2])
+
+    assert decode_message(encode_message("centroid", None, 1))[1] is None
+    assert decode_message(encode_message("comm", "start_record", 2))[1] == "start_record"
+    data = decode_message(encode_message("tof", (None, np.ones(3)), 3))[1]
+    assert data[0] is None and np.array_equal(data[1], np.ones(3))
+    assert np.array_equal(decode_message(encode_message("tof", np.ones(4), 4))[1], np.ones(4))
+
+
+def test_channel_client():
+    port = free_port()
+    channel = Data_Channel()
+    channel.start()
+    channel.register(f"tcp://127.0.0.1:{port}")
+    client = Client(("127.0.0.1", port), queue_maxsize=100)
+
+    pixels = (np.arange(5), np.arange(5), np.linspace(0, 1e-3, 5), np.full(5, 25.0))
+    # the subscription takes a moment to arrive at the channel
+    deadline = time.time() + 5
+    while client.get_queue().empty() and time.time() < deadline:
+        channel.send_data_by_message_type(MessageType.PixelData, pixels)
+        time.sleep(0.05)
+    channel.send(ChannelDataType.COMMAND, Commands.START_RECORD)
+
+    received = client.get_queue().get(timeout=1)
+    assert received["type"] == ChannelDataType.PIXEL.value
+    for original, decoded in zip(pixels, received["data"]):
+        assert np.array_equal(decoded, original)
+
+    while received["type"] != ChannelDataType.COMMAND.value:
+        received = client.get_queue().get(timeout=1)
+    assert received["data"] == Commands.START_RECORD.value
+    assert client.lost == 0
+
+    client.stop()
+    channel.stop()
+    channel.unregister()
+
+
+def test_stream_topics():
+    assert stream_topic(ChannelDataType.PIXEL) == "pixel"
+    assert stream_topic("tof", every=10, hz=0.5) == "tof/every=10,hz=0.5"
+    assert parse_topic("centroid/hist=64,hz=2") == ("centroid", {"hist": 64, "hz": 2.0})
+    for topic in ("comm/every=2", "pixel/fast=1", "pixel/every=0"):
+        with pytest.raises(ValueError):
+            parse_topic(topic)
+
+    every = Stream("pixel/every=3")
+    assert [every.process(i) for i in range(7)] == [None, None, 2, None, None, 5, None]
+
+    rate = Stream("pixel/hz=2")
+    sent = [rate.process(t, now=t) for t in np.arange(0, 2, 0.1)]
+    assert len([s for s in sent if s is not None]) == 4
+
+    # histograms accumulate the skipped batches
+    hist = Stream("tof/hist=4,every=2", detector_shape=(256, 256))
+    batch = (np.zeros(3), np.array([0, 100, 255]), np.array([0, 0, 255]), np.zeros(3), np.zeros(3))
+    assert hist.process(batch) is None
+    image = hist.process(batch)
+    assert image.shape == (4, 4) and image.sum() == 6
+    assert image[0, 0] == 2 and image[1, 0] == 2 and image[3, 3] == 2
+
+
+def test_subscriptions():
+    port = free_port()
+    channel = Data_Channel()
+    channel.start()
+    channel.register(f"tcp://127.0.0.1:{port}")
+    hist_topic = stream_topic(ChannelDataType.PIXEL, hist=8)
+    monitor = Client(("127.0.0.1", port), queue_maxsize=100, topics=[hist_topic])
+    centroids = Client(("127.0.0.1", port), queue_maxsize=100, topics=["centroid"])
+
+    pixels = (np.arange(5), np.arange(5), np.linspace(0, 1e-3, 5), np.full(5, 25.0))
+    deadline = time.time() + 5
+    while (monitor.get_queue().empty() or centroids.get_queue().empty()) and time.time() < deadline:
+        channel.send_data_by_message_type(MessageType.PixelData, pixels)
+        channel.send_data_by_message_type(MessageType.CentroidData, pixels)
+        time.sleep(0.05)
+
+    # nobody wants the raw pixels
+    assert "pixel" not in channel.seq
+    received = monitor.get_queue().get(timeout=1)
+    assert received["type"] == hist_topic
+    assert received["data"].shape == (8, 8)
+    while not monitor.get_queue().empty():
+        assert monitor.get_queue().get()["type"] == hist_topic
+    while not centroids.get_queue().empty():
+        assert centroids.get_queue().get()["type"] == ChannelDataType.CENTROID.value
+    assert monitor.lost == 0 and centroids.lost == 0
+
+    monitor.stop()
+    centroids.stop()
+    channel.stop()
+    channel.unregister()
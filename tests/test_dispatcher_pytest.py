@@ -0,0 +1,193 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the bounded, drop-aware fan-out of acquired data
+run: pytest test_dispatcher_pytest.py
+"""
+
+import asyncio
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from pymepix.core.dispatcher import BoundedQueue, CallbackWorker, DataStream, Dispatcher, DropPolicy
+
+
+def fill(bounded_queue, n):
+    for i in range(n):
+        bounded_queue.put(i)
+    return [bounded_queue.get_nowait() for _ in range(len(bounded_queue))]
+
+
+def test_drop_oldest():
+    bounded_queue = BoundedQueue(4, DropPolicy.DROP_OLDEST)
+    assert fill(bounded_queue, 10) == [6, 7, 8, 9]
+    assert bounded_queue.received == 10
+    assert bounded_queue.dropped == 6
+
+
+def test_drop_newest():
+    bounded_queue = BoundedQueue(4, DropPolicy.DROP_NEWEST)
+    assert fill(bounded_queue, 10) == [0, 1, 2, 3]
+    assert bounded_queue.dropped == 6
+
+
+def test_decimate():
+    bounded_queue = BoundedQueue(4, DropPolicy.DECIMATE)
+    items = fill(bounded_queue, 10)
+    # keeps data spread over the whole backlog, always including the latest item
+    assert items[0] == 0 and items[-1] == 9
+    assert len(items) <= 4
+    assert bounded_queue.dropped == 10 - len(items)
+
+
+def test_forced_put_and_empty():
+    bounded_queue = BoundedQueue(1, DropPolicy.DROP_NEWEST)
+    bounded_queue.put(1)
+    assert bounded_queue.put(None, force=True)
+    assert len(bounded_queue) == 2
+    bounded_queue.clear()
+    with pytest.raises(queue.Empty):
+        bounded_queue.get(timeout=0.01)
+
+
+def test_slow_consumer_does_not_block_dispatch():
+    received = []
+    release = threading.Event()
+
+    def slow_callback(data_type, data):
+        release.wait()
+        received.append(data)
+
+    fast = BoundedQueue(1000)
+    slow = BoundedQueue(5, DropPolicy.DROP_OLDEST)
+    worker = CallbackWorker("slow", slow_callback, slow)
+    worker.start()
+
+    dispatcher = Dispatcher()
+    dispatcher.addConsumer("fast", fast)
+    dispatcher.addConsumer("slow", slow)
+    dispatcher.addConsumer("odd", BoundedQueue(1000), lambda item: item if item[1] % 2 else None)
+
+    start = time.time()
+    for i in range(500):
+        dispatcher.dispatch(("type", i))
+    assert time.time() - start < 1.0
+
+    stats = dispatcher.stats()
+    assert stats["fast"]["queued"] == 500 and stats["fast"]["dropped"] == 0
+    assert stats["slow"]["dropped"] >= 494
+    assert stats["odd"]["received"] == 250
+
+    release.set()
+    worker.stop()
+    worker.join(2)
+    assert not worker.is_alive()
+    assert received[-1] == 499
+
+
+def pixels(start, n):
+    values = np.arange(start, start + n)
+    return ("pixel", (values, values, None))
+
+
+def test_stream_filters_and_coalesces():
+    stream = DataStream(types=["pixel"], max_batch=3)
+    dispatcher = Dispatcher()
+    dispatcher.addConsumer("stream", stream)
+    for i in range(4):
+        dispatcher.dispatch(pixels(10 * i, 10))
+    dispatcher.dispatch(("trigger", (np.arange(3),)))
+    dispatcher.dispatch(("other", "not joined"))
+    dispatcher.dispatch(pixels(40, 5))
+    dispatcher.dispatch(("other", "not joined"))
+    assert dispatcher.stats()["stream"]["received"] == 5
+    stream.close()
+
+    batches = list(stream)
+    assert [len(data[0]) for _, data in batches] == [30, 15]
+    np.testing.assert_array_equal(batches[0][1][0], np.arange(30))
+    assert batches[0][1][2] is None
+    # stays ended
+    assert list(stream) == []
+
+
+def test_stream_keeps_data_which_cant_be_joined():
+    stream = DataStream(max_batch=10)
+    stream.put(("text", "a"))
+    stream.put(("text", "b"))
+    stream.put(pixels(0, 2))
+    stream.close()
+    assert [item[0] for item in stream] == ["text", "text", "pixel"]
+
+
+def test_stream_reports_drops():
+    stream = DataStream(maxsize=5)
+    for i in range(20):
+        stream.put(pixels(i, 1))
+    assert stream.dropped == 15
+    stream.close()
+    assert [int(data[0][0]) for _, data in stream] == [15, 16, 17, 18, 19]
+
+
+def test_stream_wakes_up_iteration():
+    stream = DataStream()
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(stream))
+    thread.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    stream.put(pixels(0, 1))
+    while not received and time.perf_counter() - start < 1.0:
+        time.sleep(0.001)
+    assert time.perf_counter() - start < 0.1
+    stream.close()
+    thread.join(1.0)
+    assert not thread.is_alive()
+    assert len(received) == 1
+
+
+def test_stream_async():
+    stream = DataStream(types=["pixel"], max_batch=100)
+
+    def produce():
+        for i in range(50):
+            stream.put(pixels(i, 1))
+            time.sleep(0.001)
+        stream.close()
+
+    async def consume():
+        hits = []
+        async for _, data in stream:
+            hits.extend(data[0])
+        return hits
+
+    async def run():
+        thread = threading.Thread(target=produce)
+        thread.start()
+        hits = await asyncio.wait_for(consume(), 5.0)
+        thread.join()
+        return hits
+
+    assert asyncio.run(run()) == list(range(50))
@@ -0,0 +1,154 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the synthetic hit generator against the packet processors
+run: pytest test_hitgenerator_pytest.py
+"""
+
+import socket
+
+import h5py
+import numpy as np
+
+from pymepix.processing.logic.packet_processor import PacketProcessor
+from pymepix.processing.logic.packet_processor_tpx4 import PacketProcessor_tpx4
+from pymepix.processing.rawfilesampler import RawFileSampler
+from pymepix.util.hitgenerator import (
+    HitGenerator,
+    encode_tpx3_pixels,
+    encode_tpx3_triggers,
+    encode_tpx4_pixels,
+    match_centroids,
+)
+
+
+def test_tpx3_encoding():
+    rng = np.random.default_rng(0)
+    x, y = rng.integers(0, 256, (2, 1000))
+    toa = rng.uniform(107.0, 107.001, 1000)
+    tot = rng.integers(1, 1024, 1000) * 25.0
+    words, decoded = encode_tpx3_pixels(x, y, toa, tot)
+
+    processor = PacketProcessor(handle_events=False)
+    longtime = int(107.0005 / 25e-9)
+    px, py, ptoa, ptot = processor.process_pixels(words.astype(np.int64), longtime)
+    assert np.array_equal(px, x) and np.array_equal(py, y) and np.array_equal(ptot, tot)
+    assert np.allclose(ptoa, decoded, rtol=0, atol=1e-12)
+    assert np.abs(decoded - toa).max() <= 25e-9 / 32
+
+    words, decoded = encode_tpx3_triggers(toa, np.arange(1000))
+    _, trigger_time = processor.process_trigger1(words.astype(np.int64), longtime)
+    assert np.allclose(trigger_time, decoded, rtol=0, atol=1e-12)
+    assert np.abs(decoded - toa).max() < 3.125e-9 / 12
+
+
+def test_tpx3_stream():
+    generator = HitGenerator(seed=1, time_spread=0)
+    words, truth = generator.generate(200)
+
+    # longtime of the last heartbeat, as the TimepixDevice would report it
+    header = words >> np.uint64(56)
+    lsb = int(words[header == 0x44][-1]) >> 16 & 0xFFFFFFFF
+    msb = int(words[header == 0x45][-1]) >> 16 & 0xFFFF
+    processor = PacketProcessor()
+    processor.pre_process()
+    events, pixels, _, triggers = processor.process(np.append(words, np.uint64(msb << 32 | lsb)).tobytes())
+
+    assert pixels[0].size == truth["size"].sum()
+    assert triggers[0].size == 200
+    assert np.allclose(np.diff(triggers[0]), generator.period)
+
+    # hits of all but the last trigger, which needs the next trigger or post processing
+    complete = truth[truth["shot"] < 199]
+    assert events[0].size == complete["size"].sum()
+    for shot in (0, 50, 198):
+        tof = np.unique(np.round(events[3][events[0] == shot], 8))
+        assert np.allclose(tof, np.unique(np.round(complete["tof"][complete["shot"] == shot], 8)))
+
+
+def test_tpx3_centroids(tmp_path):
+    generator = HitGenerator(seed=2)
+    truth = generator.write_raw(tmp_path / "sim.raw", 500, start_time=1)
+
+    RawFileSampler(tmp_path / "sim.raw", tmp_path / "sim.hdf5", 1).run()
+    names = ["trigger nr", "x", "y", "tof", "tot avg", "tot max", "clustersize"]
+    with h5py.File(tmp_path / "sim.hdf5", "r") as f:
+        assert f["raw/x"].shape[0] == truth["size"].sum()
+        centroids = [f["centroided"][name][:] for name in names]
+
+    # DBSCAN needs at least min_samples pixels
+    result = match_centroids(truth[truth["size"] >= 3], centroids)
+    assert result["efficiency"] > 0.9
+    assert result["purity"] > 0.9
+    assert result["x rms"] < 0.5 and result["y rms"] < 0.5
+    assert result["tof rms"] < 2e-9
+
+
+def test_tpx4_stream():
+    rng = np.random.default_rng(0)
+    x = rng.integers(0, 448, 1000)
+    y = rng.integers(0, 512, 1000)
+    toa = rng.uniform(1e9, 1.01e9, 1000)
+    tot = rng.integers(1, 2048, 1000) * 25.0
+    words, decoded = encode_tpx4_pixels(x, y, toa, tot)
+    processor = PacketProcessor_tpx4(handle_events=False)
+    px, py, ptoa, ptot = processor.process_pixels(words.astype(np.int64))
+    assert np.array_equal(px, x) and np.array_equal(py, y) and np.array_equal(ptot, tot)
+    assert np.allclose(ptoa + np.floor(toa / 25 / 2 ** 16) * 25 * 2 ** 16, decoded)
+    assert np.abs(decoded - toa).max() < 1.0
+
+    generator = HitGenerator(camera_generation=4, seed=1, time_spread=0)
+    words, truth = generator.generate(300)
+    assert words.dtype == np.dtype(">u8")
+    _, (x, y, toa, _), _, _ = processor.process(words.tobytes() + np.uint64(0).tobytes())
+
+    trigger = (x == 0) & (y == 0)
+    assert trigger.sum() == 300
+    assert (~trigger).sum() == truth["size"].sum()
+    shot = np.searchsorted(toa[trigger], toa[~trigger], side="right") - 1
+    first_hit = np.full(300, np.inf)
+    np.minimum.at(first_hit, shot, toa[~trigger] - toa[trigger][shot])
+    true_first = np.full(300, np.inf)
+    np.minimum.at(true_first, truth["shot"], truth["tof"])
+    assert np.allclose(first_hit, true_first, rtol=0, atol=2.0)
+
+
+def test_udp_stream():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(0.5)
+
+    generator = HitGenerator(seed=3, clusters_per_trigger=2)
+    words, _ = generator.generate(50)
+    truth, stats = generator.stream(sock.getsockname(), 50)
+
+    received = []
+    while True:
+        try:
+            received.append(sock.recv(65536))
+        except socket.timeout:
+            break
+    sock.close()
+
+    assert stats["bytes"] == words.nbytes
+    assert stats["packets"] == -(-words.size // 139)
+    assert np.array_equal(np.frombuffer(b"".join(received), dtype=np.uint64), words)
+    assert truth["size"].sum() == np.count_nonzero(words >> np.uint64(60) == 0xB)
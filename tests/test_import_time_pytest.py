@@ -0,0 +1,106 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test that importing pymepix stays light, heavy dependencies are loaded when used
+run: pytest test_import_time_pytest.py
+"""
+
+import json
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+REPO_PATH = pathlib.Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["sklearn", "scipy", "joblib", "h5py", "serial", "tornado", "zmq", "tqdm"]
+
+# counts the shared memory objects created while importing, then reports the loaded modules
+SCRIPT = """
+import json, sys, time
+import multiprocessing
+
+created = []
+_value = multiprocessing.Value
+def Value(*args, **kwargs):
+    created.append(args[0])
+    return _value(*args, **kwargs)
+multiprocessing.Value = Value
+
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"modules": sorted(sys.modules), "values": created, "time": elapsed}}))
+"""
+
+
+def import_in_subprocess(module):
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module)],
+        cwd=REPO_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def loaded(modules, name):
+    return any(m == name or m.startswith(name + ".") for m in modules)
+
+
+@pytest.mark.parametrize("module", ["pymepix", "pymepix.processing"])
+def test_no_heavy_dependencies(module):
+    report = import_in_subprocess(module)
+    assert [m for m in HEAVY_MODULES if loaded(report["modules"], m)] == []
+
+
+def test_lazy_attributes():
+    import pymepix
+
+    assert "PymepixConnection" in dir(pymepix)
+    assert pymepix.PymepixConnection.__name__ == "PymepixConnection"
+    assert callable(pymepix.run_post_processing)
+    with pytest.raises(AttributeError):
+        pymepix.NoSuchThing
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "pymepix.processing.pipeline_packet_processor",
+        "pymepix.processing.pipeline_centroid_calculator",
+        "pymepix.processing.acquisition",
+    ],
+)
+def test_no_shared_values_at_import(module):
+    report = import_in_subprocess(module)
+    assert report["values"] == []
+    assert not loaded(report["modules"], "sklearn")
+    assert not loaded(report["modules"], "scipy")
+
+
+def test_cli_does_not_load_pipeline():
+    report = import_in_subprocess("pymepix.main")
+    assert not loaded(report["modules"], "pymepix.processing.acquisition")
+    assert not loaded(report["modules"], "pymepix.post_processing")
+    assert not loaded(report["modules"], "sklearn")
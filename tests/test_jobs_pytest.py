@@ -0,0 +1,113 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the job manager running post-processing in the background
+run: pytest test_jobs_pytest.py
+"""
+
+import multiprocessing.util
+import time
+
+import pytest
+
+from pymepix.core.jobs import JobManager
+
+
+def steps(n, delay=0.01, fail=False, progress_callback=None):
+    for i in range(n):
+        time.sleep(delay)
+        progress_callback((i + 1) / n)
+    if fail:
+        raise ValueError("broken file")
+
+
+def stubborn(duration, progress_callback=None):
+    time.sleep(duration)
+
+
+def slow_exit(duration, progress_callback=None):
+    # runs when the process exits, after the job reported its result
+    multiprocessing.util.Finalize(None, time.sleep, args=(duration,), exitpriority=10)
+
+
+def wait_for(manager, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while manager.status(job_id)["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+    return manager.status(job_id)
+
+
+def test_jobs_run_in_background():
+    manager = JobManager(steps, max_parallel=1)
+    start = time.time()
+    first = manager.submit(n=20, delay=0.05)
+    second = manager.submit(n=2, fail=True)
+    assert time.time() - start < 0.5
+
+    # only one job at a time
+    assert manager.status(second)["status"] == "queued"
+    time.sleep(0.5)
+    status = manager.status(first)
+    assert status["status"] == "running" and 0 < status["progress"] < 1
+
+    assert wait_for(manager, first)["status"] == "done"
+    assert manager.status(first)["progress"] == 1.0
+    status = wait_for(manager, second)
+    assert status["status"] == "failed" and "broken file" in status["error"]
+    assert len(manager.jobs()) == 2
+
+    with pytest.raises(TypeError):
+        manager.submit(unknown=1)
+    manager.shutdown()
+
+
+def test_cancel():
+    manager = JobManager(steps, max_parallel=1, grace_time=1.0)
+    running = manager.submit(n=1000, delay=0.01)
+    queued = manager.submit(n=1)
+    time.sleep(0.3)
+    assert manager.cancel(queued)
+    assert manager.status(queued)["status"] == "cancelled"
+    assert manager.cancel(running)
+    assert wait_for(manager, running)["status"] == "cancelled"
+    assert not manager.cancel(running)
+    manager.shutdown()
+
+    # jobs which never report progress are terminated after the grace time
+    manager = JobManager(stubborn, grace_time=0.5)
+    job_id = manager.submit(duration=60)
+    time.sleep(0.2)
+    manager.cancel(job_id)
+    assert wait_for(manager, job_id, timeout=5)["status"] == "cancelled"
+    manager.shutdown()
+
+
+def test_status_while_process_exits():
+    manager = JobManager(slow_exit)
+    job_id = manager.submit(duration=2.0)
+    time.sleep(0.5)
+    # the monitor waits for the process to end, status requests don't
+    start = time.monotonic()
+    assert manager.status(job_id)["status"] == "running"
+    manager.jobs()
+    assert time.monotonic() - start < 0.2
+    assert wait_for(manager, job_id)["status"] == "done"
+    manager.shutdown()
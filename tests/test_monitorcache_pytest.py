@@ -0,0 +1,164 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the cache of the SPIDR monitoring values
+run: pytest test_monitorcache_pytest.py
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from pymepix.core.log import Logger
+from pymepix.SPIDR.monitorcache import MonitorCache
+from pymepix.SPIDR.spidrcmds import SpidrCmds
+from pymepix.SPIDR.spidrcontroller import SPIDRController
+from pymepix.SPIDR.spidrdevice import SpidrDevice
+
+
+class StubController(SPIDRController):
+    """Answers requests from memory instead of a SPIDR board"""
+
+    def __init__(self):
+        Logger.__init__(self, "StubController")
+        self.requests = []
+        self._monitor_cache = MonitorCache()
+        self._monitor_cache.addSource(self)
+        device = SpidrDevice.__new__(SpidrDevice)
+        Logger.__init__(device, SpidrDevice.__name__)
+        device._ctrl = self
+        device._dev_num = 0
+        self._devices = [device]
+        self._monitor_cache.addSource(device, (0,))
+
+    def requestGetInt(self, cmd, dev_nr, arg=0):
+        self.requests.append(cmd)
+        return 40_000
+
+    def requestSetInt(self, cmd, dev_nr, value):
+        self.requests.append(cmd)
+
+    def getSpidrReg(self, addr):
+        self.requests.append("reg")
+        return 0x00FF00FE
+
+
+class EchoSocket:
+    """Answers every request with its own arguments, like a SPIDR returning what was set"""
+
+    def __init__(self):
+        self.sent = []
+        self._reply = b""
+
+    def send(self, data):
+        words = np.frombuffer(data, dtype=">u4").copy()
+        self.sent.append((int(words[0]), int(words[4])))
+        words[0] |= SpidrCmds.CMD_REPLY
+        self._reply = words.tobytes()
+        return len(data)
+
+    def recv_into(self, buffer, nbytes):
+        buffer[: len(self._reply)] = self._reply
+        return len(self._reply)
+
+
+def echo_controller():
+    spidr = SPIDRController.__new__(SPIDRController)
+    Logger.__init__(spidr, "EchoController")
+    spidr._sock = EchoSocket()
+    spidr._request_lock = threading.Lock()
+    spidr._req_buffer = np.ndarray(shape=(512,), dtype=np.uint32)
+    spidr._reply_buffer = bytearray(4096)
+    spidr._reply_view = memoryview(spidr._reply_buffer)
+    spidr._vec_htonl = np.vectorize(spidr.convertHtonl)
+    spidr._vec_ntohl = np.vectorize(spidr.convertNtohl)
+    return spidr
+
+
+def test_concurrent_requests():
+    spidr = echo_controller()
+    n = 2000
+    wrong_replies = []
+
+    def poll():
+        # like the monitoring refresher
+        for value in range(n):
+            reply = spidr.requestGetInt(SpidrCmds.CMD_GET_DAC, 0, value)
+            if reply != value:
+                wrong_replies.append((value, reply))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        poller = threading.Thread(target=poll)
+        poller.start()
+        for value in range(n):
+            spidr.requestSetInt(SpidrCmds.CMD_SET_DAC, 0, 10_000 + value)
+        poller.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert wrong_replies == []
+    sent = [arg for cmd, arg in spidr._sock.sent if cmd == SpidrCmds.CMD_SET_DAC]
+    assert sent == [10_000 + value for value in range(n)]
+
+
+def test_reads_are_cached():
+    spidr = StubController()
+    assert spidr.fpgaTemperature == 40.0
+    assert spidr.fpgaTemperature == 40.0
+    assert spidr.requests.count(SpidrCmds.CMD_GET_FPGATEMP) == 1
+    assert spidr[0].linkStatus == spidr[0].linkStatus
+    assert spidr.requests.count("reg") == 1
+
+    # writes invalidate the values they change
+    spidr.biasVoltage
+    spidr.biasVoltage = 50
+    spidr.biasVoltage
+    assert spidr.requests.count(SpidrCmds.CMD_GET_SPIDR_ADC) == 2
+
+    spidr.invalidateMonitoring()
+    spidr.fpgaTemperature
+    assert spidr.requests.count(SpidrCmds.CMD_GET_FPGATEMP) == 2
+
+    # a device reset only forgets its link status
+    spidr[0].reset()
+    spidr[0].linkStatus
+    spidr.fpgaTemperature
+    assert spidr.requests.count("reg") == 2
+    assert spidr.requests.count(SpidrCmds.CMD_GET_FPGATEMP) == 2
+
+
+def test_refresher():
+    spidr = StubController()
+    spidr.startMonitoring(0.05)
+    time.sleep(0.3)
+    spidr.stopMonitoring()
+    sweeps = spidr.requests.count(SpidrCmds.CMD_GET_HUMIDITY)
+    assert sweeps >= 2
+    assert spidr.requests.count("reg") == sweeps
+
+    # reads only look up the refreshed values
+    before = len(spidr.requests)
+    spidr.humidity, spidr.localTemperature, spidr[0].linkStatus
+    assert len(spidr.requests) == before
@@ -0,0 +1,75 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the independent pipelines of multi-chip detectors
+run: pytest test_multichip_pytest.py
+"""
+
+from multiprocessing import Queue
+from multiprocessing.sharedctypes import Value
+
+import numpy as np
+
+import pymepix.config.load_config as cfg
+from pymepix.processing.acquisition import CentroidPipeline, PixelPipeline
+from pymepix.pymepix_connection import PymepixConnection
+from pymepix.util.hitgenerator import encode_tpx3_pixels
+
+
+def test_pipelines_use_own_ports():
+    base = cfg.default_cfg["zmq_port"]
+    pipelines = [
+        PixelPipeline(Queue(), ("127.0.0.1", 50000), Value("L", 0)),
+        CentroidPipeline(Queue(), ("127.0.0.1", 50001), Value("L", 0), zmq_port=base + 1, position_offset=(256, 0),
+                         online_histograms=True),
+    ]
+    ports = []
+    for pipeline in pipelines:
+        sampler, processor = pipeline.getStage(0), pipeline.getStage(2)
+        sampler.build()
+        processor.build()
+        assert sampler.processes[0].zmq_port == processor.processes[0].zmq_port
+        ports.append(sampler.processes[0].zmq_port)
+    assert ports == [base, base + 1]
+    # only accumulated on request
+    assert pipelines[0].online_histograms is None
+    assert pipelines[1].online_histograms.shape == (256, 256)
+    assert pipelines[1].online_histograms.origin == (256, 0)
+
+
+def test_position_offset():
+    words, _ = encode_tpx3_pixels([0, 10, 255], [0, 20, 255], [1.0, 1.0, 1.0], [25, 50, 75])
+    longtime = int(1.0 / 25e-9)
+    results = []
+    for offset in ((0, 0), (256, 256)):
+        pipeline = PixelPipeline(Queue(), ("127.0.0.1", 50000), Value("L", 0), position_offset=offset,
+                                 online_histograms=False)
+        results.append(pipeline.packet_processor.process_pixels(np.int64(words), longtime))
+    np.testing.assert_array_equal(results[1][0], results[0][0] + 256)
+    np.testing.assert_array_equal(results[1][1], results[0][1] + 256)
+
+
+def test_chip_file_names():
+    connection = PymepixConnection.__new__(PymepixConnection)
+    connection._timepix_devices = [object()]
+    assert connection.chipFileName("/data/run_0001.raw", 0) == "/data/run_0001.raw"
+    connection._timepix_devices = [object()] * 4
+    assert connection.chipFileName("/data/run_0001.raw", 2) == "/data/run_0001_chip2.raw"
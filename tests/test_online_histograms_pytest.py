@@ -0,0 +1,121 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the online histograms accumulated in the pipeline
+run: pytest test_online_histograms_pytest.py
+"""
+
+from multiprocessing import Queue
+
+import numpy as np
+
+from pymepix.processing.datatypes import MessageType
+from pymepix.processing.logic.online_histograms import DetectorHistograms, HistogramMode, OnlineHistograms
+from pymepix.processing.pipeline_online_histograms import PipelineOnlineHistograms
+
+PIXELS = (np.array([0, 1, 1, 255]), np.array([0, 2, 2, 255]), np.zeros(4), np.array([25.0, 50.0, 75.0, 100.0]))
+EVENTS = (np.zeros(3), np.zeros(3), np.zeros(3), np.array([1e-6, 1e-6, 5e-4]), np.zeros(3))
+CENTROIDS = (np.zeros(2), np.array([10.4, 300.0]), np.array([20.6, 5.0]), np.zeros(2), np.zeros(2), np.zeros(2), np.ones(2))
+
+
+def test_accumulate():
+    histograms = OnlineHistograms(tof_bins=10, tof_range=(0, 1e-3))
+    histograms.process((MessageType.PixelData, PIXELS))
+    histograms.process((MessageType.PixelData, PIXELS))
+    histograms.process((MessageType.EventData, EVENTS))
+    histograms.process((MessageType.CentroidData, CENTROIDS))
+    histograms.process((MessageType.TriggerData, (np.zeros(1), np.zeros(1))))
+
+    snapshot = histograms.snapshot()
+    assert snapshot["version"] == 8
+    assert snapshot["hits"].sum() == 8 and snapshot["hits"][1, 2] == 4 and snapshot["hits"][255, 255] == 2
+    assert snapshot["tot"][1, 2] == 250.0
+    assert list(snapshot["tof"][[0, 5]]) == [2, 1]
+    assert len(snapshot["tof_edges"]) == 11
+    # centroids outside of the sensor are ignored
+    assert snapshot["centroids"].sum() == 1 and snapshot["centroids"][10, 20] == 1
+
+    histograms.reset()
+    assert histograms.snapshot()["hits"].sum() == 0
+
+
+def test_decay_and_window():
+    decay = OnlineHistograms(mode=HistogramMode.Decay, decay_time=1.0)
+    decay.process((MessageType.PixelData, PIXELS), now=0.0)
+    decay.process((MessageType.PixelData, PIXELS), now=1.0)
+    assert np.isclose(decay.snapshot()["hits"].sum(), 4 * np.exp(-1) + 4)
+
+    window = OnlineHistograms(mode=HistogramMode.Window, window_time=1.0, window_slices=4)
+    window.process((MessageType.PixelData, PIXELS), now=0.1)
+    window.process((MessageType.PixelData, PIXELS), now=0.6)
+    assert window.snapshot()["hits"].sum() == 8
+    window.process((MessageType.PixelData, PIXELS), now=1.1)
+    assert window.snapshot()["hits"].sum() == 8
+    window.process((MessageType.EventData, EVENTS), now=5.0)
+    assert window.snapshot()["hits"].sum() == 0
+    assert window.snapshot()["tof"].sum() == 3
+
+
+def test_pipeline_stage_shares_memory():
+    histograms = OnlineHistograms()
+    input_queue, output_queue = Queue(), Queue()
+    stage = PipelineOnlineHistograms(histograms, input_queue=input_queue, shared_output=output_queue)
+    stage.start()
+    for _ in range(5):
+        input_queue.put((MessageType.PixelData, PIXELS))
+
+    # data is passed on unchanged
+    for _ in range(5):
+        data_type, data = output_queue.get(timeout=5)
+        assert data_type == MessageType.PixelData
+        assert np.array_equal(data[0], PIXELS[0])
+
+    # the reset is done by the filling process while it runs
+    histograms.reset()
+    input_queue.put((MessageType.PixelData, PIXELS))
+    output_queue.get(timeout=5)
+    input_queue.put(None)
+    stage.join(5)
+
+    snapshot = histograms.snapshot()
+    assert snapshot["hits"].sum() == 4
+    assert snapshot["version"] % 2 == 0
+
+
+def test_detector_histograms():
+    # two chips side by side, their pixels arrive with the offset already added
+    chips = [OnlineHistograms(tof_bins=10, tof_range=(0, 1e-3), origin=(x, 0)) for x in (0, 256)]
+    chips[0].process((MessageType.PixelData, PIXELS))
+    shifted = (PIXELS[0] + 256,) + PIXELS[1:]
+    chips[1].process((MessageType.PixelData, shifted))
+    chips[1].process((MessageType.EventData, EVENTS))
+    assert chips[1].snapshot()["hits"][1, 2] == 2
+
+    detector = DetectorHistograms(chips, (512, 256))
+    snapshot = detector.snapshot()
+    assert snapshot["hits"].shape == (512, 256)
+    assert snapshot["hits"][1, 2] == 2 and snapshot["hits"][257, 2] == 2
+    assert snapshot["hits"][511, 255] == 1 and snapshot["hits"].sum() == 8
+    assert snapshot["tof"].sum() == 3
+    assert snapshot["version"] == detector.version == 6
+
+    detector.reset()
+    assert detector.snapshot()["hits"].sum() == 0
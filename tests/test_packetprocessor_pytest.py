@@ -150,3 +150,41 @@ def test_packets_trigger():
 
 if __name__ == "__main__":
     test_packets_trigger()
+
+
+def test_early_reject():
+    """early rejection of pixels outside the event window gives the same events"""
+    from pymepix.processing.logic.packet_processor import PacketProcessor
+    from pymepix.util.hitgenerator import HitGenerator
+
+    generator = HitGenerator(seed=3, trigger_frequency=20e3, tof_range=(1e-6, 40e-6), noise_rate=1e6)
+    words, _ = generator.generate(300)
+    header = words >> np.uint64(56)
+    lsb = int(words[header == 0x44][-1]) >> 16 & 0xFFFFFFFF
+    msb = int(words[header == 0x45][-1]) >> 16 & 0xFFFF
+    longtime = np.uint64(msb << 32 | lsb)
+
+    class CountingProcessor(PacketProcessor):
+        buffered = 0
+
+        def find_events_fast(self):
+            self.buffered += 0 if self._toa is None else self._toa.size
+            return super().find_events_fast()
+
+    results = {}
+    for early_reject in (False, True):
+        processor = CountingProcessor(event_window=(5e-6, 10e-6), early_reject=early_reject)
+        processor.pre_process()
+        events = []
+        for chunk in np.array_split(words, 50):
+            result = processor.process(np.append(chunk, longtime).tobytes())
+            if result[0] is not None:
+                events.append(result[0])
+        events = [np.concatenate(column) for column in zip(*events)]
+        results[early_reject] = events, processor.buffered
+
+    (events, buffered), (early_events, early_buffered) = results[False], results[True]
+    assert events[0].size > 0
+    for column, early_column in zip(events, early_events):
+        assert np.array_equal(column, early_column)
+    assert early_buffered < buffered / 2
@@ -0,0 +1,137 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test pipelines keeping their processes between acquisitions
+run: pytest test_persistent_pipeline_pytest.py
+"""
+
+import queue
+import socket
+import time
+from multiprocessing import Queue
+from multiprocessing.sharedctypes import Value
+
+import numpy as np
+
+from pymepix.processing.baseacquisition import AcquisitionPipeline
+from pymepix.processing.datatypes import MessageType
+from pymepix.processing.logic.packet_processor import PacketProcessor
+from pymepix.processing.pipeline_packet_processor import PipelinePacketProcessor
+from pymepix.processing.udpsampler import UdpSampler
+from pymepix.util.hitgenerator import encode_tpx3_pixels
+
+
+def free_udp_address():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    address = sock.getsockname()
+    sock.close()
+    return address
+
+
+def send_pixels(address, n):
+    packets, _ = encode_tpx3_pixels(np.arange(n) % 256, np.zeros(n), np.linspace(0, 1e-3, n), np.full(n, 100))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.sendto(np.asarray(packets, dtype=np.uint64).tobytes(), address)
+    sock.close()
+
+
+def count_pixels(data_queue, n, timeout=10.0):
+    count, deadline = 0, time.monotonic() + timeout
+    while count < n and time.monotonic() < deadline:
+        try:
+            data_type, data = data_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if data_type == MessageType.PixelData:
+            count += len(data[0])
+    return count
+
+
+def pixel_pipeline(data_queue, address, persistent):
+    pipeline = AcquisitionPipeline("Test", data_queue, persistent=persistent)
+    pipeline.addStage(0, UdpSampler, address, Value("L", 0))
+    pipeline.addStage(
+        2, PipelinePacketProcessor, packet_processor=PacketProcessor(handle_events=False), num_processes=2
+    )
+    return pipeline
+
+
+def pids(pipeline):
+    return [p.pid for s in pipeline.stages for p in s.processes]
+
+
+def test_processes_are_kept():
+    data_queue = Queue()
+    address = free_udp_address()
+    pipeline = pixel_pipeline(data_queue, address, persistent=True)
+    try:
+        pipeline.start()
+        started = pids(pipeline)
+        # start returns once the sampler has bound its socket
+        send_pixels(address, 100)
+        assert count_pixels(data_queue, 100) == 100
+
+        for _ in range(3):
+            pipeline.stop()
+            assert pipeline.isWarm
+            start = time.perf_counter()
+            pipeline.start()
+            assert time.perf_counter() - start < 0.05
+            send_pixels(address, 50)
+            assert count_pixels(data_queue, 50) == 50
+        assert pids(pipeline) == started
+
+        # more processes need a new build
+        pipeline.stop()
+        pipeline.getStage(2).numProcess = 3
+        assert not pipeline.isWarm
+        pipeline.start()
+        assert len(pids(pipeline)) == 4
+        assert started[0] not in pids(pipeline)
+    finally:
+        pipeline.shutdown()
+    assert not pipeline.isWarm
+
+
+def test_processes_end_without_persistence():
+    pipeline = pixel_pipeline(Queue(), free_udp_address(), persistent=False)
+    pipeline.start()
+    processes = [p for s in pipeline.stages for p in s.processes]
+    pipeline.stop()
+    assert not pipeline.isWarm
+    assert not any(p.is_alive() for p in processes)
+
+
+def test_ready_on_start_and_clean_stop():
+    data_queue = Queue()
+    address = free_udp_address()
+    pipeline = pixel_pipeline(data_queue, address, persistent=False)
+    pipeline.start()
+    processes = [p for s in pipeline.stages for p in s.processes]
+    try:
+        # packets sent right after start are not lost
+        send_pixels(address, 100)
+        assert count_pixels(data_queue, 100) == 100
+    finally:
+        pipeline.stop()
+    # all processes ended by themselves instead of being terminated
+    assert [p.exitcode for p in processes] == [0] * len(processes)
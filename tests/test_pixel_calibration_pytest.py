@@ -0,0 +1,198 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the per-pixel energy and timewalk calibration
+run: pytest test_pixel_calibration_pytest.py
+"""
+
+import os
+import pickle
+import queue
+import socket
+import time
+from multiprocessing import Queue, Value
+
+import h5py
+import numpy as np
+import pytest
+
+import pymepix.config.load_config as cfg
+from pymepix.processing.acquisition import PixelPipeline
+from pymepix.processing.datatypes import MessageType
+from pymepix.processing.logic.centroid_calculator import CentroidCalculator
+from pymepix.processing.logic.packet_processor import PacketProcessor
+from pymepix.processing.logic.pixel_calibration import PixelCalibration, surrogate_energy
+from pymepix.processing.rawfilesampler import RawFileSampler
+from pymepix.util.hitgenerator import HitGenerator, encode_tpx3_pixels
+
+
+@pytest.fixture
+def calibration_file(tmp_path, monkeypatch):
+    monkeypatch.setitem(cfg.default_cfg, "cache_dir", str(tmp_path / "cache"))
+    rng = np.random.default_rng(0)
+    params = {
+        "a": rng.uniform(1.5, 2.0, (256, 256)),
+        "b": rng.uniform(20, 40, (256, 256)),
+        "c": rng.uniform(100, 300, (256, 256)),
+        "t": rng.uniform(0, 2, (256, 256)),
+        "tw_c": rng.uniform(1000, 3000, (256, 256)),
+        "tw_t": np.full((256, 256), 10.0),
+        "tw_d": rng.uniform(-2, 2, (256, 256)),
+    }
+    filename = tmp_path / "calibration.npz"
+    np.savez(filename, **params)
+    return filename, params
+
+
+def test_surrogate_inverse():
+    energy = np.linspace(5, 100, 50)
+    a, b, c, t = 1.8, 30.0, 200.0, 1.0
+    tot = a * energy + b - c / (energy - t)
+    np.testing.assert_allclose(surrogate_energy(tot, a, b, c, t), energy)
+
+
+def test_tables_are_cached(calibration_file):
+    filename, _ = calibration_file
+    calibration = PixelCalibration(filename)
+    cached = PixelCalibration(filename)
+    assert isinstance(cached.energy_lut, np.memmap)
+    np.testing.assert_array_equal(calibration.energy_lut, cached.energy_lut)
+    np.testing.assert_array_equal(calibration.timewalk_lut, cached.timewalk_lut)
+
+
+def test_stale_tables_are_removed(calibration_file):
+    filename, params = calibration_file
+    PixelCalibration(filename)
+    np.savez(filename, **{**params, "a": params["a"] * 1.1})
+    PixelCalibration(filename)
+    tables = os.listdir(cfg.default_cfg["cache_dir"])
+    # one energy and one timewalk table of the current calibration
+    assert len(tables) == 2
+
+
+def test_decode_applies_calibration(calibration_file):
+    filename, params = calibration_file
+    rng = np.random.default_rng(1)
+    n = 10_000
+    x, y = rng.integers(0, 256, n), rng.integers(0, 256, n)
+    toa = 1.0 + np.sort(rng.uniform(0, 1e-3, n))
+    tot = rng.integers(2, 200, n) * 25
+    words, _ = encode_tpx3_pixels(x, y, toa, tot)
+    longtime = int(1.0 / 25e-9)
+
+    plain = PacketProcessor(handle_events=False)
+    calibrated = PacketProcessor(handle_events=False, pixel_calibration=filename)
+    px, py, ptoa, ptot = plain.process_pixels(np.int64(words), longtime)
+    cx, cy, ctoa, energy = calibrated.process_pixels(np.int64(words), longtime)
+
+    np.testing.assert_array_equal(px, cx)
+    a, b, c, t = (params[k][x, y] for k in ("a", "b", "c", "t"))
+    np.testing.assert_allclose(energy, surrogate_energy(ptot / 25, a, b, c, t), rtol=1e-5)
+    walk = params["tw_c"][x, y] / (ptot - 10.0) + params["tw_d"][x, y]
+    np.testing.assert_allclose(ptoa - ctoa, walk * 1e-9, rtol=1e-4, atol=1e-12)
+
+
+def random_hits(n, seed=1):
+    rng = np.random.default_rng(seed)
+    x, y = rng.integers(0, 256, n), rng.integers(0, 256, n)
+    toa = 1.0 + np.sort(rng.uniform(0, 1e-3, n))
+    tot = rng.integers(2, 200, n) * 25
+    words, _ = encode_tpx3_pixels(x, y, toa, tot)
+    return np.int64(words)
+
+
+def test_pickle_keeps_only_file_names(calibration_file):
+    filename, _ = calibration_file
+    calibration = PixelCalibration(filename)
+    pickled = pickle.dumps(calibration)
+    # the tables are 256 MB each
+    assert len(pickled) < 10_000
+
+    copy = pickle.loads(pickled)
+    assert isinstance(copy.energy_lut, np.memmap)
+    assert isinstance(copy.timewalk_lut, np.memmap)
+    processor = PacketProcessor(handle_events=False, pixel_calibration=calibration)
+    copied = PacketProcessor(handle_events=False, pixel_calibration=copy)
+    words, longtime = random_hits(1000), int(1.0 / 25e-9)
+    for expected, value in zip(processor.process_pixels(words, longtime), copied.process_pixels(words, longtime)):
+        np.testing.assert_array_equal(expected, value)
+
+
+def test_pipeline_applies_calibration(calibration_file):
+    filename, _ = calibration_file
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    address = sock.getsockname()
+    sock.close()
+
+    n, longtime = 1000, int(1.0 / 25e-9)
+    words = random_hits(n)
+    expected = PacketProcessor(handle_events=False, pixel_calibration=filename).process_pixels(words, longtime)
+
+    data_queue = Queue()
+    pipeline = PixelPipeline(data_queue, address, Value("L", longtime), pixel_calibration=filename)
+    try:
+        pipeline.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto(np.uint64(words).tobytes(), address)
+        sock.close()
+
+        energy, deadline = [], time.monotonic() + 10
+        while sum(map(len, energy)) < n and time.monotonic() < deadline:
+            try:
+                data_type, data = data_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if data_type == MessageType.PixelData:
+                energy.append(data[3])
+    finally:
+        pipeline.stop()
+    np.testing.assert_allclose(np.sort(np.concatenate(energy)), np.sort(expected[3]))
+
+
+def test_energy_replaces_tot_settings(calibration_file, caplog):
+    filename, _ = calibration_file
+    assert PacketProcessor().tot_unit == "ns"
+    assert PacketProcessor(pixel_calibration=filename).tot_unit == "keV"
+
+    calculator = CentroidCalculator(
+        cent_timewalk_lut=np.zeros(100), clustering_args={"tot_threshold": 100}, tot_unit="keV"
+    )
+    assert calculator.tot_threshold == 0
+    calculator.tot_threshold = 50
+    assert calculator.tot_threshold == 0
+    assert "timewalk table is ignored" in caplog.text
+
+
+def test_post_processing_units(calibration_file, tmp_path):
+    filename, _ = calibration_file
+    HitGenerator(seed=2).write_raw(tmp_path / "sim.raw", 50, start_time=1)
+    np.save(tmp_path / "cent_timewalk.npy", np.full(1000, 1.0))
+
+    RawFileSampler(
+        tmp_path / "sim.raw", tmp_path / "sim.hdf5", 1, cent_timewalk_file=tmp_path / "cent_timewalk.npy",
+        pixel_calibration_file=filename,
+    ).run()
+    with h5py.File(tmp_path / "sim.hdf5", "r") as f:
+        for name in ("raw/tot", "centroided/tot max", "centroided/tot avg"):
+            assert f[name].attrs["unit"] == "keV"
+        # the ToT based table would have moved the centroids to negative tof
+        assert f["centroided/tof"][:].min() > 0
@@ -0,0 +1,123 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test pinning pipeline processes to CPUs
+run: pytest test_placement_pytest.py
+"""
+
+import os
+import socket
+import time
+from multiprocessing import Value
+
+import pymepix.config.load_config as cfg
+from pymepix.core.log import Logger
+from pymepix.core.placement import apply_placement, parse_cpus, placement_for
+from pymepix.processing.baseacquisition import AcquisitionStage
+from pymepix.processing.basepipeline import BasePipelineObject
+from pymepix.processing.udpsampler import UdpSampler
+
+
+class Idle(BasePipelineObject):
+    def __init__(self, input_queue=None, shared_output=None):
+        super().__init__("Idle", input_queue=input_queue, shared_output=shared_output)
+
+    def process(self, data_type=None, data=None):
+        time.sleep(0.01)
+        return None, None
+
+
+class Recorder(Logger):
+    def __init__(self):
+        super().__init__("Recorder")
+        self.warnings = []
+
+    def warning(self, msg, *args, **kwargs):
+        self.warnings.append(msg)
+
+
+def test_parse_cpus():
+    assert parse_cpus("0-3,8, 10-11") == {0, 1, 2, 3, 8, 10, 11}
+    assert parse_cpus([1, "2"]) == {1, 2}
+    assert parse_cpus(5) == {5}
+
+
+def test_placement_from_config(monkeypatch):
+    monkeypatch.setitem(cfg.default_cfg, "placement", {"Idle": {"nice": 3}})
+    assert placement_for("Idle") == {"nice": 3}
+    assert placement_for("Idle", {"cpus": "0"}) == {"cpus": "0"}
+    assert placement_for("Other") is None
+
+    stage = AcquisitionStage(1)
+    stage.configureStage(Idle)
+    assert stage.placement == {"nice": 3}
+
+
+def test_stage_processes_are_placed():
+    cpu = min(os.sched_getaffinity(0))
+    stage = AcquisitionStage(1, num_processes=2, placement={"cpus": [cpu], "nice": 7})
+    stage.configureStage(Idle)
+    stage.build()
+    stage.start()
+    try:
+        deadline = time.monotonic() + 5
+        report = stage.placementReport()
+        while time.monotonic() < deadline and not all(p["nice"] == 7 for p in report):
+            time.sleep(0.05)
+            report = stage.placementReport()
+        assert len(report) == 2
+        for process in report:
+            assert process["cpus"] == [cpu]
+            assert process["nice"] == 7
+    finally:
+        stage.stop()
+
+
+def test_writer_keeps_own_placement(monkeypatch):
+    monkeypatch.setitem(cfg.default_cfg, "placement", {})
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    address = sock.getsockname()
+    sock.close()
+
+    nice = os.getpriority(os.PRIO_PROCESS, 0)
+    stage = AcquisitionStage(0, placement={"nice": nice + 7})
+    stage.configureStage(UdpSampler, address, Value("L", 0))
+    stage.build()
+    stage.start()
+    try:
+        pid = stage.processes[0].pid
+        threads = {int(tid): os.getpriority(os.PRIO_PROCESS, int(tid)) for tid in os.listdir(f"/proc/{pid}/task")}
+        assert threads.pop(pid) == nice + 7
+        # the raw file writer was started before the sampler was placed
+        assert nice in threads.values()
+    finally:
+        stage.stop()
+
+
+def test_unavailable_settings_are_skipped():
+    logger = Recorder()
+    before = os.sched_getaffinity(0)
+    # a NIC which doesn't exist and a NUMA node which doesn't exist
+    apply_placement({"numa": "nic"}, logger, nic_ip="203.0.113.1")
+    apply_placement({"numa": 4096}, logger)
+    assert len(logger.warnings) == 2
+    assert os.sched_getaffinity(0) == before
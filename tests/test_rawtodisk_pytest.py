@@ -0,0 +1,74 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the file writer thread
+run: pytest test_rawtodisk_pytest.py
+"""
+
+import socket
+import time
+
+import numpy as np
+import zmq
+
+from pymepix.processing.rawtodisk import Raw2Disk
+
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_shutdown_idle():
+    start = time.perf_counter()
+    writer = Raw2Disk(zmq_port=free_port())
+    assert writer.shutdown(timeout=2.0)
+    assert not writer.write_thr.is_alive()
+    # the writer no longer sleeps until its thread is up
+    assert time.perf_counter() - start < 0.9
+
+
+def test_shutdown_while_writing(tmp_path):
+    port = free_port()
+    ctx = zmq.Context.instance()
+    control = ctx.socket(zmq.PAIR)
+    control.bind(f"tcp://127.0.0.1:{port}")
+    writer = Raw2Disk(zmq_port=port)
+    try:
+        fname = str(tmp_path / "shutdown.raw")
+        control.send_string(fname)
+        assert control.recv_string() == "OPENED"
+        assert control.recv_string() == fname
+
+        data = np.arange(1000, dtype=np.uint64)
+        writer.my_sock.send(data, copy=False)
+
+        start = time.perf_counter()
+        assert writer.shutdown(timeout=2.0)
+        assert time.perf_counter() - start < 0.5
+        assert control.recv_string() == "CLOSED"
+        # start time, then all data sent before the shutdown
+        np.testing.assert_array_equal(np.fromfile(fname, dtype=np.uint64)[1:], data)
+    finally:
+        control.close()
@@ -0,0 +1,120 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the shared parameter block of the processing steps
+run: pytest test_shared_parameters_pytest.py
+"""
+
+import multiprocessing
+import os
+
+import pytest
+
+from pymepix.processing.logic.centroid_calculator import CentroidCalculator
+from pymepix.processing.logic.packet_processor import PacketProcessor
+from pymepix.processing.logic.shared_processing_parameter import (
+    ParameterUpdateTimeout,
+    SharedParameterBlock,
+    UnknownParameterTypeException,
+)
+
+
+def test_block_types_and_version():
+    block = SharedParameterBlock(flag=True, count=3, width=1.5)
+    snapshot = block.snapshot()
+    assert (snapshot.flag, snapshot.count, snapshot.width, snapshot.version) == (True, 3, 1.5, 0)
+    assert isinstance(snapshot.count, int)
+
+    block.update(count=5, width=2.5)
+    assert block.version == 2
+    assert (block.get("count"), block.get("width")) == (5, 2.5)
+
+    with pytest.raises(KeyError):
+        block.update(unknown=1)
+    with pytest.raises(UnknownParameterTypeException):
+        SharedParameterBlock(name="text")
+
+
+def _read_windows(processor, n, result):
+    torn = 0
+    for _ in range(n):
+        processor.refresh_parameters()
+        low, high = processor._params.event_window_min, processor._params.event_window_max
+        # every window written below has width 1
+        torn += high - low != 1.0
+    result.value = torn
+
+
+def test_event_window_updates_are_atomic():
+    processor = PacketProcessor(event_window=(0, 1))
+    torn = multiprocessing.Value("i", -1)
+    reader = multiprocessing.get_context("fork").Process(target=_read_windows, args=(processor, 20000, torn))
+    reader.start()
+    for i in range(20000):
+        processor.event_window = (float(i), i + 1.0)
+    reader.join(30)
+    assert torn.value == 0
+
+
+def test_processing_steps_use_the_block():
+    processor = PacketProcessor(event_window=(0, 1e-3))
+    processor.event_window = (1e-6, 2e-6)
+    processor.early_reject = True
+    assert processor.event_window == (1e-6, 2e-6)
+    assert processor.early_reject is True
+
+    calculator = CentroidCalculator()
+    calculator.epsilon = 3
+    calculator.triggers_processed = 2
+    calculator.dbscan_clustering = False
+    assert calculator.epsilon == 3.0 and isinstance(calculator.epsilon, float)
+    assert calculator.triggers_processed == 2
+    assert calculator.dbscan_clustering is False
+
+
+class _Dies:
+    def __float__(self):
+        # the writer process is killed in the middle of the update
+        os._exit(1)
+
+
+def _kill_writer(update, **values):
+    writer = multiprocessing.get_context("fork").Process(target=update, kwargs=values)
+    writer.start()
+    writer.join(10)
+    assert writer.exitcode == 1
+
+
+def test_dead_writer_times_out():
+    block = SharedParameterBlock(width=1.0)
+    _kill_writer(block.update, width=_Dies())
+    with pytest.raises(ParameterUpdateTimeout):
+        block.snapshot(timeout=0.05)
+    with pytest.raises(ParameterUpdateTimeout):
+        block.update(width=2.0, timeout=0.05)
+
+
+def test_processing_step_survives_dead_writer():
+    processor = PacketProcessor(event_window=(0, 1))
+    _kill_writer(processor.set_parameters, event_window_max=_Dies())
+    # the first refresh waits for the timeout, later ones don't retry the same update
+    assert processor.event_window == (0.0, 1.0)
+    assert processor.event_window == (0.0, 1.0)
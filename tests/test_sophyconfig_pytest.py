@@ -3,9 +3,12 @@ import pathlib
 import shutil
 import socketserver
 import threading
+import zipfile
 
 import numpy as np
+import pytest
 
+import pymepix.config.load_config as cfg
 from pymepix.config.sophyconfig import SophyConfig
 from pymepix.pymepix_connection import PymepixConnection
 from pymepix.SPIDR.spidrcmds import SpidrCmds
@@ -108,6 +111,88 @@ def test_save_pixelmask():
 
     assert np.array_equal(mask, new_mask)
 
+def create_spx(filename, mask, test, thresh):
+    """Writes a minimal .spx archive with the layout SophyConfig expects"""
+    xml = (
+        "<root><entry class='sophy.medipix.SPMPXDACCollection'><map>"
+        "<element class='java.util.Map.Entry'><key value='Ibias_Ikrum'/>"
+        "<entry><data value='20'/></entry></element>"
+        "</map></entry></root>"
+    )
+    header = bytes(27)
+    with zipfile.ZipFile(filename, mode="w", compression=zipfile.ZIP_DEFLATED) as spx:
+        spx.writestr("config.xml", xml)
+        spx.writestr("info.txt", "synthetic config")
+        spx.writestr("mask.bpc", header + mask.astype(np.int16).transpose().tobytes())
+        spx.writestr("test.bpc", header + test.astype(np.int16).tobytes())
+        spx.writestr("thresh.bpc", header + (thresh.astype(np.int16) << 8).tobytes())
+
+
+def test_synthetic_config(tmp_path, monkeypatch):
+    """Check threshold bit reversal, caching and mask writing on a generated file"""
+    monkeypatch.setitem(cfg.default_cfg, "cache_dir", str(tmp_path / "cache"))
+    rng = np.random.default_rng(0)
+    mask = rng.integers(0, 2, size=(256, 256)) * 256
+    thresh = rng.integers(0, 16, size=65536)
+    filename = tmp_path / "synthetic.spx"
+    create_spx(filename, mask, np.zeros((256, 256)), thresh)
+
+    spx = SophyConfig(filename)
+    expected_thresh = np.fliplr(
+        np.array([spx._reverseBits(int(x)) for x in thresh]).reshape(256, 256).transpose()
+    )
+    assert np.array_equal(spx.thresholdPixels, expected_thresh)
+    assert np.array_equal(spx.maskPixels, 1 - mask // 256)
+    assert dict(spx.dacCodes())[4] == 20
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    # second load is served from the cache
+    cached = SophyConfig(filename)
+    assert np.array_equal(cached.thresholdPixels, spx.thresholdPixels)
+    assert np.array_equal(cached.maskPixels, spx.maskPixels)
+    assert dict(cached.dacCodes())[4] == 20
+
+    with zipfile.ZipFile(filename) as zf:
+        untouched = {name: zf.read(name) for name in zf.namelist() if name != "mask.bpc"}
+
+    new_mask = spx.maskPixels
+    new_mask[10, 20] = 1 - new_mask[10, 20]
+    spx.maskPixels = new_mask
+    spx.saveMask()
+
+    with zipfile.ZipFile(filename) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["config.xml", "info.txt", "mask.bpc", "test.bpc", "thresh.bpc"]
+        for name, content in untouched.items():
+            assert zf.read(name) == content
+    # the entry of the old version was replaced
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    # parse the rewritten archive without the cache
+    shutil.rmtree(tmp_path / "cache")
+    reloaded = SophyConfig(filename)
+    assert np.array_equal(reloaded.maskPixels, new_mask)
+    assert np.array_equal(reloaded.thresholdPixels, spx.thresholdPixels)
+
+
+def test_failed_mask_write_keeps_config(tmp_path, monkeypatch):
+    monkeypatch.setitem(cfg.default_cfg, "cache_dir", str(tmp_path / "cache"))
+    filename = tmp_path / "synthetic.spx"
+    create_spx(filename, np.zeros((256, 256)), np.zeros((256, 256)), np.zeros(65536))
+    original = filename.read_bytes()
+    spx = SophyConfig(filename)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(zipfile.ZipFile, "writestr", fail)
+    with pytest.raises(OSError):
+        spx.saveMask()
+    assert filename.read_bytes() == original
+    # no temporary file is left behind
+    assert sorted(os.listdir(tmp_path)) == ["cache", "synthetic.spx"]
+
+
 class TPX3Handler_Test(TPX3Handler):
     """The handler class for a socketserver to capture and evaluate the config packets from pymepix
 
@@ -0,0 +1,158 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the pixel configuration handling of SpidrDevice
+run: pytest test_spidrdevice_pytest.py
+"""
+
+import numpy as np
+
+from pymepix.core.log import Logger
+from pymepix.SPIDR.monitorcache import MonitorCache
+from pymepix.SPIDR.spidrcmds import SpidrCmds
+from pymepix.SPIDR.spidrcontroller import SPIDRController
+from pymepix.SPIDR.spidrdefs import SpidrReadoutSpeed
+from pymepix.SPIDR.spidrdevice import SpidrDevice
+
+
+class ControllerStub:
+    """Records the pixel configuration packets instead of sending them to SPIDR"""
+
+    def __init__(self):
+        self.packets = []
+        self.pixel_resets = 0
+
+    def requestSetInt(self, cmd, dev_nr, value):
+        if cmd == SpidrCmds.CMD_RESET_PIXELS:
+            self.pixel_resets += 1
+
+    def requestSetIntBytes(self, cmd, dev_nr, value_int, value_bytes):
+        if cmd == SpidrCmds.CMD_SET_PIXCONF:
+            self.packets.append((value_int, np.copy(value_bytes)))
+
+
+def create_device():
+    device = SpidrDevice.__new__(SpidrDevice)
+    Logger.__init__(device, SpidrDevice.__name__)
+    device._ctrl = ControllerStub()
+    device._dev_num = 0
+    device.clearPixelConfig()
+    device.invalidatePixelConfig()
+    return device
+
+
+def format_pixel_bits_loop(matrix_packet):
+    """Reference implementation packing 4 pixels into 3 bytes one at a time"""
+    formatted = np.zeros((matrix_packet.size * 3 // 4,), dtype=np.uint8)
+    for x in range(0, matrix_packet.size, 4):
+        pixel1, pixel2, pixel3, pixel4 = matrix_packet[x : x + 4]
+
+        byte1 = (pixel1 << 2) | (pixel2 >> 4)
+        byte2 = ((pixel2 << 4) & 0xF0) | (pixel3 >> 2)
+        byte3 = ((pixel3 << 6) & 0xC0) | pixel4
+
+        position = x * 3 // 4
+        formatted[position : (position + 3)] = [byte1, byte2, byte3]
+    return formatted
+
+
+def test_format_pixel_bits():
+    rng = np.random.default_rng(0)
+    matrix_packet = rng.integers(0, 64, size=768, dtype=np.uint8)
+
+    device = create_device()
+    formatted = device._formatPixelBits(matrix_packet)
+
+    assert formatted.dtype == np.uint8
+    assert np.array_equal(formatted, format_pixel_bits_loop(matrix_packet))
+
+
+def test_upload_columns_per_packet():
+    rng = np.random.default_rng(1)
+    device = create_device()
+    device.setPixelMask(rng.integers(0, 2, size=(256, 256), dtype=np.uint8))
+    device.setPixelThreshold(rng.integers(0, 16, size=(256, 256), dtype=np.uint8))
+
+    uploads = {}
+    for columns_per_packet in (1, 3, 4):
+        device._ctrl.packets = []
+        device.uploadPixelConfig(columns_per_packet=columns_per_packet, force=True)
+        packets = device._ctrl.packets
+
+        assert len(packets) == -(-256 // columns_per_packet)
+        assert [col for col, _ in packets] == list(range(0, 256, columns_per_packet))
+        uploads[columns_per_packet] = np.concatenate([data for _, data in packets])
+
+    # all packet sizes upload the same 6 bit per pixel stream
+    assert uploads[1].size == 256 * 256 * 3 // 4
+    assert np.array_equal(uploads[1], uploads[3])
+    assert np.array_equal(uploads[1], uploads[4])
+
+
+def test_upload_changed_columns():
+    device = create_device()
+    device.uploadPixelConfig()
+    assert device._ctrl.pixel_resets == 1
+    assert len(device._ctrl.packets) == 86
+
+    # nothing changed, nothing to send
+    device._ctrl.packets = []
+    device.uploadPixelConfig()
+    assert device._ctrl.packets == []
+
+    # mask two hot pixels, only their packets are sent and the chip is not reset
+    device.setSinglePixelMask(100, 7, 0)
+    device.setSinglePixelMask(255, 3, 0)
+    device.uploadPixelConfig()
+    assert device._ctrl.pixel_resets == 1
+    assert [col for col, _ in device._ctrl.packets] == [99, 255]
+
+    formatted = device._formatPixelBits(
+        device._pixel_mask | (device._pixel_threshold & 0xF) << 1
+    ).reshape(256, 192)
+    assert np.array_equal(device._ctrl.packets[0][1], formatted[99:102].reshape(-1))
+
+    device._ctrl.packets = []
+    device.uploadPixelConfig(force=True)
+    assert device._ctrl.pixel_resets == 2
+    assert len(device._ctrl.packets) == 86
+
+    # resetting the pixels on the chip requires a full upload again
+    device.resetPixels()
+    device._ctrl.packets = []
+    device.uploadPixelConfig()
+    assert len(device._ctrl.packets) == 86
+
+
+def test_module_reset_requires_full_upload():
+    device = create_device()
+    device.uploadPixelConfig()
+
+    controller = SPIDRController.__new__(SPIDRController)
+    Logger.__init__(controller, SPIDRController.__name__)
+    controller._devices = [device]
+    controller._monitor_cache = MonitorCache()
+    controller.requestGetInt = lambda cmd, dev_nr, arg=0: 0
+    controller.resetModule(SpidrReadoutSpeed.Default)
+
+    device._ctrl.packets = []
+    device.uploadPixelConfig()
+    assert len(device._ctrl.packets) == 86
@@ -0,0 +1,62 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the UDP replay of raw files
+run: pytest test_spidrdummyudp_pytest.py
+"""
+
+import socket
+
+import numpy as np
+
+from pymepix.util.spidrDummyUDP import replay
+
+
+def receive_all(sock):
+    received = []
+    while True:
+        try:
+            received.append(sock.recv(65536))
+        except socket.timeout:
+            return received
+
+
+def test_replay(tmp_path):
+    fname = tmp_path / "replay.raw"
+    data = np.arange(1_000, dtype=np.uint64)
+    data.tofile(fname)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(0.5)
+
+    stats = replay(fname, sock.getsockname(), words_per_packet=139, skip_header=True)
+    received = receive_all(sock)
+
+    assert stats["packets"] == 8
+    assert [len(r) for r in received] == [139 * 8] * 7 + [(999 - 7 * 139) * 8]
+    assert np.array_equal(np.frombuffer(b"".join(received), dtype=np.uint64), data[1:])
+
+    stats = replay(fname, sock.getsockname(), repeats=2, loss=1.0, processes=2)
+    assert stats["packets"] == 0
+    assert stats["dropped"] == 16
+    assert receive_all(sock) == []
+    sock.close()
@@ -0,0 +1,105 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test the timewalk calibration
+run: pytest test_timewalk_pytest.py
+"""
+
+import numpy as np
+import pytest
+
+from pymepix.processing.logic.packet_processor import PacketProcessor
+from pymepix.util.hitgenerator import encode_tpx3_pixels
+from pymepix.util.timewalk import LUT_SIZE, compute_timewalk, compute_timewalk_lookup, timewalk_profile
+
+
+def walk(tot):
+    """Timewalk (ns) used to generate the hits"""
+    return 4000.0 / tot
+
+
+def peak_hits(n=400_000, seed=0):
+    rng = np.random.default_rng(seed)
+    tot = rng.integers(1, 120, n) * 25
+    tof = 5e-6 + (walk(tot) + rng.normal(0, 2.0, n)) * 1e-9
+    return tof, tot
+
+
+def test_profile_recovers_walk():
+    tof, tot = peak_hits()
+    tot_points, means, widths = timewalk_profile(tof, tot, (4e-6, 6e-6))
+    # means are relative to the largest signals, which still have some walk
+    offset = np.mean(walk(np.arange(119, 118 - 11, -1) * 25))
+    np.testing.assert_allclose(means + offset, walk(tot_points), atol=0.5)
+    np.testing.assert_allclose(widths, 2.0, atol=0.5)
+
+
+def test_profile_fits_skewed_bins():
+    tof, tot = peak_hits()
+    # late background hits in one ToT bin pull the mean of its moments
+    rng = np.random.default_rng(1)
+    extra_tot = np.full(400, 500)
+    extra_tof = 5e-6 + rng.uniform(100, 400, extra_tot.size) * 1e-9
+    tof, tot = np.concatenate((tof, extra_tof)), np.concatenate((tot, extra_tot))
+
+    tot_points, moments, _ = timewalk_profile(tof, tot, (4e-6, 6e-6), fit=False)
+    tot_points_fit, fitted, _ = timewalk_profile(tof, tot, (4e-6, 6e-6))
+    i = np.flatnonzero(tot_points == 500)[0]
+    j = np.flatnonzero(tot_points_fit == 500)[0]
+    expected = fitted[j + 1] + walk(500) - walk(525)
+    assert abs(moments[i] - expected) > 10
+    assert abs(fitted[j] - expected) < 1
+
+
+def test_lookup():
+    tof, tot = peak_hits()
+    tot_points, walk_points = compute_timewalk(tof, tot, (4e-6, 6e-6))
+    assert walk_points[-1] >= 1.525
+
+    lut = compute_timewalk_lookup(tof, tot, (4e-6, 6e-6))
+    assert lut.shape == (LUT_SIZE,) and lut.dtype == np.float32
+    codes = tot_points // 25
+    np.testing.assert_allclose(lut[codes - 1], walk_points * 1e-9, rtol=1e-5)
+    assert np.all(lut[codes[-1] :] == 0)
+
+
+def test_empty_region():
+    tof, tot = peak_hits(1000)
+    with pytest.raises(ValueError):
+        timewalk_profile(tof, tot, (1.0, 2.0))
+
+
+def test_lookup_sharpens_decoded_peak():
+    tof, tot = peak_hits(100_000)
+    rng = np.random.default_rng(2)
+    x, y = rng.integers(0, 256, tof.size), rng.integers(0, 256, tof.size)
+    words, _ = encode_tpx3_pixels(x, y, 1.0 + tof, tot)
+    words, longtime = np.int64(words), int(1.0 / 25e-9)
+
+    _x, _y, toa, decoded_tot = PacketProcessor(handle_events=False).process_pixels(words, longtime)
+    region = (1.0 + 4e-6, 1.0 + 6e-6)
+    lut = compute_timewalk_lookup(toa, decoded_tot, region)
+    corrected = PacketProcessor(handle_events=False, timewalk_lut=lut).process_pixels(words, longtime)[2]
+
+    # the walk of up to 160 ns is removed, only the 2 ns jitter is left
+    assert np.std(toa) > 10e-9
+    assert np.std(corrected) < 3e-9
+    assert abs(np.median(corrected) - np.median(toa)) < 200e-9
@@ -0,0 +1,104 @@
+# This file is part of Pymepix
+#
+# In all scientific work using Pymepix, please reference it as
+#
+# A. F. Al-Refaie, M. Johny, J. Correa, D. Pennicard, P. Svihra, A. Nomerotski, S. Trippel, and J. Küpper:
+# "PymePix: a python library for SPIDR readout of Timepix3", J. Inst. 14, P10003 (2019)
+# https://doi.org/10.1088/1748-0221/14/10/P10003
+# https://arxiv.org/abs/1905.07999
+#
+# Pymepix is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+"""
+module to test recording train IDs and merging them into the post-processed data
+run: pytest test_trainid_pytest.py
+"""
+
+import h5py
+import numpy as np
+
+from pymepix.util.trainid import (
+    TRAINID_MAGIC,
+    encode_records,
+    match_train_ids,
+    merge_train_ids,
+    parse_frames,
+    read_trainid_file,
+)
+
+
+def frame(train_id, beam_mode=0x12345678, corrupt=False):
+    payload = f"{train_id:016X}{beam_mode:08X}"
+    crc = 0
+    for byte in bytes.fromhex(payload):
+        crc ^= byte
+    return b"\x02" + payload.encode() + f"{crc ^ corrupt:02X}".encode() + b"\x03"
+
+
+def test_parse_split_frames():
+    stream = b"\x00garbage" + frame(100) + frame(101, corrupt=True) + frame(102) + frame(103)
+    records, buffer, errors_total = [], b"", 0
+    # cut the stream at arbitrary positions like serial reads do
+    for chunk in (stream[:20], stream[20:57], stream[57:90], stream[90:]):
+        new, buffer, errors = parse_frames(buffer + chunk)
+        records += new
+        errors_total += errors
+    assert [r[0] for r in records] == [100, 102, 103]
+    assert records[0][1] == 0x12345678
+    assert errors_total == 1
+    assert buffer == b""
+
+
+def test_read_log(tmp_path):
+    filename = tmp_path / "trainid.bin"
+    with open(filename, "wb") as f:
+        f.write(TRAINID_MAGIC)
+        f.write(encode_records(1000, [(1, 2), (3, 4)]))
+        f.write(encode_records(2000, [(5, 6)]))
+    records = read_trainid_file(filename)
+    assert records["timestamp"].tolist() == [1000, 1000, 2000]
+    assert records["train_id"].tolist() == [1, 3, 5]
+    assert records["beam_mode"].tolist() == [2, 4, 6]
+
+    # logs of older versions
+    legacy = tmp_path / "legacy.bin"
+    with open(legacy, "wb") as f:
+        for zeit, train_id in ((10, 7), (20, 8)):
+            np.save(f, zeit)
+            np.save(f, train_id)
+    records = read_trainid_file(legacy)
+    assert records["timestamp"].tolist() == [10, 20]
+    assert records["train_id"].tolist() == [7, 8]
+
+
+def test_merge(tmp_path):
+    trainid_file = tmp_path / "trainid.bin"
+    train_times = 10**18 + np.arange(10) * 100_000_000
+    with open(trainid_file, "wb") as f:
+        f.write(TRAINID_MAGIC)
+        for i, zeit in enumerate(train_times):
+            f.write(encode_records(int(zeit), [(5000 + i, 0)]))
+
+    triggers = np.array([train_times[0] - 1, train_times[0], train_times[3] + 50_000_000, train_times[9] + 1])
+    expected = [-1, 5000, 5003, 5009]
+    np.testing.assert_array_equal(match_train_ids(triggers, read_trainid_file(trainid_file)), expected)
+
+    output_file = tmp_path / "out.hdf5"
+    with h5py.File(output_file, "w") as f:
+        f.create_dataset("timing/timepix/timestamp", data=triggers.astype(np.uint64))
+        f.create_dataset("timing/timepix/trigger nr", data=np.arange(4))
+    assert merge_train_ids(output_file, trainid_file) == 3
+    # merging again replaces the datasets
+    assert merge_train_ids(output_file, trainid_file) == 3
+    with h5py.File(output_file) as f:
+        assert f["timing/timepix/train id"][:].tolist() == expected
+        assert f["timing/trainid/train id"].shape == (10,)